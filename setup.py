@@ -55,9 +55,14 @@ setup(
 
         # Specify the Python versions you support here. In particular, ensure
         # that you indicate whether you support Python 2, Python 3 or both.
-        'Programming Language :: Python :: 2.7',
+        'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.11',
     ],
 
+    # TimeoutError catches the timeouts of futures, asyncio and sockets alike only from 3.11
+    python_requires='>=3.11',
+
     # What does your project relate to?
     keywords='sample setuptools development',
 
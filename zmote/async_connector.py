@@ -0,0 +1,325 @@
+import asyncio
+from logging import getLogger
+
+from zmote.cache import get_cache
+from zmote.connector import _LEARN_TIMEOUT, _LEARNER_ENABLED, _TCP_PORT
+from zmote.ircode import IRCode
+from zmote.metrics import instrument_async
+
+_TIMEOUT = 5
+
+
+class AsyncHTTPTransport(object):
+    def __init__(self, ip, timeout=_TIMEOUT, cache=None, metrics=None):
+        self._ip = ip
+        self._timeout = timeout
+        self._cache = cache if cache is not None else get_cache()
+        self._metrics = metrics
+
+        host, _, port = ip.partition(':')
+        self._host = host
+        self._port = int(port) if port else 80
+
+        self._reader = None
+        self._writer = None
+        self._uuid = None
+        self._uuid_from_cache = False
+
+        # one request at a time on the keep-alive connection, or responses would be read by the wrong caller
+        self._lock = asyncio.Lock()
+
+        self._logger = getLogger(self.__class__.__name__)
+        self._logger.debug('__init__(); ip=%r', ip)
+
+    async def _open(self):
+        # a blackholed device would otherwise hold the caller for the OS's SYN timeout; learning only waits once connected
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self._host, self._port),
+            self._timeout,
+        )
+
+    def _close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+        self._reader = None
+        self._writer = None
+
+    async def _exchange(self, method, path, body):
+        request = '{0} {1} HTTP/1.1\r\nHost: {2}\r\nConnection: keep-alive\r\nContent-Length: {3}\r\n'.format(
+            method, path, self._ip, len(body),
+        ).encode()
+
+        if body:
+            request += b'Content-Type: application/x-www-form-urlencoded\r\n'
+
+        self._writer.write(request + b'\r\n' + body)
+        await self._writer.drain()
+
+        status_line = await self._reader.readline()
+        if not status_line:
+            raise ConnectionResetError('connection closed by {0}'.format(repr(self._ip)))
+
+        try:
+            status = int(status_line.split(None, 2)[1])
+        except (IndexError, ValueError):
+            raise ConnectionError('cannot parse status line {0} from {1}'.format(repr(status_line), repr(self._ip)))
+
+        headers = {}
+        while True:
+            line = await self._reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+
+            key, _, value = line.decode('iso-8859-1').partition(':')
+            headers[key.strip().lower()] = value.strip()
+
+        keep_alive = headers.get('connection', '').lower() != 'close'
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await self._reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await self._reader.readline()
+                    break
+
+                chunks.append(await self._reader.readexactly(size))
+                await self._reader.readline()
+
+            data = b''.join(chunks)
+        elif 'content-length' in headers:
+            data = await self._reader.readexactly(int(headers['content-length']))
+        else:
+            data = await self._reader.read()
+            keep_alive = False
+
+        if not keep_alive:
+            self._close()
+
+        return status, data.decode()
+
+    async def _request(self, method, path, body=b'', timeout=_TIMEOUT):
+        if isinstance(body, str):
+            body = body.encode()
+
+        async with self._lock:
+            reused = self._writer is not None
+            if not reused:
+                await self._open()
+
+            try:
+                return await asyncio.wait_for(self._exchange(method, path, body), timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                # the response to an abandoned request would be read as the answer to the next one
+                self._close()
+                raise
+            except (ConnectionError, asyncio.IncompleteReadError):
+                self._close()
+
+                # an idle keep-alive connection may have been dropped by the device; retry once on a fresh one
+                if not reused:
+                    raise
+
+            await self._open()
+
+            return await asyncio.wait_for(self._exchange(method, path, body), timeout)
+
+    async def get_uuid(self):
+        self._logger.debug('get_uuid()')
+
+        _, text = await self._request('GET', '/uuid', timeout=self._timeout)
+        uuid = text.split(',')[-1].strip()
+
+        self._logger.debug('get_uuid(); uuid=%r', uuid)
+
+        return uuid
+
+    async def connect(self):
+        self._logger.debug('connect()')
+
+        zmote = self._cache.get_by_ip(self._ip)
+        if zmote is not None:
+            self._uuid = zmote['UUID']
+            self._uuid_from_cache = True
+        else:
+            self._uuid = await self.get_uuid()
+            self._uuid_from_cache = False
+            self._cache.update(self._uuid, self._ip)
+
+        self._logger.debug('connect(); uuid=%r', self._uuid)
+
+    async def call(self, data):
+        if self._metrics is None:
+            return await self._call(data)
+
+        return await instrument_async(self._metrics, self._ip, data, self._call)
+
+    async def _call(self, data):
+        self._logger.debug('call(%r)', data)
+
+        payload = data.http_bytes if isinstance(data, IRCode) else data
+
+        # learning waits on a person pointing a remote at the device; AsyncConnector.learn() bounds that instead
+        timeout = None if payload == 'get_IRL' else self._timeout
+
+        try:
+            status, output = await self._request('POST', '/v2/{0}'.format(self._uuid), payload, timeout)
+
+            # a cached UUID may belong to a device that has since been replaced at this IP; look it up and retry once
+            if not 200 <= status < 300 and self._uuid_from_cache:
+                self._cache.invalidate(ip=self._ip)
+
+                self._uuid = await self.get_uuid()
+                self._uuid_from_cache = False
+                self._cache.update(self._uuid, self._ip)
+
+                status, output = await self._request('POST', '/v2/{0}'.format(self._uuid), payload, timeout)
+
+            if not 200 <= status < 300:
+                raise ConnectionError('POST /v2/{0} to {1} failed with {2}: {3}'.format(
+                    self._uuid, repr(self._ip), status, repr(output),
+                ))
+        except Exception:
+            self._cache.invalidate(ip=self._ip)
+            raise
+
+        self._logger.debug('call(%r); output=%r', data, output)
+
+        return output
+
+    async def disconnect(self):
+        self._logger.debug('disconnect()')
+
+        self._close()
+
+
+class AsyncTCPTransport(object):
+    def __init__(self, ip, timeout=_TIMEOUT, metrics=None, port=_TCP_PORT):
+        self._ip = ip
+        self._port = port
+        self._timeout = timeout
+        self._metrics = metrics
+
+        self._reader = None
+        self._writer = None
+        self._lock = asyncio.Lock()
+
+        self._logger = getLogger(self.__class__.__name__)
+        self._logger.debug('__init__(); ip=%r', ip)
+
+    async def connect(self):
+        self._logger.debug('connect()')
+
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self._ip, self._port),
+            self._timeout,
+        )
+
+    async def _read_line(self, timeout):
+        while True:
+            line = (await asyncio.wait_for(self._reader.readuntil(b'\r'), timeout)).strip(b'\r\n')
+            if line:
+                return line.decode()
+
+    def _close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+        self._reader = None
+        self._writer = None
+
+    async def call(self, data):
+        if self._metrics is None:
+            return await self._call(data)
+
+        return await instrument_async(self._metrics, self._ip, data, self._call)
+
+    async def _call(self, data):
+        self._logger.debug('call(%r)', data)
+
+        # responses carry no caller context here, so one exchange at a time per connection
+        async with self._lock:
+            if self._writer is None:
+                await self.connect()
+
+            try:
+                if isinstance(data, IRCode):
+                    self._writer.write(data.tcp_bytes)
+                else:
+                    self._writer.write('{0}\r'.format(data.rstrip('\r')).encode())
+
+                await self._writer.drain()
+
+                buf = await self._read_line(self._timeout)
+                if buf == _LEARNER_ENABLED:
+                    # the code only arrives once a remote is pointed at the device; AsyncConnector.learn() bounds that
+                    buf = '{0}\r{1}'.format(buf, await self._read_line(None))
+            except (asyncio.TimeoutError, asyncio.CancelledError, asyncio.IncompleteReadError, ConnectionError):
+                # the response to an abandoned exchange would be read as the answer to the next one
+                self._close()
+                raise
+
+        self._logger.debug('call(%r); buf=%r', data, buf)
+
+        return buf
+
+    async def disconnect(self):
+        self._logger.debug('disconnect()')
+
+        self._close()
+
+
+class AsyncConnector(object):
+    def __init__(self, transport):
+        self._transport = transport
+
+        self._logger = getLogger(self.__class__.__name__)
+        self._logger.debug('__init__(); transport=%s', transport)
+
+    async def connect(self):
+        self._logger.debug('connect()')
+
+        await self._transport.connect()
+
+    async def send(self, data):
+        self._logger.debug('send(%r)', data)
+
+        if isinstance(data, IRCode):
+            output = await self._transport.call(data)
+        else:
+            data = data.split('sendir,')[-1]
+
+            output = await self._transport.call('sendir,{0}'.format(data))
+
+        self._logger.debug('send(%r); output=%r', data, output)
+
+        return output
+
+    async def _stop_learning(self):
+        try:
+            await self._transport.call('stop_IRL')
+        except Exception as e:
+            self._logger.warning('_stop_learning(); exception=%r', e)
+
+    async def learn(self, timeout=_LEARN_TIMEOUT):
+        self._logger.debug('learn(); timeout=%s', timeout)
+
+        try:
+            data = await asyncio.wait_for(self._transport.call('get_IRL'), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            # giving up on the exchange doesn't take the device out of learn mode
+            await self._stop_learning()
+            raise
+
+        self._logger.debug('learn(); data=%r', data)
+
+        return data.split('sendir,')[-1]
+
+    async def learn_code(self, timeout=_LEARN_TIMEOUT):
+        return IRCode.parse(await self.learn(timeout))
+
+    async def disconnect(self):
+        self._logger.debug('disconnect()')
+
+        await self._transport.disconnect()
@@ -0,0 +1,379 @@
+import asyncio
+import unittest
+
+from hamcrest import assert_that, equal_to
+from mock import patch, call, MagicMock, AsyncMock
+
+from zmote.cache import DeviceCache
+from zmote.async_connector import AsyncHTTPTransport, AsyncTCPTransport, AsyncConnector
+from zmote.connector_test import _TEST_SENDIR_REQUEST, _TEST_SENDIR_RESPONSE
+from zmote.discoverer_test import _UUID
+from zmote.simulator import Simulator
+
+
+def _http_response(body, headers=b'', status=b'200 OK'):
+    return [
+        b'HTTP/1.1 ' + status + b'\r\n',
+        'Content-Length: {0}\r\n'.format(len(body)).encode(),
+    ] + ([headers] if headers else []) + [
+        b'\r\n',
+    ], body
+
+
+def _mock_reader(*responses):
+    reader = MagicMock()
+
+    lines = []
+    bodies = []
+    for response_lines, body in responses:
+        lines.extend(response_lines)
+        bodies.append(body)
+
+    reader.readline = AsyncMock(side_effect=lines)
+    reader.readexactly = AsyncMock(side_effect=bodies)
+
+    return reader
+
+
+def _mock_writer():
+    writer = MagicMock()
+    writer.drain = AsyncMock()
+
+    return writer
+
+
+class AsyncHTTPTransportTest(unittest.TestCase):
+    def setUp(self):
+        self._subject = AsyncHTTPTransport(
+            ip='192.168.1.12',
+            cache=DeviceCache(),
+        )
+
+    @patch('zmote.async_connector.asyncio.open_connection', new_callable=AsyncMock)
+    def test_connect(self, open_connection):
+        reader = _mock_reader(_http_response('uuid,{0}'.format(_UUID).encode()))
+        writer = _mock_writer()
+        open_connection.return_value = (reader, writer)
+
+        asyncio.run(self._subject.connect())
+
+        assert_that(
+            open_connection.mock_calls,
+            equal_to([
+                call('192.168.1.12', 80),
+            ])
+        )
+
+        assert_that(
+            writer.write.mock_calls,
+            equal_to([
+                call(b'GET /uuid HTTP/1.1\r\nHost: 192.168.1.12\r\nConnection: keep-alive\r\nContent-Length: 0\r\n\r\n'),
+            ])
+        )
+
+        assert_that(
+            self._subject._uuid,
+            equal_to(_UUID)
+        )
+
+    @patch('zmote.async_connector.asyncio.open_connection', new_callable=AsyncMock)
+    def test_call_reuses_connection(self, open_connection):
+        reader = _mock_reader(
+            _http_response(_TEST_SENDIR_RESPONSE),
+            _http_response(_TEST_SENDIR_RESPONSE),
+        )
+        writer = _mock_writer()
+        open_connection.return_value = (reader, writer)
+
+        self._subject._uuid = _UUID
+
+        async def run():
+            return [
+                await self._subject.call(_TEST_SENDIR_REQUEST),
+                await self._subject.call(_TEST_SENDIR_REQUEST),
+            ]
+
+        assert_that(
+            asyncio.run(run()),
+            equal_to([_TEST_SENDIR_RESPONSE.decode()] * 2)
+        )
+
+        assert_that(
+            len(open_connection.mock_calls),
+            equal_to(1)
+        )
+
+    @patch('zmote.async_connector.asyncio.open_connection', new_callable=AsyncMock)
+    def test_call_connection_close(self, open_connection):
+        reader = _mock_reader(_http_response(_TEST_SENDIR_RESPONSE, b'Connection: close\r\n'))
+        writer = _mock_writer()
+        open_connection.return_value = (reader, writer)
+
+        self._subject._uuid = _UUID
+
+        asyncio.run(self._subject.call(_TEST_SENDIR_REQUEST))
+
+        assert_that(
+            writer.close.mock_calls,
+            equal_to([call()])
+        )
+
+        assert_that(
+            self._subject._writer,
+            equal_to(None)
+        )
+
+    @patch('zmote.async_connector.asyncio.open_connection', new_callable=AsyncMock)
+    def test_call_retries_dropped_keep_alive(self, open_connection):
+        stale_reader = MagicMock()
+        stale_reader.readline = AsyncMock(return_value=b'')
+        reader = _mock_reader(_http_response(_TEST_SENDIR_RESPONSE))
+        open_connection.return_value = (reader, _mock_writer())
+
+        self._subject._uuid = _UUID
+        self._subject._reader = stale_reader
+        self._subject._writer = _mock_writer()
+
+        assert_that(
+            asyncio.run(self._subject.call(_TEST_SENDIR_REQUEST)),
+            equal_to(_TEST_SENDIR_RESPONSE.decode())
+        )
+
+        assert_that(
+            len(open_connection.mock_calls),
+            equal_to(1)
+        )
+
+    @patch('zmote.async_connector.asyncio.open_connection', new_callable=AsyncMock)
+    def test_call_stale_cached_uuid(self, open_connection):
+        reader = _mock_reader(
+            _http_response(b'', status=b'404 Not Found'),
+            _http_response('uuid,{0}'.format(_UUID).encode()),
+            _http_response(_TEST_SENDIR_RESPONSE),
+        )
+        writer = _mock_writer()
+        open_connection.return_value = (reader, writer)
+
+        self._subject._cache.update('CIdeadbeef', '192.168.1.12')
+
+        async def run():
+            await self._subject.connect()
+            return await self._subject.call(_TEST_SENDIR_REQUEST)
+
+        assert_that(
+            asyncio.run(run()),
+            equal_to(_TEST_SENDIR_RESPONSE.decode())
+        )
+
+        assert_that(
+            writer.write.mock_calls[-1].args[0].startswith('POST /v2/{0} '.format(_UUID).encode()),
+            equal_to(True)
+        )
+
+        assert_that(
+            self._subject._cache.get_by_ip('192.168.1.12')['UUID'],
+            equal_to(_UUID)
+        )
+
+    @patch('zmote.async_connector.asyncio.open_connection', new_callable=AsyncMock)
+    def test_call_error_status(self, open_connection):
+        reader = _mock_reader(_http_response(b'', status=b'404 Not Found'))
+        open_connection.return_value = (reader, _mock_writer())
+
+        self._subject._uuid = _UUID
+        self._subject._cache.update(_UUID, '192.168.1.12')
+
+        with self.assertRaises(ConnectionError):
+            asyncio.run(self._subject.call(_TEST_SENDIR_REQUEST))
+
+        assert_that(
+            self._subject._cache.get_by_ip('192.168.1.12'),
+            equal_to(None)
+        )
+
+    @patch('zmote.async_connector.asyncio.open_connection')
+    def test_connect_timeout(self, open_connection):
+        async def blackholed(*args):
+            await asyncio.sleep(60)
+
+        open_connection.side_effect = blackholed
+
+        self._subject._timeout = 0.1
+
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(self._subject.connect())
+
+    def test_call_concurrently(self):
+        simulator = Simulator()
+        simulator.start()
+        self.addCleanup(simulator.stop)
+
+        zmote = simulator.add(latency=0.01)[0]
+
+        async def run():
+            connector = AsyncConnector(AsyncHTTPTransport(ip=zmote.ip, cache=DeviceCache()))
+            await connector.connect()
+            try:
+                return await asyncio.gather(*[connector.send(_TEST_SENDIR_REQUEST) for _ in range(0, 4)])
+            finally:
+                await connector.disconnect()
+
+        # the calls take turns on the one connection rather than read each other's responses
+        assert_that(
+            asyncio.run(run()),
+            equal_to([_TEST_SENDIR_RESPONSE.decode()] * 4)
+        )
+
+
+class AsyncTCPTransportTest(unittest.TestCase):
+    def setUp(self):
+        self._subject = AsyncTCPTransport(
+            ip='192.168.1.12',
+        )
+
+    @patch('zmote.async_connector.asyncio.open_connection', new_callable=AsyncMock)
+    def test_connect(self, open_connection):
+        open_connection.return_value = (MagicMock(), _mock_writer())
+
+        asyncio.run(self._subject.connect())
+
+        assert_that(
+            open_connection.mock_calls,
+            equal_to([
+                call('192.168.1.12', 4998),
+            ])
+        )
+
+    def test_call(self):
+        self._subject._reader = MagicMock()
+        self._subject._reader.readuntil = AsyncMock(return_value=_TEST_SENDIR_RESPONSE + b'\r')
+        self._subject._writer = _mock_writer()
+
+        assert_that(
+            asyncio.run(self._subject.call(_TEST_SENDIR_REQUEST)),
+            equal_to(_TEST_SENDIR_RESPONSE.decode())
+        )
+
+        assert_that(
+            self._subject._writer.write.mock_calls,
+            equal_to([
+                call(_TEST_SENDIR_REQUEST.encode() + b'\r'),
+            ])
+        )
+
+    def test_call_learn(self):
+        self._subject._reader = MagicMock()
+        self._subject._reader.readuntil = AsyncMock(side_effect=[
+            b'IR Learner Enabled\r',
+            b'\n' + _TEST_SENDIR_REQUEST.encode() + b'\r',
+        ])
+        self._subject._writer = _mock_writer()
+
+        assert_that(
+            asyncio.run(self._subject.call('get_IRL')),
+            equal_to('IR Learner Enabled\r' + _TEST_SENDIR_REQUEST)
+        )
+
+    def test_call_cancelled_closes_connection(self):
+        writer = _mock_writer()
+        self._subject._reader = MagicMock()
+        self._subject._reader.readuntil = AsyncMock(side_effect=[
+            b'IR Learner Enabled\r',
+            asyncio.CancelledError(),
+        ])
+        self._subject._writer = writer
+
+        with self.assertRaises(asyncio.CancelledError):
+            asyncio.run(self._subject.call('get_IRL'))
+
+        writer.close.assert_called_once_with()
+
+        assert_that(
+            self._subject._writer,
+            equal_to(None)
+        )
+
+    def test_disconnect(self):
+        writer = _mock_writer()
+        self._subject._writer = writer
+
+        asyncio.run(self._subject.disconnect())
+
+        assert_that(
+            writer.mock_calls,
+            equal_to([
+                call.close()
+            ])
+        )
+
+
+class AsyncConnectorTest(unittest.TestCase):
+    def setUp(self):
+        self._transport = MagicMock()
+        self._transport.connect = AsyncMock()
+        self._transport.call = AsyncMock()
+        self._transport.disconnect = AsyncMock()
+
+        self._subject = AsyncConnector(
+            transport=self._transport,
+        )
+
+    def test_send(self):
+        self._transport.call.return_value = _TEST_SENDIR_RESPONSE.decode()
+
+        assert_that(
+            asyncio.run(self._subject.send('1:1,0,36000,1,1,32,32,64,32,32,64,32,3264')),
+            equal_to(_TEST_SENDIR_RESPONSE.decode())
+        )
+
+        assert_that(
+            self._transport.call.mock_calls,
+            equal_to([
+                call(_TEST_SENDIR_REQUEST),
+            ])
+        )
+
+    def test_learn(self):
+        self._transport.call.return_value = 'IR Learner Enabled\r' + _TEST_SENDIR_REQUEST
+
+        assert_that(
+            asyncio.run(self._subject.learn()),
+            equal_to('1:1,0,36000,1,1,32,32,64,32,32,64,32,3264')
+        )
+
+    def test_learn_timeout_stops_learning(self):
+        async def learn(data):
+            if data == 'get_IRL':
+                await asyncio.sleep(5)
+
+            return 'IR Learner Disabled'
+
+        self._transport.call.side_effect = learn
+
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(self._subject.learn(timeout=0.01))
+
+        assert_that(
+            self._transport.call.mock_calls,
+            equal_to([
+                call('get_IRL'),
+                call('stop_IRL'),
+            ])
+        )
+
+    def test_send_concurrently(self):
+        transports = []
+        for _ in range(0, 3):
+            transport = MagicMock()
+            transport.connect = AsyncMock()
+            transport.call = AsyncMock(return_value=_TEST_SENDIR_RESPONSE.decode())
+            transports.append(transport)
+
+        async def run():
+            connectors = [AsyncConnector(transport=x) for x in transports]
+            return await asyncio.gather(*[x.send(_TEST_SENDIR_REQUEST) for x in connectors])
+
+        assert_that(
+            asyncio.run(run()),
+            equal_to([_TEST_SENDIR_RESPONSE.decode()] * 3)
+        )
@@ -0,0 +1,219 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from zmote.cache import DeviceCache
+from zmote.connector import Connector, HTTPTransport, TCPTransport
+from zmote.discoverer import Discoverer, stream_discover_zmotes
+from zmote.simulator import Simulator
+
+_ZMOTE_BEACON = 'AMXB<-UUID=CI{0:08x}><-Type=ZMT2><-Make=zmote.io><-Model=ZV-2><-Revision=2.1.4><-Config-URL=http://10.0.{1}.{2}>'
+
+_FOREIGN_BEACON = b'AMXB<-SDKClass=VideoProjector><-Make=Epson><-Model=EB-1785W><-Revision=1.0.0><-UUID=00:11:22:33:44:55>'
+
+_OTHER_DATAGRAM = b'M-SEARCH * HTTP/1.1\r\nHOST: 239.255.255.250:1900\r\n\r\n'
+
+_SENDIR = 'sendir,1:1,0,36000,1,1,32,32,64,32,32,64,32,3264'
+
+_MAX_WORKERS = 64
+
+
+def _zmote_beacon(i):
+    return _ZMOTE_BEACON.format(i, (i // 254) % 256, i % 254 + 1).encode('ascii')
+
+
+def _packets_per_second(func, payloads):
+    before = time.perf_counter()
+
+    for payload in payloads:
+        try:
+            func(payload)
+        except ValueError:
+            pass
+
+    return len(payloads) / (time.perf_counter() - before)
+
+
+def bench_parse(count=100000, devices=50):
+    discoverer = Discoverer(cache=DeviceCache())
+    try:
+        beacons = [_zmote_beacon(i) for i in range(0, devices)]
+
+        return {
+            'repeat zmote beacons': _packets_per_second(
+                discoverer.parse, [beacons[i % devices] for i in range(0, count)]
+            ),
+            'unique zmote beacons': _packets_per_second(
+                discoverer.parse, [_zmote_beacon(i) for i in range(devices, devices + count)]
+            ),
+            'foreign AMX beacons': _packets_per_second(
+                discoverer.parse, [_FOREIGN_BEACON] * count
+            ),
+            'non-AMXB datagrams': _packets_per_second(
+                discoverer.parse, [_OTHER_DATAGRAM] * count
+            ),
+        }
+    finally:
+        discoverer.close()
+
+
+def _percentile(latencies, percentile):
+    return latencies[min(len(latencies) - 1, int(round(percentile / 100.0 * (len(latencies) - 1))))]
+
+
+def _connector(zmote, transport, cache):
+    if transport == 'tcp':
+        return Connector(TCPTransport(ip=zmote.host, port=zmote.tcp_port))
+
+    return Connector(HTTPTransport(ip=zmote.ip, cache=cache))
+
+
+def bench_commands(devices=1, count=100, transport='http', latency=0, jitter=0, max_workers=_MAX_WORKERS):
+    simulator = Simulator()
+    simulator.start()
+    try:
+        cache = DeviceCache()
+        connectors = [_connector(x, transport, cache) for x in simulator.add(devices, latency=latency, jitter=jitter)]
+
+        def run(connector):
+            connector.connect()
+            try:
+                latencies = []
+                for _ in range(0, count):
+                    before = time.perf_counter()
+                    connector.send(_SENDIR)
+                    latencies.append(time.perf_counter() - before)
+
+                return latencies
+            finally:
+                connector.disconnect()
+
+        before = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, devices)) as executor:
+            latencies = sorted(x for y in executor.map(run, connectors) for x in y)
+
+        duration = time.perf_counter() - before
+    finally:
+        simulator.stop()
+
+    return {
+        'commands/s': len(latencies) / duration,
+        'p50': _percentile(latencies, 50),
+        'p99': _percentile(latencies, 99),
+    }
+
+
+def bench_discovery(devices=1, latency=0, jitter=0, deadline=30):
+    simulator = Simulator()
+    simulator.start()
+    try:
+        simulator.add(devices, latency=latency, jitter=jitter)
+
+        before = time.perf_counter()
+
+        found = set()
+        for zmote in stream_discover_zmotes(unique_zmote_limit=devices, deadline=deadline, interfaces=['127.0.0.1']):
+            found.add(zmote['UUID'])
+
+        duration = time.perf_counter() - before
+    finally:
+        simulator.stop()
+
+    return {
+        'found': len(found),
+        'seconds': duration,
+    }
+
+
+def _print_rates(title, rates):
+    print(title)
+    for name, rate in rates.items():
+        print('    {0:<24} {1:>12,.0f} packets/s'.format(name, rate))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark hot paths of the zmote module',
+    )
+
+    subparsers = parser.add_subparsers(dest='benchmark')
+    subparsers.required = True
+
+    parse_parser = subparsers.add_parser('parse', help='beacon parsing throughput of Discoverer.parse')
+    parse_parser.add_argument(
+        '-n',
+        '--count',
+        type=int,
+        default=100000,
+        help='number of datagrams to parse per scenario (default 100000)',
+    )
+
+    for name, description in [
+        ('commands', 'commands/s and p50/p99 latency against simulated devices'),
+        ('discovery', 'time to actively discover every simulated device'),
+    ]:
+        simulated_parser = subparsers.add_parser(name, help=description)
+        simulated_parser.add_argument(
+            '-D',
+            '--devices',
+            type=str,
+            default='1,10,100,500',
+            help='comma-separated numbers of simulated devices to run against (default 1,10,100,500)',
+        )
+        simulated_parser.add_argument(
+            '-l',
+            '--latency',
+            type=float,
+            default=0,
+            help='simulated device latency in seconds (default 0)',
+        )
+        simulated_parser.add_argument(
+            '-j',
+            '--jitter',
+            type=float,
+            default=0,
+            help='simulated device latency jitter in seconds (default 0)',
+        )
+
+        if name == 'commands':
+            simulated_parser.add_argument(
+                '-n',
+                '--count',
+                type=int,
+                default=100,
+                help='number of commands to send to each device (default 100)',
+            )
+            simulated_parser.add_argument(
+                '-t',
+                '--transport',
+                choices=['http', 'tcp'],
+                default='http',
+                help='transport to send commands over (default HTTP)',
+            )
+
+    args = parser.parse_args()
+
+    if args.benchmark == 'parse':
+        _print_rates('Discoverer.parse', bench_parse(count=args.count))
+    elif args.benchmark == 'commands':
+        print('Connector.send over {0}'.format(args.transport.upper()))
+        for devices in [int(x) for x in args.devices.split(',')]:
+            result = bench_commands(
+                devices=devices,
+                count=args.count,
+                transport=args.transport,
+                latency=args.latency,
+                jitter=args.jitter,
+            )
+
+            print('    {0:>4} devices {1:>12,.0f} commands/s    p50 {2:>8.2f} ms    p99 {3:>8.2f} ms'.format(
+                devices, result['commands/s'], result['p50'] * 1000, result['p99'] * 1000,
+            ))
+    elif args.benchmark == 'discovery':
+        print('stream_discover_zmotes')
+        for devices in [int(x) for x in args.devices.split(',')]:
+            result = bench_discovery(devices=devices, latency=args.latency, jitter=args.jitter)
+
+            print('    {0:>4} devices {1:>4} found in {2:>8.3f} s'.format(devices, result['found'], result['seconds']))
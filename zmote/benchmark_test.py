@@ -0,0 +1,35 @@
+import unittest
+
+from hamcrest import assert_that, equal_to, greater_than, greater_than_or_equal_to
+
+from zmote.benchmark import bench_commands, bench_discovery, bench_parse
+
+
+class BenchmarkTest(unittest.TestCase):
+    def test_bench_parse(self):
+        rates = bench_parse(count=100, devices=10)
+
+        assert_that(
+            sorted(rates),
+            equal_to(['foreign AMX beacons', 'non-AMXB datagrams', 'repeat zmote beacons', 'unique zmote beacons'])
+        )
+
+        for rate in rates.values():
+            assert_that(rate, greater_than(0))
+
+    def test_bench_commands(self):
+        for transport in ['http', 'tcp']:
+            result = bench_commands(devices=2, count=5, transport=transport)
+
+            assert_that(
+                sorted(result),
+                equal_to(['commands/s', 'p50', 'p99'])
+            )
+
+            assert_that(result['p99'], greater_than_or_equal_to(result['p50']))
+
+    def test_bench_discovery(self):
+        assert_that(
+            bench_discovery(devices=3, deadline=5)['found'],
+            equal_to(3)
+        )
@@ -0,0 +1,163 @@
+import json
+import os
+import threading
+import time
+from logging import getLogger
+
+_TTL = 300
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+class DeviceCache(object):
+    def __init__(self, ttl=_TTL, path=None):
+        self._ttl = ttl
+        self._path = path
+
+        self._lock = threading.RLock()
+        self._save_lock = threading.Lock()
+        self._zmotes_by_uuid = {}
+        self._uuid_by_ip = {}
+        self._saved_at = 0
+
+        self._logger = getLogger(self.__class__.__name__)
+        self._logger.debug('__init__(); ttl=%s, path=%r', ttl, path)
+
+        if path is not None:
+            self.load()
+
+    def _expired(self, zmote):
+        return time.time() - zmote['Seen'] > self._ttl
+
+    def _remove(self, uuid):
+        zmote = self._zmotes_by_uuid.pop(uuid, None)
+        if zmote is not None and self._uuid_by_ip.get(zmote['IP']) == uuid:
+            del self._uuid_by_ip[zmote['IP']]
+
+        return zmote
+
+    def load(self):
+        self._logger.debug('load()')
+
+        try:
+            with open(self._path, 'r') as f:
+                zmotes_by_uuid = json.load(f)
+        except (IOError, ValueError) as e:
+            self._logger.debug('load(); exception=%r', e)
+
+            return
+
+        # expired entries are kept as last-known addresses to revalidate; lookups still treat them as missing
+        with self._lock:
+            for uuid, zmote in zmotes_by_uuid.items():
+                self._remove(uuid)
+                self._zmotes_by_uuid[uuid] = zmote
+                self._uuid_by_ip[zmote['IP']] = uuid
+
+    def save(self):
+        self._logger.debug('save()')
+
+        if self._path is None:
+            return
+
+        # one writer at a time, taking its snapshot under the same lock, so the newest snapshot is the one that lands
+        with self._save_lock:
+            with self._lock:
+                data = json.dumps(self._zmotes_by_uuid, indent=4, sort_keys=True)
+                self._saved_at = time.time()
+
+            # write then rename so a concurrent reader never sees a partial file
+            tmp_path = '{0}.{1}.tmp'.format(self._path, os.getpid())
+            with open(tmp_path, 'w') as f:
+                f.write(data)
+
+            os.replace(tmp_path, self._path)
+
+    def update(self, uuid, ip, config_url=None):
+        self._logger.debug('update(%r, %r, %r)', uuid, ip, config_url)
+
+        with self._lock:
+            previous = self._zmotes_by_uuid.get(uuid)
+            changed = previous is None or previous['IP'] != ip
+
+            if changed:
+                self._remove(uuid)
+                stale_uuid = self._uuid_by_ip.get(ip)
+                if stale_uuid is not None:
+                    self._remove(stale_uuid)
+
+            self._zmotes_by_uuid[uuid] = {
+                'UUID': uuid,
+                'IP': ip,
+                'Config-URL': config_url if config_url is not None else 'http://{0}'.format(ip),
+                'Seen': time.time(),
+            }
+            self._uuid_by_ip[ip] = uuid
+
+            # only touch the disk for new mappings or to keep persisted entries from expiring
+            save = changed or time.time() - self._saved_at > self._ttl / 2
+
+        if save:
+            self.save()
+
+    def get_by_uuid(self, uuid):
+        with self._lock:
+            zmote = self._zmotes_by_uuid.get(uuid)
+            if zmote is None:
+                return None
+
+            if self._expired(zmote):
+                return None
+
+            return dict(zmote)
+
+    def last_known(self, uuid):
+        with self._lock:
+            zmote = self._zmotes_by_uuid.get(uuid)
+
+            return dict(zmote) if zmote is not None else None
+
+    def get_by_ip(self, ip):
+        with self._lock:
+            uuid = self._uuid_by_ip.get(ip)
+            if uuid is None:
+                return None
+
+            return self.get_by_uuid(uuid)
+
+    def invalidate(self, uuid=None, ip=None):
+        self._logger.debug('invalidate(); uuid=%r, ip=%r', uuid, ip)
+
+        with self._lock:
+            if uuid is None:
+                uuid = self._uuid_by_ip.get(ip)
+
+            if self._remove(uuid) is None:
+                return
+
+        self.save()
+
+    def clear(self):
+        with self._lock:
+            self._zmotes_by_uuid = {}
+            self._uuid_by_ip = {}
+
+        self.save()
+
+
+def get_cache():
+    global _default_cache
+
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = DeviceCache()
+
+        return _default_cache
+
+
+def set_cache(cache):
+    global _default_cache
+
+    with _default_cache_lock:
+        _default_cache = cache
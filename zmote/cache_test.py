@@ -0,0 +1,116 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from hamcrest import assert_that, equal_to
+from mock import patch
+
+from zmote.cache import DeviceCache
+from zmote.discoverer_test import _UUID
+
+
+class DeviceCacheTest(unittest.TestCase):
+    def setUp(self):
+        self._subject = DeviceCache(
+            ttl=300,
+        )
+
+    def test_update(self):
+        self._subject.update(_UUID, '192.168.1.12')
+
+        assert_that(
+            self._subject.get_by_ip('192.168.1.12')['UUID'],
+            equal_to(_UUID)
+        )
+
+        assert_that(
+            self._subject.get_by_uuid(_UUID)['Config-URL'],
+            equal_to('http://192.168.1.12')
+        )
+
+    def test_update_moved_ip(self):
+        self._subject.update(_UUID, '192.168.1.12')
+        self._subject.update(_UUID, '192.168.1.13')
+
+        assert_that(
+            self._subject.get_by_ip('192.168.1.12'),
+            equal_to(None)
+        )
+
+        assert_that(
+            self._subject.get_by_ip('192.168.1.13')['UUID'],
+            equal_to(_UUID)
+        )
+
+    def test_update_replaced_device(self):
+        self._subject.update('CI00ffffff', '192.168.1.12')
+        self._subject.update(_UUID, '192.168.1.12')
+
+        assert_that(
+            self._subject.get_by_uuid('CI00ffffff'),
+            equal_to(None)
+        )
+
+    @patch('zmote.cache.time')
+    def test_expiry(self, time):
+        time.time.return_value = 1000
+        self._subject.update(_UUID, '192.168.1.12')
+
+        time.time.return_value = 1301
+
+        assert_that(
+            self._subject.get_by_ip('192.168.1.12'),
+            equal_to(None)
+        )
+
+    def test_invalidate(self):
+        self._subject.update(_UUID, '192.168.1.12')
+
+        self._subject.invalidate(ip='192.168.1.12')
+
+        assert_that(
+            self._subject.get_by_uuid(_UUID),
+            equal_to(None)
+        )
+
+    def test_persistence(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'zmotes.json')
+
+        DeviceCache(path=path).update(_UUID, '192.168.1.12')
+
+        assert_that(
+            DeviceCache(path=path).get_by_ip('192.168.1.12')['UUID'],
+            equal_to(_UUID)
+        )
+
+    def test_persistence_concurrent(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'zmotes.json')
+
+        subject = DeviceCache(path=path)
+        errors = []
+
+        def update(offset):
+            try:
+                for x in range(0, 50):
+                    subject.update('CI{0:08x}'.format(offset * 100 + x), '192.168.{0}.{1}'.format(offset, x))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=update, args=(x,)) for x in range(0, 8)]
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        assert_that(errors, equal_to([]))
+        assert_that(
+            DeviceCache(path=path).get_by_ip('192.168.7.49')['UUID'],
+            equal_to('CI{0:08x}'.format(749))
+        )
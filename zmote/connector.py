@@ -1,176 +1,553 @@
-import inspect
+import json
 import socket
+import threading
+import time
 from logging import getLogger
 
-from requests import Session
+from requests import RequestException, Session
 
-socket.setdefaulttimeout(5)
+from zmote.cache import get_cache
+from zmote.deadline import Deadline
+from zmote.ircode import IRCode
+from zmote.metrics import instrument
+
+_TIMEOUT = 5
+
+
+def _acquire(lock, deadline, operation):
+    timeout = deadline.timeout(operation)
+    if not lock.acquire(timeout=timeout if timeout is not None else -1):
+        raise TimeoutError('deadline passed waiting to {0}'.format(operation))
 
 
 class HTTPTransport(object):
-    def __init__(self, ip):
+    def __init__(self, ip, cache=None, metrics=None, timeout=_TIMEOUT):
         self._ip = ip
+        self._cache = cache if cache is not None else get_cache()
+        self._metrics = metrics
+        self._timeout = timeout
 
         self._session = None
         self._uuid = None
+        self._uuid_from_cache = False
+
+        # the device serves one request at a time, so concurrent callers take turns on the session's connection
+        self._lock = threading.Lock()
 
         self._logger = getLogger(self.__class__.__name__)
-        self._logger.debug('{0}(); ip={1}'.format(
-            inspect.currentframe().f_code.co_name, repr(ip)
-        ))
+        self._logger.debug('__init__(); ip=%r', ip)
 
-    def get_uuid(self):
-        self._logger.debug('{0}()'.format(
-            inspect.currentframe().f_code.co_name,
-        ))
+    def get_uuid(self, deadline=None):
+        self._logger.debug('get_uuid()')
 
         uuid = self._session.get(
             'http://{0}/uuid'.format(self._ip),
-            timeout=5,
+            timeout=Deadline.of(deadline, self._timeout).timeout('GET /uuid'),
         ).text.split(',')[-1].strip()
 
-        self._logger.debug('{0}(); uuid={1}'.format(
-            inspect.currentframe().f_code.co_name, repr(uuid)
-        ))
+        self._logger.debug('get_uuid(); uuid=%r', uuid)
 
         return uuid
 
-    def connect(self):
-        self._logger.debug('{0}()'.format(
-            inspect.currentframe().f_code.co_name,
-        ))
+    def connect(self, deadline=None):
+        self._logger.debug('connect()')
 
         self._session = Session()
-        self._uuid = self.get_uuid()
 
-        self._logger.debug('{0}(); session={1}, uuid={2}'.format(
-            inspect.currentframe().f_code.co_name, self._session, repr(self._uuid)
-        ))
+        zmote = self._cache.get_by_ip(self._ip)
+        if zmote is not None:
+            self._uuid = zmote['UUID']
+            self._uuid_from_cache = True
+        else:
+            self._uuid = self.get_uuid(deadline)
+            self._uuid_from_cache = False
+            self._cache.update(self._uuid, self._ip)
+
+        self._logger.debug(
+            'connect(); session=%s, uuid=%r, uuid_from_cache=%s', self._session, self._uuid, self._uuid_from_cache
+        )
 
-    def call(self, data):
-        self._logger.debug('{0}({1})'.format(
-            inspect.currentframe().f_code.co_name, repr(data),
-        ))
+    def ping(self, deadline=None):
+        deadline = Deadline.of(deadline, self._timeout)
 
-        output = self._session.post(
-            url='http://{0}/v2/{1}'.format(
-                self._ip, self._uuid,
-            ),
-            data=data,
-            timeout=5,
-        ).text
+        _acquire(self._lock, deadline, 'GET /uuid')
+        try:
+            uuid = self.get_uuid(deadline)
+        finally:
+            self._lock.release()
 
-        self._logger.debug('{0}({1}); output={2}'.format(
-            inspect.currentframe().f_code.co_name, repr(data), repr(output)
-        ))
+        # the address answers but belongs to another device now
+        if uuid != self._uuid:
+            self._cache.invalidate(ip=self._ip)
+            raise ConnectionError('expected {0} at {1} but found {2}'.format(
+                repr(self._uuid), repr(self._ip), repr(uuid),
+            ))
+
+        return uuid
+
+    def _post(self, data, deadline):
+        try:
+            response = self._session.post(
+                url='http://{0}/v2/{1}'.format(
+                    self._ip, self._uuid,
+                ),
+                data=data,
+                timeout=deadline.timeout('POST /v2'),
+            )
+        except RequestException:
+            self._cache.invalidate(ip=self._ip)
+            raise
+
+        if not response.ok:
+            self._cache.invalidate(ip=self._ip)
+
+        return response
+
+    def call(self, data, deadline=None):
+        if self._metrics is None:
+            return self._call(data, deadline)
+
+        return instrument(self._metrics, self._ip, data, lambda x: self._call(x, deadline))
+
+    def _call(self, data, deadline=None):
+        self._logger.debug('call(%r)', data)
+
+        # one budget covers the POST, the UUID lookup and the retry, so a stale UUID cannot double the wait
+        deadline = Deadline.of(deadline, self._timeout)
+
+        payload = data.http_bytes if isinstance(data, IRCode) else data
+
+        _acquire(self._lock, deadline, 'POST /v2')
+        try:
+            response = self._post(payload, deadline)
+
+            # a cached UUID may belong to a device that has since been replaced at this IP; look it up and retry once
+            if not response.ok and self._uuid_from_cache:
+                self._uuid = self.get_uuid(deadline)
+                self._uuid_from_cache = False
+                self._cache.update(self._uuid, self._ip)
+
+                response = self._post(payload, deadline)
+        finally:
+            self._lock.release()
+
+        if not response.ok:
+            raise ConnectionError('POST /v2/{0} to {1} failed with {2}: {3}'.format(
+                self._uuid, repr(self._ip), response.status_code, repr(response.text),
+            ))
+
+        output = response.text
+
+        self._logger.debug('call(%r); output=%r', data, output)
 
         return output
 
     def disconnect(self):
-        self._logger.debug('{0}()'.format(
-            inspect.currentframe().f_code.co_name,
-        ))
+        self._logger.debug('disconnect()')
 
         self._session = None
 
 
+_TCP_PORT = 4998
+
+_RECV_SIZE = 4096
+
+_LEARN_COMMAND = 'get_IRL'
+_STOP_LEARN_COMMAND = 'stop_IRL'
+_LEARNER_ENABLED = 'IR Learner Enabled'
+_LEARNER_DISABLED = 'IR Learner Disabled'
+_SENDIR_PREFIX = 'sendir,'
+_LEARN_TIMEOUT = 60
+
+
+def _is_sendir(data):
+    return isinstance(data, IRCode) or data.startswith(_SENDIR_PREFIX)
+
+
+def _response_key(line):
+    # sendir requests and their completeir/busyIR responses share <module>:<connector>,<id> as their 2nd and 3rd fields
+    fields = line.split(',', 3)
+    if len(fields) < 3:
+        return None
+
+    return fields[1], fields[2]
+
+
+class _LineReader(object):
+    def __init__(self, size=_RECV_SIZE):
+        self._buf = bytearray(size)
+        self._view = memoryview(self._buf)
+        self._pending = bytearray()
+
+    def read_line(self, sock, deadline=None):
+        while True:
+            cr = self._pending.find(b'\r')
+            lf = self._pending.find(b'\n')
+            index = min(cr, lf) if cr >= 0 and lf >= 0 else max(cr, lf)
+
+            if index >= 0:
+                line = bytes(self._pending[0:index])
+                del self._pending[0:index + 1]
+
+                # skip the empty line left between a CR and LF
+                if line:
+                    return line.decode()
+
+                continue
+
+            if deadline is not None:
+                sock.settimeout(deadline.timeout('recv'))
+
+            count = sock.recv_into(self._buf)
+            if not count:
+                raise ConnectionResetError('connection closed by peer')
+
+            self._pending += self._view[0:count]
+
+
 class TCPTransport(object):
-    def __init__(self, ip):
+    def __init__(self, ip, keep_alive=False, metrics=None, port=_TCP_PORT, timeout=_TIMEOUT):
         self._ip = ip
+        self._port = port
+        self._metrics = metrics
+        self._timeout = timeout
 
         self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if keep_alive:
+            self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+        self._reader = _LineReader()
+        self._in_flight = []
+        self._responses_by_token = {}
+        self._abandoned_tokens = set()
+        self._learning_token = None
+        self._learning_abandoned = False
+        self._next_token = 0
+
+        # the send lock keeps requests whole and in in-flight order; one caller at a time reads for everyone
+        self._send_lock = threading.Lock()
+        self._condition = threading.Condition()
+        self._reading = False
 
         self._logger = getLogger(self.__class__.__name__)
-        self._logger.debug('{0}(); ip={1}'.format(
-            inspect.currentframe().f_code.co_name, repr(ip)
-        ))
+        self._logger.debug('__init__(); ip=%r', ip)
+
+    def connect(self, deadline=None):
+        self._logger.debug('connect()')
+
+        self._sock.settimeout(Deadline.of(deadline, self._timeout).timeout('connect'))
+        self._sock.connect((self._ip, self._port))
+
+    def _deliver(self, token, line):
+        if token in self._abandoned_tokens:
+            self._abandoned_tokens.discard(token)
+        else:
+            self._responses_by_token[token] = line
+
+    def _route(self, line):
+        # a sendir line from the device is only ever a learned code; it must never answer a pending sendir
+        if line.startswith(_SENDIR_PREFIX):
+            if self._learning_token is not None:
+                token, self._learning_token = self._learning_token, None
+                self._deliver(token, '{0}\r{1}'.format(_LEARNER_ENABLED, line))
+            elif self._learning_abandoned:
+                self._learning_abandoned = False
+                self._logger.debug('_route(%r); dropping code learned after its caller gave up', line)
+            else:
+                self._logger.warning('_route(%r); dropping unsolicited learned code', line)
+
+            return
+
+        # learning was stopped before a code came in; the learn call gets just the acknowledgement
+        if line == _LEARNER_DISABLED:
+            self._learning_abandoned = False
+
+            if self._learning_token is not None:
+                token, self._learning_token = self._learning_token, None
+                self._deliver(token, _LEARNER_ENABLED)
+
+        if not self._in_flight:
+            self._logger.warning('_route(%r); dropping unsolicited line', line)
+            return
+
+        key = _LEARN_COMMAND if line == _LEARNER_ENABLED else _response_key(line)
+
+        # match by ID where the response carries one, otherwise hand it to the oldest call still waiting
+        for i, (token, in_flight_key) in enumerate(self._in_flight):
+            if key is not None and in_flight_key == key:
+                break
+        else:
+            i = 0
+
+        token, _ = self._in_flight.pop(i)
+
+        if line == _LEARNER_ENABLED:
+            self._learning_token = token
+            self._learning_abandoned = False
+        else:
+            self._deliver(token, line)
+
+    def submit(self, data, deadline=None):
+        self._logger.debug('submit(%r)', data)
+
+        if isinstance(data, IRCode):
+            payload, key = data.tcp_bytes, data.key
+        else:
+            data = data.rstrip('\r')
+            payload = '{0}\r'.format(data).encode()
+            key = _LEARN_COMMAND if data == _LEARN_COMMAND else _response_key(data)
+
+        with self._send_lock:
+            # registered before sending so a fast response always finds its caller
+            with self._condition:
+                token = self._next_token
+                self._next_token += 1
+                self._in_flight.append((token, key))
+
+            try:
+                self._sock.settimeout(Deadline.of(deadline, self._timeout).timeout('send'))
+                self._sock.sendall(payload)
+            except Exception:
+                with self._condition:
+                    self._in_flight.remove((token, key))
+
+                raise
+
+        return token
+
+    def _abandon(self, token):
+        if token in self._responses_by_token:
+            del self._responses_by_token[token]
+        elif token == self._learning_token:
+            # the device is still learning; whatever code it sends later has nobody to go to
+            self._learning_token = None
+            self._learning_abandoned = True
+        else:
+            self._abandoned_tokens.add(token)
+
+    def result(self, token, deadline=None):
+        deadline = Deadline.of(deadline, self._timeout)
+
+        with self._condition:
+            try:
+                while token not in self._responses_by_token:
+                    if self._reading:
+                        self._condition.wait(deadline.timeout('result'))
+                        continue
+
+                    self._reading = True
+                    self._condition.release()
+                    try:
+                        line = self._reader.read_line(self._sock, deadline)
+                    finally:
+                        self._condition.acquire()
+                        self._reading = False
+                        self._condition.notify_all()
+
+                    self._route(line)
+            except Exception:
+                # a response that turns up after its caller gave up must not be handed to anyone else
+                self._abandon(token)
+                raise
+
+            buf = self._responses_by_token.pop(token)
+
+        self._logger.debug('result(%s); buf=%r', token, buf)
 
-    def connect(self):
-        self._logger.debug('{0}()'.format(
-            inspect.currentframe().f_code.co_name,
-        ))
+        return buf
 
-        self._sock.connect((self._ip, 4998))
+    def call_many(self, datas, deadline=None):
+        deadline = Deadline.of(deadline, self._timeout)
 
-    def call(self, data):
-        self._logger.debug('{0}({1})'.format(
-            inspect.currentframe().f_code.co_name, repr(data),
-        ))
+        return [self.result(x, deadline) for x in [self.submit(y, deadline) for y in datas]]
 
-        self._sock.send(data.encode())
+    def call(self, data, deadline=None):
+        if self._metrics is None:
+            return self._call(data, deadline)
 
-        buf = self._sock.recv(1024).decode()
-        if 'IR Learner Enabled' in buf:
-            buf += self._sock.recv(1024).decode()
+        return instrument(self._metrics, self._ip, data, lambda x: self._call(x, deadline))
 
-        self._logger.debug('{0}({1}); buf={2}'.format(
-            inspect.currentframe().f_code.co_name, repr(data), repr(buf)
-        ))
+    def _call(self, data, deadline=None):
+        self._logger.debug('call(%r)', data)
+
+        deadline = Deadline.of(deadline, self._timeout)
+
+        # learn mode acknowledges first and sends the learned code as a second line; _route joins them
+        buf = self.result(self.submit(data, deadline), deadline)
+
+        self._logger.debug('call(%r); buf=%r', data, buf)
 
         return buf
 
+    def ping(self, deadline=None):
+        # a cheap round trip that proves the session is still alive; kept out of the metrics on purpose
+        return self._call('getversion', deadline)
+
     def disconnect(self):
-        self._logger.debug('{0}()'.format(
-            inspect.currentframe().f_code.co_name,
-        ))
+        self._logger.debug('disconnect()')
 
         self._sock.close()
 
 
 class Connector(object):
-    def __init__(self, transport):
+    def __init__(self, transport, library=None):
         self._transport = transport
+        self._library = library
 
         self._logger = getLogger(self.__class__.__name__)
-        self._logger.debug('{0}(); transport={1}'.format(
-            inspect.currentframe().f_code.co_name, transport
-        ))
+        self._logger.debug('__init__(); transport=%s', transport)
 
-    def connect(self):
-        self._logger.debug('{0}()'.format(
-            inspect.currentframe().f_code.co_name
-        ))
+    def connect(self, deadline=None):
+        self._logger.debug('connect()')
 
-        self._transport.connect()
+        self._transport.connect(deadline=deadline)
 
-    def send(self, data):
-        self._logger.debug('{0}({1})'.format(
-            inspect.currentframe().f_code.co_name, repr(data)
-        ))
+    def send(self, data, deadline=None):
+        self._logger.debug('send(%r)', data)
 
-        data = data.split('sendir,')[-1]
+        if isinstance(data, IRCode):
+            output = self._transport.call(data, deadline=deadline)
+        else:
+            data = data.split('sendir,')[-1]
 
-        output = self._transport.call('sendir,{0}'.format(data))
+            output = self._transport.call('sendir,{0}'.format(data), deadline=deadline)
 
-        self._logger.debug('{0}({1}); output={2}'.format(
-            inspect.currentframe().f_code.co_name, repr(data), repr(output)
-        ))
+        self._logger.debug('send(%r); output=%r', data, output)
 
         return output
 
-    def learn(self):
-        self._logger.debug('{0}()'.format(
-            inspect.currentframe().f_code.co_name
-        ))
+    def send_named(self, device, button, deadline=None):
+        self._logger.debug('send_named(%r, %r)', device, button)
 
-        data = self._transport.call('get_IRL')
+        if self._library is None:
+            raise ValueError('cannot send named code {0}; no library given'.format(repr((device, button))))
 
-        self._logger.debug('{0}(); data={1}'.format(
-            inspect.currentframe().f_code.co_name, repr(data)
-        ))
+        return self.send(self._library.get_named(device, button), deadline=deadline)
+
+    def learn(self, deadline=None):
+        self._logger.debug('learn()')
+
+        # learning waits on someone pressing a remote, so it gets a longer budget than a send
+        try:
+            data = self._transport.call(_LEARN_COMMAND, deadline=Deadline.of(deadline, _LEARN_TIMEOUT))
+        except Exception:
+            self._stop_learning()
+            raise
+
+        self._logger.debug('learn(); data=%r', data)
 
         return data.split('sendir,')[-1]
 
+    def _stop_learning(self):
+        # the device stays in learn mode until told otherwise
+        try:
+            self._transport.call(_STOP_LEARN_COMMAND)
+        except Exception as e:
+            self._logger.warning('_stop_learning(); exception=%r', e)
+
+    def learn_code(self, deadline=None):
+        return IRCode.parse(self.learn(deadline))
+
     def disconnect(self):
-        self._logger.debug('{0}()'.format(
-            inspect.currentframe().f_code.co_name
-        ))
+        self._logger.debug('disconnect()')
 
         self._transport.disconnect()
 
 
+_BATCH_CALL_TYPES = ('send', 'learn')
+
+
+def _parse_batch_line(line, device=None):
+    line = line.strip()
+
+    if line.startswith('{'):
+        try:
+            command = json.loads(line)
+        except ValueError as e:
+            raise ValueError('cannot parse command {0} ({1})'.format(repr(line), e))
+
+        device = command.get('device', device)
+        payload = command.get('payload')
+        call_type = command.get('call', 'send' if payload is not None else None)
+    else:
+        # [device] call-type [payload]
+        fields = line.split()
+        if fields[0] not in _BATCH_CALL_TYPES:
+            device, fields = fields[0], fields[1:]
+
+        call_type = fields[0] if fields else None
+        payload = fields[1] if len(fields) > 1 else None
+
+    if device is None:
+        raise ValueError('cannot run command {0}; no device given'.format(repr(line)))
+
+    if call_type not in _BATCH_CALL_TYPES:
+        raise ValueError('cannot run command {0}; call type must be one of {1}'.format(
+            repr(line), ', '.join(_BATCH_CALL_TYPES)
+        ))
+
+    if call_type == 'send' and payload is None:
+        raise ValueError('cannot run command {0}; send needs a payload'.format(repr(line)))
+
+    return device, call_type, payload
+
+
+def run_batch(lines, transport_class=HTTPTransport, device=None):
+    connectors_by_device = {}
+
+    try:
+        for number, line in enumerate(lines, 1):
+            if not line.strip() or line.lstrip().startswith('#'):
+                continue
+
+            result = {'line': number}
+            before = time.monotonic()
+
+            try:
+                command_device, call_type, payload = _parse_batch_line(line, device)
+            except ValueError as e:
+                result.update(output=None, error=str(e), latency=0)
+                yield result
+                continue
+
+            result.update(device=command_device, call=call_type)
+
+            try:
+                # one connection per device for the whole batch
+                connector = connectors_by_device.get(command_device)
+                if connector is None:
+                    connector = Connector(transport=transport_class(ip=command_device))
+                    connector.connect()
+                    connectors_by_device[command_device] = connector
+
+                if call_type == 'send':
+                    output = connector.send(payload)
+                else:
+                    output = connector.learn()
+
+                result.update(output=output, error=None)
+            except Exception as e:
+                result.update(output=None, error=repr(e))
+
+                # reconnect for the next command rather than reuse a connection in an unknown state
+                connector = connectors_by_device.pop(command_device, None)
+                if connector is not None:
+                    try:
+                        connector.disconnect()
+                    except Exception:
+                        pass
+
+            result['latency'] = time.monotonic() - before
+
+            yield result
+    finally:
+        for connector in connectors_by_device.values():
+            connector.disconnect()
+
+
 if __name__ == '__main__':
     import argparse
+    import sys
 
     import logging
 
@@ -202,15 +579,15 @@ if __name__ == '__main__':
         '-d',
         '--device-ip-or-hostname',
         type=str,
-        required=True,
-        help='IP or hostname of the device',
+        default=None,
+        help='IP or hostname of the device (optional in batch mode where commands may name their own)',
     )
 
     parser.add_argument(
         '-c',
         '--call-type',
         choices=['learn', 'send'],
-        required=True,
+        default=None,
         help='type of call to make to the device'
     )
 
@@ -222,8 +599,39 @@ if __name__ == '__main__':
         help='payload to send (applicable for send call-type only)',
     )
 
+    parser.add_argument(
+        '-b',
+        '--batch',
+        type=str,
+        nargs='?',
+        const='-',
+        default=None,
+        metavar='FILE',
+        help='run commands read from FILE (or stdin), one per line as "[device] send|learn [payload]" or JSON '
+             '{"device", "call", "payload"}, and write results as JSON lines',
+    )
+
     args = parser.parse_args()
 
+    if args.batch is not None:
+        transport_class = HTTPTransport if args.transport == 'http' else TCPTransport
+
+        f = sys.stdin if args.batch == '-' else open(args.batch, 'r')
+        try:
+            for result in run_batch(f, transport_class=transport_class, device=args.device_ip_or_hostname):
+                sys.stdout.write(json.dumps(result) + '\n')
+                sys.stdout.flush()
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
+        sys.exit(0)
+
+    if args.device_ip_or_hostname is None or args.call_type is None:
+        parser.error(
+            'arguments -d/--device-ip-or-hostname and -c/--call-type are required outside of batch mode'
+        )
+
     transport = None
     if args.transport == 'http':
         transport = HTTPTransport(
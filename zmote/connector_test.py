@@ -1,25 +1,50 @@
+import threading
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 
-from hamcrest import assert_that, equal_to
+from hamcrest import assert_that, contains_string, equal_to
 from mock import patch, call, MagicMock
+from requests import RequestException
 
-from zmote.connector import HTTPTransport, TCPTransport
+from zmote.cache import DeviceCache
+from zmote.connector import Connector, HTTPTransport, TCPTransport, run_batch
+from zmote.ircode import IRCode
 from zmote.discoverer_test import _UUID
+from zmote.simulator import Simulator, _LEARNED_CODE
 
 _TEST_SENDIR_REQUEST = 'sendir,1:1,0,36000,1,1,32,32,64,32,32,64,32,3264'
 
 _TEST_SENDIR_RESPONSE = b'completeir,1:1,0'
 
 
+def _recv_into(*chunks):
+    chunks = list(chunks)
+
+    def recv_into(buf):
+        chunk = chunks.pop(0)
+        buf[0:len(chunk)] = chunk
+        return len(chunk)
+
+    return recv_into
+
+
 class HTTPTransportTest(unittest.TestCase):
     def setUp(self):
+        self._cache = DeviceCache()
+
         self._subject = HTTPTransport(
             ip='192.168.1.12',
+            cache=self._cache,
         )
 
         self._subject._session = MagicMock()
         self._subject._uuid = _UUID
 
+        # freeze the clock so each request's remaining budget is the whole timeout
+        patcher = patch('zmote.deadline.time')
+        patcher.start().monotonic.return_value = 0
+        self.addCleanup(patcher.stop)
+
     @patch('zmote.connector.Session')
     def test_connect(self, session):
         session.get.return_value = 'uuid,{0}'.format(_UUID)
@@ -33,9 +58,98 @@ class HTTPTransportTest(unittest.TestCase):
             ])
         )
 
+    @patch('zmote.connector.Session')
+    def test_connect_cached(self, session):
+        self._cache.update(_UUID, self._subject._ip)
+
+        self._subject.connect()
+
+        assert_that(
+            session().get.mock_calls,
+            equal_to([])
+        )
+
+        assert_that(
+            self._subject._uuid,
+            equal_to(_UUID)
+        )
+
+    @patch('zmote.connector.Session')
+    def test_connect_fills_cache(self, session):
+        session().get.return_value.text = 'uuid,{0}'.format(_UUID)
+
+        self._subject.connect()
+
+        assert_that(
+            self._cache.get_by_ip(self._subject._ip)['UUID'],
+            equal_to(_UUID)
+        )
+
+    def test_call_failure_invalidates_cache(self):
+        self._cache.update(_UUID, self._subject._ip)
+        self._subject._session.post.side_effect = RequestException()
+
+        self.assertRaises(
+            RequestException,
+            self._subject.call, _TEST_SENDIR_REQUEST
+        )
+
+        assert_that(
+            self._cache.get_by_ip(self._subject._ip),
+            equal_to(None)
+        )
+
+    def test_call_stale_cached_uuid(self):
+        self._cache.update('CI00ffffff', self._subject._ip)
+        self._subject._uuid = 'CI00ffffff'
+        self._subject._uuid_from_cache = True
+
+        stale_response = MagicMock()
+        stale_response.ok = False
+        mock_response = MagicMock()
+        mock_response.text = _TEST_SENDIR_RESPONSE
+        mock_response.ok = True
+        self._subject._session.post.side_effect = [stale_response, mock_response]
+        self._subject._session.get.return_value.text = 'uuid,{0}'.format(_UUID)
+
+        assert_that(
+            self._subject.call(_TEST_SENDIR_REQUEST),
+            equal_to(_TEST_SENDIR_RESPONSE)
+        )
+
+        assert_that(
+            self._subject._session.post.mock_calls[-1],
+            equal_to(call(
+                url='http://{0}/v2/{1}'.format(self._subject._ip, _UUID),
+                data=_TEST_SENDIR_REQUEST,
+                timeout=5,
+            ))
+        )
+
+        assert_that(
+            self._cache.get_by_ip(self._subject._ip)['UUID'],
+            equal_to(_UUID)
+        )
+
+    def test_call_error_status(self):
+        self._cache.update(_UUID, self._subject._ip)
+
+        self._subject._session.post.return_value.ok = False
+        self._subject._session.post.return_value.status_code = 404
+        self._subject._session.post.return_value.text = ''
+
+        with self.assertRaises(ConnectionError):
+            self._subject.call(_TEST_SENDIR_REQUEST)
+
+        assert_that(
+            self._cache.get_by_ip(self._subject._ip),
+            equal_to(None)
+        )
+
     def test_call(self):
         mock_response = MagicMock()
         mock_response.text = _TEST_SENDIR_RESPONSE
+        mock_response.ok = True
 
         self._subject._session.post.return_value = mock_response
 
@@ -76,6 +190,11 @@ class TCPTransportTest(unittest.TestCase):
 
         self._subject._sock = MagicMock()
 
+        patcher = patch('zmote.deadline.time')
+        self._time = patcher.start()
+        self._time.monotonic.return_value = 0
+        self.addCleanup(patcher.stop)
+
         assert_that(
             socket.mock_calls,
             equal_to([
@@ -89,12 +208,13 @@ class TCPTransportTest(unittest.TestCase):
         assert_that(
             self._subject._sock.mock_calls,
             equal_to([
-                call.connect((self._subject._ip, 4998))
+                call.settimeout(5),
+                call.connect((self._subject._ip, 4998)),
             ])
         )
 
     def test_call(self):
-        self._subject._sock.recv.return_value = _TEST_SENDIR_RESPONSE
+        self._subject._sock.recv_into.side_effect = _recv_into(_TEST_SENDIR_RESPONSE + b'\r')
 
         assert_that(
             self._subject.call(_TEST_SENDIR_REQUEST),
@@ -102,13 +222,84 @@ class TCPTransportTest(unittest.TestCase):
         )
 
         assert_that(
-            self._subject._sock.mock_calls,
+            self._subject._sock.sendall.mock_calls,
+            equal_to([
+                call(b'sendir,1:1,0,36000,1,1,32,32,64,32,32,64,32,3264\r'),
+            ])
+        )
+
+    def test_call_code(self):
+        self._subject._sock.recv_into.side_effect = _recv_into(_TEST_SENDIR_RESPONSE + b'\r')
+
+        self._subject.call(IRCode.parse(_TEST_SENDIR_REQUEST))
+
+        assert_that(
+            self._subject._sock.sendall.mock_calls,
+            equal_to([
+                call(b'sendir,1:1,0,36000,1,1,32,32,64,32,32,64,32,3264\r'),
+            ])
+        )
+
+    def test_call_split_response(self):
+        self._subject._sock.recv_into.side_effect = _recv_into(b'completeir,1:', b'1,0\r')
+
+        assert_that(
+            self._subject.call(_TEST_SENDIR_REQUEST),
+            equal_to(_TEST_SENDIR_RESPONSE.decode())
+        )
+
+    def test_call_learn(self):
+        self._subject._sock.recv_into.side_effect = _recv_into(
+            b'IR Learner Enabled\r',
+            _TEST_SENDIR_REQUEST.encode() + b'\r',
+        )
+
+        assert_that(
+            self._subject.call('get_IRL'),
+            equal_to('IR Learner Enabled\r' + _TEST_SENDIR_REQUEST)
+        )
+
+    def test_call_many(self):
+        # responses arrive coalesced and out of order
+        self._subject._sock.recv_into.side_effect = _recv_into(
+            b'completeir,1:1,2\rcompleteir,1:1,1\r',
+        )
+
+        assert_that(
+            self._subject.call_many([
+                'sendir,1:1,1,36000,1,1,32,32',
+                'sendir,1:1,2,36000,1,1,64,64',
+            ]),
+            equal_to([
+                'completeir,1:1,1',
+                'completeir,1:1,2',
+            ])
+        )
+
+    def test_call_many_learn_interleaved(self):
+        # a send completes while learn mode waits for a remote
+        self._subject._sock.recv_into.side_effect = _recv_into(
+            b'IR Learner Enabled\r',
+            b'completeir,1:1,5\r',
+            _TEST_SENDIR_REQUEST.encode() + b'\r',
+        )
+
+        assert_that(
+            self._subject.call_many(['get_IRL', 'sendir,1:1,5,36000,1,1,32,32']),
             equal_to([
-                call.send(b'sendir,1:1,0,36000,1,1,32,32,64,32,32,64,32,3264'),
-                call.recv(1024)
+                'IR Learner Enabled\r' + _TEST_SENDIR_REQUEST,
+                'completeir,1:1,5',
             ])
         )
 
+    def test_call_closed(self):
+        self._subject._sock.recv_into.return_value = 0
+
+        self.assertRaises(
+            ConnectionResetError,
+            self._subject.call, _TEST_SENDIR_REQUEST
+        )
+
     def test_disconnect(self):
         self._subject.disconnect()
 
@@ -118,3 +309,209 @@ class TCPTransportTest(unittest.TestCase):
                 call.close()
             ])
         )
+
+
+class ConnectorTest(unittest.TestCase):
+    def setUp(self):
+        self._transport = MagicMock()
+        self._transport.call.return_value = _TEST_SENDIR_RESPONSE.decode()
+
+        self._subject = Connector(
+            transport=self._transport,
+        )
+
+    def test_send(self):
+        self._subject.send('1:1,0,36000,1,1,32,32,64,32,32,64,32,3264')
+
+        assert_that(
+            self._transport.call.mock_calls,
+            equal_to([
+                call(_TEST_SENDIR_REQUEST, deadline=None),
+            ])
+        )
+
+    def test_send_code(self):
+        code = IRCode.parse(_TEST_SENDIR_REQUEST)
+
+        self._subject.send(code)
+
+        assert_that(
+            self._transport.call.mock_calls,
+            equal_to([
+                call(code, deadline=None),
+            ])
+        )
+
+    def test_learn_code(self):
+        self._transport.call.return_value = 'IR Learner Enabled\r' + _TEST_SENDIR_REQUEST
+
+        assert_that(
+            self._subject.learn_code(),
+            equal_to(IRCode.parse(_TEST_SENDIR_REQUEST))
+        )
+
+
+class SharedConnectorTest(unittest.TestCase):
+    def setUp(self):
+        self._simulator = Simulator()
+        self._simulator.start()
+        self.addCleanup(self._simulator.stop)
+
+        self._zmote = self._simulator.add(latency=0.001, learn_delay=0.2)[0]
+
+    def _connect(self, connector):
+        connector.connect()
+        self.addCleanup(connector.disconnect)
+
+        return connector
+
+    def _send_concurrently(self, connector, count=32):
+        def send(i):
+            return connector.send('1:1,{0},36000,1,1,32,32'.format(i))
+
+        with ThreadPoolExecutor(max_workers=count) as executor:
+            return list(executor.map(send, range(0, count)))
+
+    def test_tcp(self):
+        connector = self._connect(Connector(TCPTransport(ip=self._zmote.host, port=self._zmote.tcp_port)))
+
+        learned = []
+        learner = threading.Thread(target=lambda: learned.append(connector.learn(deadline=5)))
+        learner.start()
+
+        # each caller gets its own response back over the one connection, while learn mode is waiting
+        assert_that(
+            self._send_concurrently(connector),
+            equal_to(['completeir,1:1,{0}'.format(x) for x in range(0, 32)])
+        )
+
+        learner.join()
+
+        assert_that(learned, equal_to([_LEARNED_CODE.split('sendir,')[-1]]))
+
+    def test_tcp_learn_timeout_then_send(self):
+        zmote = self._simulator.add(latency=0.2, learn_delay=0.5)[0]
+        transport = TCPTransport(ip=zmote.host, port=zmote.tcp_port)
+        connector = self._connect(Connector(transport))
+
+        # the device is left learning, so its code turns up while the next send is waiting
+        with self.assertRaises(TimeoutError):
+            transport.call('get_IRL', deadline=0.4)
+
+        assert_that(connector.send('1:1,0,36000,1,1,32,32'), equal_to('completeir,1:1,0'))
+        assert_that(connector.send('1:1,1,36000,1,1,32,32'), equal_to('completeir,1:1,1'))
+
+    def test_tcp_learn_timeout_stops_learning(self):
+        zmote = self._simulator.add(latency=0.2, learn_delay=0.5)[0]
+        connector = self._connect(Connector(TCPTransport(ip=zmote.host, port=zmote.tcp_port)))
+
+        with self.assertRaises(TimeoutError):
+            connector.learn(deadline=0.4)
+
+        assert_that(zmote.received, equal_to(['get_IRL', 'stop_IRL']))
+        assert_that(connector.send('1:1,0,36000,1,1,32,32'), equal_to('completeir,1:1,0'))
+
+    def test_http(self):
+        connector = self._connect(Connector(HTTPTransport(ip=self._zmote.ip, cache=DeviceCache())))
+
+        assert_that(
+            self._send_concurrently(connector, count=8),
+            equal_to(['completeir,1:1,{0}'.format(x) for x in range(0, 8)])
+        )
+
+
+class RunBatchTest(unittest.TestCase):
+    def setUp(self):
+        self._transports = {}
+
+        def transport_class(ip):
+            transport = self._transports[ip] = MagicMock()
+            transport.call.side_effect = lambda data, deadline=None: (
+                'IR Learner Enabled\r' + _TEST_SENDIR_REQUEST if data == 'get_IRL' else _TEST_SENDIR_RESPONSE.decode()
+            )
+
+            return transport
+
+        self._transport_class = MagicMock(side_effect=transport_class)
+
+    def _run(self, lines, device=None):
+        results = list(run_batch(lines, transport_class=self._transport_class, device=device))
+        for result in results:
+            del result['latency']
+
+        return results
+
+    def test_lines(self):
+        assert_that(
+            self._run([
+                'send 1:1,0,36000,1,1,32,32\n',
+                '\n',
+                '# comment\n',
+                '192.168.1.13 learn\n',
+                'send 1:1,0,36000,1,1,32,32\n',
+            ], device='192.168.1.12'),
+            equal_to([
+                {'line': 1, 'device': '192.168.1.12', 'call': 'send', 'output': 'completeir,1:1,0', 'error': None},
+                {
+                    'line': 4, 'device': '192.168.1.13', 'call': 'learn',
+                    'output': '1:1,0,36000,1,1,32,32,64,32,32,64,32,3264', 'error': None,
+                },
+                {'line': 5, 'device': '192.168.1.12', 'call': 'send', 'output': 'completeir,1:1,0', 'error': None},
+            ])
+        )
+
+        # one connection per device for the whole batch
+        assert_that(
+            self._transport_class.call_args_list,
+            equal_to([call(ip='192.168.1.12'), call(ip='192.168.1.13')])
+        )
+
+        for transport in self._transports.values():
+            transport.connect.assert_called_once_with(deadline=None)
+            transport.disconnect.assert_called_once_with()
+
+    def test_json(self):
+        assert_that(
+            self._run([
+                '{"device": "192.168.1.12", "call": "send", "payload": "1:1,0,36000,1,1,32,32"}',
+                '{"device": "192.168.1.12", "payload": "1:1,0,36000,1,1,32,32"}',
+            ]),
+            equal_to([
+                {'line': 1, 'device': '192.168.1.12', 'call': 'send', 'output': 'completeir,1:1,0', 'error': None},
+                {'line': 2, 'device': '192.168.1.12', 'call': 'send', 'output': 'completeir,1:1,0', 'error': None},
+            ])
+        )
+
+    def test_errors(self):
+        results = self._run([
+            'send 1:1,0,36000,1,1,32,32',
+            '{"device": ',
+            '192.168.1.12 send',
+        ])
+
+        assert_that(
+            [(x['line'], x['output']) for x in results],
+            equal_to([(1, None), (2, None), (3, None)])
+        )
+
+        assert_that(results[0]['error'], contains_string('no device given'))
+        assert_that(results[1]['error'], contains_string('cannot parse command'))
+        assert_that(results[2]['error'], contains_string('send needs a payload'))
+
+        self._transport_class.assert_not_called()
+
+    def test_failure_reconnects(self):
+        self._transport_class.side_effect = None
+        self._transport_class.return_value.call.side_effect = [ConnectionResetError(), 'completeir,1:1,0']
+
+        results = self._run(['send 1:1,0,36000,1,1,32,32'] * 2, device='192.168.1.12')
+
+        assert_that(
+            [x['error'] for x in results],
+            equal_to(['ConnectionResetError()', None])
+        )
+
+        assert_that(
+            self._transport_class.call_count,
+            equal_to(2)
+        )
@@ -0,0 +1,37 @@
+import time
+
+
+class Deadline(object):
+    __slots__ = ('_expires_at',)
+
+    def __init__(self, timeout=None):
+        self._expires_at = time.monotonic() + timeout if timeout is not None else None
+
+    @classmethod
+    def of(cls, deadline, default=None):
+        # accept an existing Deadline (so one budget spans several operations), seconds, or None for the default
+        if isinstance(deadline, Deadline):
+            return deadline
+
+        return cls(deadline if deadline is not None else default)
+
+    def remaining(self):
+        if self._expires_at is None:
+            return None
+
+        return max(0, self._expires_at - time.monotonic())
+
+    @property
+    def expired(self):
+        return self._expires_at is not None and time.monotonic() >= self._expires_at
+
+    def timeout(self, operation):
+        # a timeout of 0 would put a socket into non-blocking mode, so an exhausted budget has to raise here
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            raise TimeoutError('deadline passed before {0}'.format(operation))
+
+        return remaining
+
+    def __repr__(self):
+        return '{0}(remaining={1})'.format(self.__class__.__name__, self.remaining())
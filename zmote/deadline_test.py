@@ -0,0 +1,83 @@
+import time
+import unittest
+
+from hamcrest import assert_that, equal_to, less_than
+from mock import patch
+
+from zmote.cache import DeviceCache
+from zmote.connector import Connector, HTTPTransport, TCPTransport
+from zmote.connector_test import _TEST_SENDIR_REQUEST
+from zmote.deadline import Deadline
+from zmote.simulator import Simulator
+
+
+class DeadlineTest(unittest.TestCase):
+    @patch('zmote.deadline.time')
+    def test_remaining(self, mock_time):
+        mock_time.monotonic.return_value = 10
+        subject = Deadline(0.3)
+
+        mock_time.monotonic.return_value = 10.1
+
+        assert_that(round(subject.remaining(), 6), equal_to(0.2))
+        assert_that(subject.expired, equal_to(False))
+
+        mock_time.monotonic.return_value = 11
+
+        assert_that(subject.remaining(), equal_to(0))
+        assert_that(subject.expired, equal_to(True))
+
+        with self.assertRaises(TimeoutError):
+            subject.timeout('recv')
+
+    def test_unbounded(self):
+        subject = Deadline()
+
+        assert_that(subject.remaining(), equal_to(None))
+        assert_that(subject.timeout('recv'), equal_to(None))
+        assert_that(subject.expired, equal_to(False))
+
+    def test_of(self):
+        deadline = Deadline(1)
+
+        assert_that(Deadline.of(deadline, 5), equal_to(deadline))
+        assert_that(Deadline.of(None, 5).remaining(), less_than(5.001))
+        assert_that(Deadline.of(0.5, 5).remaining(), less_than(0.501))
+
+
+class DeadlineTransportTest(unittest.TestCase):
+    def setUp(self):
+        self._simulator = Simulator()
+        self._simulator.start()
+        self.addCleanup(self._simulator.stop)
+
+        self._zmote = self._simulator.add(latency=1)[0]
+
+    def _assert_fails_fast(self, transport):
+        connector = Connector(transport)
+        connector.connect()
+        self.addCleanup(connector.disconnect)
+
+        before = time.monotonic()
+        with self.assertRaises(Exception):
+            connector.send(_TEST_SENDIR_REQUEST, deadline=0.3)
+
+        assert_that(time.monotonic() - before, less_than(0.8))
+
+    def test_http(self):
+        self._assert_fails_fast(HTTPTransport(ip=self._zmote.ip, cache=DeviceCache()))
+
+    def test_tcp(self):
+        self._assert_fails_fast(TCPTransport(ip=self._zmote.host, port=self._zmote.tcp_port))
+
+    def test_spent_before_call(self):
+        connector = Connector(TCPTransport(ip=self._zmote.host, port=self._zmote.tcp_port))
+        connector.connect()
+        self.addCleanup(connector.disconnect)
+
+        deadline = Deadline(0)
+
+        with self.assertRaises(TimeoutError):
+            connector.send(_TEST_SENDIR_REQUEST, deadline=deadline)
+
+        assert_that(self._zmote.received, equal_to([]))
@@ -1,97 +1,297 @@
-import inspect
+import ipaddress
+import select
 import socket
+import sys
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from logging import getLogger
 
 import struct
+from requests import RequestException, get
 
-socket.setdefaulttimeout(30)
+from zmote.cache import get_cache
+from zmote.connector import _TCP_PORT
+from zmote.deadline import Deadline
 
 _GROUP = '239.255.250.250'
 _RECEIVE_PORT = 9131
 _SEND_PORT = 9130
 
+_AMXB_PREFIX = b'AMXB'
+_ZMOTE_MAKE = b'<-Make=zmote'
+_REQUIRED_KEYS = ('UUID', 'Type', 'Make', 'Model', 'Revision', 'Config-URL')
+
+_PARSE_CACHE_SIZE = 256
+
+_DEADLINE = 30
+_PROBE_INITIAL_INTERVAL = 0.05
+_PROBE_MAX_INTERVAL = 2
+
+_SIOCGIFADDR = 0x8915
+
+_HTTP_PORT = 80
+_SWEEP_MAX_WORKERS = 64
+_SWEEP_HOST_TIMEOUT = 0.5
+
+
+def _linux_interface_addresses():
+    import fcntl
+
+    addresses = []
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        for _, name in socket.if_nameindex():
+            try:
+                ifreq = fcntl.ioctl(sock.fileno(), _SIOCGIFADDR, struct.pack('256s', name[0:15].encode()))
+            except OSError:
+                # no IPv4 address on this interface
+                continue
+
+            addresses.append(socket.inet_ntoa(ifreq[20:24]))
+    finally:
+        sock.close()
+
+    return addresses
+
+
+def interface_addresses():
+    addresses = []
+    if sys.platform.startswith('linux'):
+        try:
+            addresses = _linux_interface_addresses()
+        except (ImportError, OSError):
+            pass
+
+    if not addresses:
+        try:
+            addresses = socket.gethostbyname_ex(socket.gethostname())[2]
+        except OSError:
+            pass
+
+    return [x for x in addresses if not x.startswith('127.')]
+
+
+def _parse_beacon(data):
+    # cheap rejects first; most AMX beacons on a busy segment are from other vendors
+    if not data.startswith(_AMXB_PREFIX) or _ZMOTE_MAKE not in data:
+        raise ValueError('cannot parse data {0}; does not appear to be in correct format'.format(repr(data)))
+
+    parsed_data = {}
+    for field in data.split(b'<-')[1:]:
+        key, _, value = field.rstrip(b'>').partition(b'=')
+        parsed_data[key.decode('ascii')] = value.decode('ascii')
+
+    for key in _REQUIRED_KEYS:
+        if key not in parsed_data:
+            raise ValueError('cannot parse data {0}; missing {1}'.format(repr(data), key))
+
+    return parsed_data
+
+
+def _ip_from_config_url(config_url):
+    return config_url.split('//')[-1].strip('/')
+
 
 class Discoverer(object):
-    def __init__(self):
+    def __init__(self, cache=None, interfaces=None):
+        self._cache = cache if cache is not None else get_cache()
+        self._interfaces = list(interfaces) if interfaces is not None else None
+
         self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
         self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
-        mreq = struct.pack(
-            "4sL",
-            socket.inet_aton(_GROUP),
-            socket.INADDR_ANY
-        )
-        self._sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+        if self._interfaces is None:
+            mreq = struct.pack(
+                "4sL",
+                socket.inet_aton(_GROUP),
+                socket.INADDR_ANY
+            )
+            self._sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+        else:
+            # join on every interface explicitly; INADDR_ANY only joins on whichever one the kernel picks
+            for interface in self._interfaces:
+                mreq = struct.pack(
+                    "4s4s",
+                    socket.inet_aton(_GROUP),
+                    socket.inet_aton(interface)
+                )
+                self._sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+
+        self._send_socks_by_interface = {}
+
+        self._parsed_by_payload = {}
+        self._rejected_payloads = set()
 
         self._logger = getLogger(self.__class__.__name__)
-        self._logger.debug('{0}()'.format(
-            inspect.currentframe().f_code.co_name
-        ))
+        self._logger.debug('__init__(); interfaces=%s', self._interfaces)
 
     def bind(self):
-        self._logger.debug('{0}()'.format(
-            inspect.currentframe().f_code.co_name,
-        ))
+        self._logger.debug('bind()')
 
         self._sock.bind((_GROUP, _RECEIVE_PORT))
 
+    def fileno(self):
+        return self._sock.fileno()
+
+    def setblocking(self, flag):
+        self._sock.setblocking(flag)
+
+    def close(self):
+        self._logger.debug('close()')
+
+        self._sock.close()
+        for sock in self._send_socks_by_interface.values():
+            sock.close()
+
+        self._send_socks_by_interface = {}
+
+    def sockets(self):
+        return [self._sock] + list(self._send_socks_by_interface.values())
+
+    def _send_sock(self, interface):
+        sock = self._send_socks_by_interface.get(interface)
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+            if interface is not None:
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
+
+            self._send_socks_by_interface[interface] = sock
+
+        return sock
+
     def send(self):
-        self._logger.debug('{0}()'.format(
-            inspect.currentframe().f_code.co_name,
-        ))
+        self._logger.debug('send()')
 
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
-        sock.sendto(b'SENDAMXB', (_GROUP, _SEND_PORT))
+        for interface in self._interfaces if self._interfaces is not None else [None]:
+            try:
+                self._send_sock(interface).sendto(b'SENDAMXB', (_GROUP, _SEND_PORT))
+            except OSError as e:
+                # one interface going down shouldn't stop probes out of the others
+                if self._interfaces is None:
+                    raise
 
-    def receive(self):
-        data = self._sock.recv(1024)
+                self._logger.warning('send(); interface=%s, exception=%r', interface, e)
 
-        self._logger.debug('{0}(); data={1}'.format(
-            inspect.currentframe().f_code.co_name, repr(data)
-        ))
+    def receive(self, sock=None):
+        data = (sock if sock is not None else self._sock).recv(1024)
+
+        self._logger.debug('receive(); data=%r', data)
 
         return data
 
     def parse(self, data):
-        self._logger.debug('{0}({1})'.format(
-            inspect.currentframe().f_code.co_name, repr(data)
-        ))
+        # repeat beacons are byte-for-byte identical, so the payload itself keys the dedupe
+        parsed_data = self._parsed_by_payload.get(data)
+        if parsed_data is not None:
+            return dict(parsed_data)
 
-        data = data.decode('ascii')
+        if data in self._rejected_payloads:
+            raise ValueError('cannot parse data {0}; does not appear to be in correct format'.format(repr(data)))
 
-        if not data.startswith('AMXB') or not all(
-                [x in data for x in ['UUID', 'Type', 'Make', 'Model', 'Revision', 'Config-URL']]
-        ):
-            exception = ValueError(
-                'cannot parse data {0}; does not appear to be in correct format'.format(
-                    repr(data)
-                )
-            )
+        try:
+            parsed_data = _parse_beacon(data)
+        except ValueError:
+            if len(self._rejected_payloads) >= _PARSE_CACHE_SIZE:
+                self._rejected_payloads.clear()
 
-            self._logger.error('{0}({1}); exception={1}'.format(
-                inspect.currentframe().f_code.co_name, repr(data)
-            ))
+            self._rejected_payloads.add(data)
 
-            raise exception
+            self._logger.debug('parse(%r); rejected', data)
 
-        data = dict([x[0:-1].split('=') for x in data.split('<-')[1:]])
+            raise
 
-        self._logger.debug('{0}({1}); data={1}'.format(
-            inspect.currentframe().f_code.co_name, repr(data)
-        ))
+        if len(self._parsed_by_payload) >= _PARSE_CACHE_SIZE:
+            self._parsed_by_payload.clear()
 
-        return data
+        self._parsed_by_payload[data] = parsed_data
+
+        self._logger.debug('parse(%r); data=%r', data, parsed_data)
+
+        return dict(parsed_data)
+
+    def _zmote_from(self, data):
+        parsed_data = self.parse(data)
+
+        ip = _ip_from_config_url(parsed_data.get('Config-URL'))
+        parsed_data.update({
+            'IP': ip,
+        })
+
+        self._cache.update(parsed_data['UUID'], ip, parsed_data['Config-URL'])
+
+        return parsed_data
+
+    def discover_iter(self, deadline=_DEADLINE, quiet_period=None, probe=False, unique_zmote_limit=None,
+                      uuid_to_look_for=None):
+        if unique_zmote_limit is not None and uuid_to_look_for is not None:
+            raise ValueError('must specify only one (or neither) of unique_zmote_limit or uuid_to_look_for')
+
+        self._logger.debug('discover_iter(); deadline=%s, quiet_period=%s, probe=%s', deadline, quiet_period, probe)
+
+        seen_uuids = set()
+
+        remaining = Deadline.of(deadline, _DEADLINE).remaining()
+
+        started = time.monotonic()
+        give_up_at = started + remaining if remaining is not None else float('inf')
+        last_new_at = started
+
+        probe_interval = _PROBE_INITIAL_INTERVAL
+        next_probe_at = started if probe else None
+
+        while True:
+            now = time.monotonic()
+
+            # probe on an exponential backoff while listening, rather than probing up front then listening
+            if next_probe_at is not None and now >= next_probe_at:
+                self.send()
+                next_probe_at = now + probe_interval
+                probe_interval = min(probe_interval * 2, _PROBE_MAX_INTERVAL)
+
+            stop_at = give_up_at
+            if quiet_period is not None:
+                stop_at = min(stop_at, last_new_at + quiet_period)
+
+            if now >= stop_at:
+                break
+
+            wake_at = stop_at if next_probe_at is None else min(stop_at, next_probe_at)
+
+            # one select over the group socket and every per-interface probe socket
+            readable, _, _ = select.select(self.sockets(), [], [], max(0, wake_at - now))
+
+            for sock in readable:
+                try:
+                    zmote = self._zmote_from(self.receive(sock))
+                except ValueError:
+                    continue
+
+                if zmote['UUID'] in seen_uuids:
+                    continue
+
+                seen_uuids.add(zmote['UUID'])
+                last_new_at = time.monotonic()
 
-    def discover(self, unique_zmote_limit=None, uuid_to_look_for=None):
+                self._logger.debug('discover_iter(); zmote=%s, elapsed=%.3f', zmote, last_new_at - started)
+
+                yield zmote
+
+                if unique_zmote_limit is not None and len(seen_uuids) >= unique_zmote_limit:
+                    return
+
+                if uuid_to_look_for is not None and zmote['UUID'] == uuid_to_look_for:
+                    return
+
+    def discover(self, unique_zmote_limit=None, uuid_to_look_for=None, deadline=None):
         if unique_zmote_limit is not None and uuid_to_look_for is not None:
             raise ValueError('must specify only one (or neither) of unique_zmote_limit or uuid_to_look_for')
 
+        deadline = Deadline.of(deadline, _DEADLINE)
+
         zmotes_by_uuid = {}
 
-        self._logger.debug('{0}({1})'.format(
-            inspect.currentframe().f_code.co_name, unique_zmote_limit
-        ))
+        self._logger.debug('discover(%s)', unique_zmote_limit)
 
         def keep_waiting():
             if unique_zmote_limit is not None:
@@ -104,47 +304,164 @@ class Discoverer(object):
 
         while keep_waiting():
             try:
+                self._sock.settimeout(deadline.timeout('receive'))
                 data = self.receive()
-            except socket.timeout:
+            except TimeoutError:
                 break
 
-            parsed_data = self.parse(data)
-
-            ip = parsed_data.get('Config-URL').split('//')[-1].strip('/')
-            parsed_data.update({
-                'IP': ip,
-            })
+            try:
+                parsed_data = self._zmote_from(data)
+            except ValueError:
+                continue
 
             zmotes_by_uuid.update({
                 parsed_data['UUID']: parsed_data,
             })
 
-        self._logger.debug('{0}({1}); zmotes_by_uuid={2}'.format(
-            inspect.currentframe().f_code.co_name, unique_zmote_limit, zmotes_by_uuid
-        ))
+        self._logger.debug('discover(%s); zmotes_by_uuid=%s', unique_zmote_limit, zmotes_by_uuid)
 
         return zmotes_by_uuid
 
 
-def passive_discover_zmotes(unique_zmote_limit=None, uuid_to_look_for=None):
-    d = Discoverer()
+def passive_discover_zmotes(unique_zmote_limit=None, uuid_to_look_for=None, interfaces=None, deadline=None):
+    d = Discoverer(interfaces=interfaces)
     d.bind()
-    return d.discover(
-        unique_zmote_limit=unique_zmote_limit,
-        uuid_to_look_for=uuid_to_look_for,
-    )
+    try:
+        return d.discover(
+            unique_zmote_limit=unique_zmote_limit,
+            uuid_to_look_for=uuid_to_look_for,
+            deadline=deadline,
+        )
+    finally:
+        d.close()
 
 
-def active_discover_zmotes(unique_zmote_count=None, uuid_to_look_for=None):
-    d = Discoverer()
+def stream_discover_zmotes(unique_zmote_limit=None, uuid_to_look_for=None, deadline=_DEADLINE, quiet_period=None,
+                           active=True, interfaces=None):
+    d = Discoverer(interfaces=interfaces)
     d.bind()
-    for i in range(0, 5):
-        d.send()
-        time.sleep(0.1)
-    return d.discover(
-        unique_zmote_limit=unique_zmote_count,
-        uuid_to_look_for=uuid_to_look_for,
-    )
+    try:
+        for zmote in d.discover_iter(
+                deadline=deadline,
+                quiet_period=quiet_period,
+                probe=active,
+                unique_zmote_limit=unique_zmote_limit,
+                uuid_to_look_for=uuid_to_look_for,
+        ):
+            yield zmote
+    finally:
+        d.close()
+
+
+def active_discover_zmotes(unique_zmote_count=None, uuid_to_look_for=None, deadline=_DEADLINE, quiet_period=None,
+                           interfaces=None):
+    return {
+        x['UUID']: x for x in stream_discover_zmotes(
+            unique_zmote_limit=unique_zmote_count,
+            uuid_to_look_for=uuid_to_look_for,
+            deadline=deadline,
+            quiet_period=quiet_period,
+            interfaces=interfaces,
+        )
+    }
+
+
+def _sweep_host(host, http_port, tcp_port, timeout, logger):
+    deadline = Deadline(timeout)
+
+    # a refused or unanswered connect rules most of a subnet out far quicker than an HTTP request would
+    if tcp_port is not None:
+        try:
+            socket.create_connection((host, tcp_port), timeout=deadline.timeout('connect')).close()
+        except OSError:
+            return None
+
+    ip = host if http_port == _HTTP_PORT else '{0}:{1}'.format(host, http_port)
+
+    try:
+        response = get('http://{0}/uuid'.format(ip), timeout=deadline.timeout('GET /uuid'))
+    except (RequestException, TimeoutError) as e:
+        logger.debug('_sweep_host(%r); exception=%r', ip, e)
+
+        return None
+
+    if not response.ok or not response.text.startswith('uuid,'):
+        return None
+
+    return {
+        'UUID': response.text.split(',')[-1].strip(),
+        'IP': ip,
+        'Config-URL': 'http://{0}'.format(ip),
+    }
+
+
+def sweep_iter(networks, http_port=_HTTP_PORT, tcp_port=_TCP_PORT, max_workers=_SWEEP_MAX_WORKERS,
+               host_timeout=_SWEEP_HOST_TIMEOUT, deadline=None, cache=None):
+    cache = cache if cache is not None else get_cache()
+    logger = getLogger(Discoverer.__name__)
+
+    if isinstance(networks, str):
+        networks = [networks]
+
+    deadline = Deadline.of(deadline)
+
+    hosts = (str(y) for x in networks for y in ipaddress.ip_network(x, strict=False).hosts())
+
+    logger.debug('sweep_iter(); networks=%s, http_port=%s, tcp_port=%s', networks, http_port, tcp_port)
+
+    seen_uuids = set()
+
+    # only a window of hosts is in flight at once, so sweeping a /16 doesn't queue up 65k futures
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        pending = set()
+        exhausted = False
+
+        while pending or not exhausted:
+            # probes already running can't be cancelled; leave them to time out on their own rather than wait on them
+            if deadline.expired:
+                break
+
+            while not exhausted and len(pending) < max_workers * 2:
+                host = next(hosts, None)
+                if host is None:
+                    exhausted = True
+                    break
+
+                pending.add(executor.submit(_sweep_host, host, http_port, tcp_port, host_timeout, logger))
+
+            if not pending:
+                break
+
+            done, pending = wait(pending, deadline.remaining(), FIRST_COMPLETED)
+
+            for future in done:
+                zmote = future.result()
+                if zmote is None or zmote['UUID'] in seen_uuids:
+                    continue
+
+                seen_uuids.add(zmote['UUID'])
+                cache.update(zmote['UUID'], zmote['IP'], zmote['Config-URL'])
+
+                logger.debug('sweep_iter(); zmote=%s', zmote)
+
+                yield zmote
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def sweep_discover_zmotes(networks, http_port=_HTTP_PORT, tcp_port=_TCP_PORT, max_workers=_SWEEP_MAX_WORKERS,
+                          host_timeout=_SWEEP_HOST_TIMEOUT, deadline=None):
+    return {
+        x['UUID']: x for x in sweep_iter(
+            networks,
+            http_port=http_port,
+            tcp_port=tcp_port,
+            max_workers=max_workers,
+            host_timeout=host_timeout,
+            deadline=deadline,
+        )
+    }
 
 
 if __name__ == '__main__':
@@ -188,18 +505,72 @@ if __name__ == '__main__':
         '--active',
         action='store_true',
         required=False,
-        help='send probe first to discover devices faster (default disabled)',
+        help='send probes while listening to discover devices faster (default disabled)',
+    )
+
+    parser.add_argument(
+        '-d',
+        '--deadline',
+        type=float,
+        default=_DEADLINE,
+        help='seconds to wait overall (default {0})'.format(_DEADLINE),
+    )
+
+    parser.add_argument(
+        '-q',
+        '--quiet-period',
+        type=float,
+        default=None,
+        help='seconds without a new device after which to stop when active (e.g. 0.3)',
+    )
+
+    parser.add_argument(
+        '-i',
+        '--interface',
+        type=str,
+        action='append',
+        default=None,
+        help='IP of a local interface to discover on; may be given more than once',
+    )
+
+    parser.add_argument(
+        '-I',
+        '--all-interfaces',
+        action='store_true',
+        required=False,
+        help='discover on every local IPv4 interface (default disabled)',
+    )
+
+    parser.add_argument(
+        '-s',
+        '--sweep',
+        type=str,
+        action='append',
+        default=None,
+        metavar='CIDR',
+        help='probe every address in CIDR over unicast instead of listening for beacons; may be given more than once',
     )
 
     args = parser.parse_args()
 
+    interfaces = args.interface
+    if args.all_interfaces:
+        interfaces = interface_addresses()
+
     if args.unique_zmote_limit is not None and args.uuid_to_look_for is not None:
         parser.error('must specify only one (or neither) of --unique-zmote-limit or --uuid-to-look-for')
 
-    if args.active:
-        zmotes = active_discover_zmotes(args.unique_zmote_limit, args.uuid_to_look_for)
+    if args.sweep:
+        zmotes = sweep_discover_zmotes(args.sweep, deadline=args.deadline)
+    elif args.active:
+        zmotes = active_discover_zmotes(
+            args.unique_zmote_limit, args.uuid_to_look_for, deadline=args.deadline, quiet_period=args.quiet_period,
+            interfaces=interfaces,
+        )
     else:
-        zmotes = passive_discover_zmotes(args.unique_zmote_limit, args.uuid_to_look_for)
+        zmotes = passive_discover_zmotes(
+            args.unique_zmote_limit, args.uuid_to_look_for, interfaces=interfaces, deadline=args.deadline,
+        )
 
     print('')
     pprint.pprint(zmotes)
@@ -1,10 +1,12 @@
+import time
 import unittest
 
 import copy
-from hamcrest import assert_that, equal_to
+from hamcrest import assert_that, equal_to, less_than
 from mock import patch, call, MagicMock
 
-from zmote.discoverer import Discoverer
+from zmote.cache import DeviceCache
+from zmote.discoverer import Discoverer, interface_addresses, sweep_iter
 
 _UUID = 'CI00a1b2c3'
 
@@ -45,7 +47,11 @@ class DiscovererTest(unittest.TestCase):
         socket.INADDR_ANY = 7
         socket.IP_ADD_MEMBERSHIP = 8
 
-        self._subject = Discoverer()
+        self._cache = DeviceCache()
+
+        self._subject = Discoverer(
+            cache=self._cache,
+        )
 
         assert_that(
             socket.mock_calls,
@@ -102,6 +108,38 @@ class DiscovererTest(unittest.TestCase):
             equal_to(_TEST_RESPONSE_PARSED)
         )
 
+    def test_parse_repeat(self):
+        first = self._subject.parse(_TEST_RESPONSE)
+        first['IP'] = '192.168.1.12'
+
+        assert_that(
+            self._subject.parse(_TEST_RESPONSE),
+            equal_to(_TEST_RESPONSE_PARSED)
+        )
+
+    def test_parse_rejects(self):
+        for data in [
+            b'M-SEARCH * HTTP/1.1',
+            b'AMXB<-SDKClass=VideoProjector><-Make=Epson><-Model=EB-1785W>',
+            b'AMXB<-UUID=CI00a1b2c3><-Make=zmote.io>',
+        ]:
+            self.assertRaises(ValueError, self._subject.parse, data)
+            self.assertRaises(ValueError, self._subject.parse, data)
+
+    def test_discover_skips_foreign(self):
+        self._subject.receive = MagicMock()
+        self._subject.receive.side_effect = [
+            b'AMXB<-SDKClass=VideoProjector><-Make=Epson><-Model=EB-1785W>',
+            _TEST_RESPONSE,
+        ]
+
+        assert_that(
+            self._subject.discover(unique_zmote_limit=1),
+            equal_to({
+                _UUID: _TEST_RESPONSE_PARSED_WITH_IP,
+            })
+        )
+
     def test_discover_limit(self):
         self._subject.receive = MagicMock()
         self._subject.parse = MagicMock()
@@ -114,6 +152,18 @@ class DiscovererTest(unittest.TestCase):
             })
         )
 
+    def test_discover_fills_cache(self):
+        self._subject.receive = MagicMock()
+        self._subject.parse = MagicMock()
+        self._subject.parse.return_value = copy.deepcopy(_TEST_RESPONSE_PARSED)
+
+        self._subject.discover(unique_zmote_limit=1)
+
+        assert_that(
+            self._cache.get_by_ip('192.168.1.12')['UUID'],
+            equal_to(_UUID)
+        )
+
     def test_discover_uuid(self):
         self._subject.receive = MagicMock()
         self._subject.parse = MagicMock()
@@ -125,3 +175,121 @@ class DiscovererTest(unittest.TestCase):
                 _UUID: _TEST_RESPONSE_PARSED_WITH_IP,
             })
         )
+
+    @patch('zmote.discoverer.select')
+    def test_discover_iter(self, select):
+        select.select.return_value = ([self._subject._sock], [], [])
+        self._subject.receive = MagicMock()
+        self._subject.receive.side_effect = [
+            _TEST_RESPONSE,
+            _TEST_RESPONSE,
+            _TEST_RESPONSE.replace(b'CI00a1b2c3', b'CI00ffffff'),
+        ]
+        self._subject.send = MagicMock()
+
+        assert_that(
+            [x['UUID'] for x in self._subject.discover_iter(probe=True, unique_zmote_limit=2)],
+            equal_to([_UUID, 'CI00ffffff'])
+        )
+
+        assert_that(
+            self._subject.send.mock_calls[0:1],
+            equal_to([call()])
+        )
+
+    @patch('zmote.discoverer.time')
+    @patch('zmote.discoverer.select')
+    def test_discover_iter_quiet_period(self, select, time):
+        select.select.return_value = ([], [], [])
+        time.monotonic.side_effect = [x / 10.0 for x in range(0, 100)]
+        self._subject.send = MagicMock()
+
+        assert_that(
+            list(self._subject.discover_iter(probe=True, quiet_period=0.3)),
+            equal_to([])
+        )
+
+        assert_that(
+            select.select.call_count,
+            equal_to(2)
+        )
+
+    @patch('zmote.discoverer.time')
+    @patch('zmote.discoverer.select')
+    def test_discover_iter_probe_backoff(self, select, time):
+        select.select.return_value = ([], [], [])
+        time.monotonic.side_effect = [x / 100.0 for x in range(0, 1000)]
+        self._subject.send = MagicMock()
+
+        list(self._subject.discover_iter(probe=True, deadline=1))
+
+        # probes at 0, 0.05, 0.15, 0.35, 0.75
+        assert_that(
+            self._subject.send.call_count,
+            equal_to(5)
+        )
+
+    @patch('zmote.discoverer.socket')
+    def test_interfaces(self, socket):
+        socket.inet_aton.side_effect = lambda x: bytes(int(y) for y in x.split('.'))
+        socket.AF_INET = 1
+        socket.SOCK_DGRAM = 2
+        socket.IPPROTO_UDP = 3
+        socket.IPPROTO_IP = 6
+        socket.IP_ADD_MEMBERSHIP = 8
+        socket.IP_MULTICAST_IF = 9
+
+        subject = Discoverer(
+            cache=self._cache,
+            interfaces=['10.0.1.2', '10.0.2.2'],
+        )
+
+        assert_that(
+            [x for x in socket.socket().setsockopt.mock_calls if x[1][1] == socket.IP_ADD_MEMBERSHIP],
+            equal_to([
+                call(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, b'\xef\xff\xfa\xfa\x0a\x00\x01\x02'),
+                call(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, b'\xef\xff\xfa\xfa\x0a\x00\x02\x02'),
+            ])
+        )
+
+        socket.socket().setsockopt.reset_mock()
+
+        subject.send()
+
+        assert_that(
+            [x for x in socket.socket().setsockopt.mock_calls if x[1][1] == socket.IP_MULTICAST_IF],
+            equal_to([
+                call(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, b'\x0a\x00\x01\x02'),
+                call(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, b'\x0a\x00\x02\x02'),
+            ])
+        )
+
+        assert_that(
+            socket.socket().sendto.mock_calls,
+            equal_to([
+                call(b'SENDAMXB', ('239.255.250.250', 9130)),
+                call(b'SENDAMXB', ('239.255.250.250', 9130)),
+            ])
+        )
+
+    def test_interface_addresses(self):
+        for address in interface_addresses():
+            assert_that(address.startswith('127.'), equal_to(False))
+
+
+class SweepTest(unittest.TestCase):
+    @patch('zmote.discoverer._sweep_host')
+    def test_deadline_with_probes_running(self, sweep_host):
+        sweep_host.side_effect = lambda *args: time.sleep(1)
+
+        before = time.monotonic()
+        cpu_before = time.process_time()
+
+        assert_that(
+            list(sweep_iter('10.0.0.0/24', max_workers=4, deadline=0.1, cache=DeviceCache())),
+            equal_to([])
+        )
+
+        # gives up at the deadline without waiting on, or spinning over, the probes still running
+        assert_that(time.monotonic() - before, less_than(0.5))
+        assert_that(time.process_time() - cpu_before, less_than(0.2))
@@ -0,0 +1,219 @@
+import selectors
+import socket
+import threading
+import time
+from logging import getLogger
+
+from zmote.cache import get_cache
+from zmote.discoverer import Discoverer, _ip_from_config_url
+
+_TTL = 90
+_PROBE_INTERVAL = 30
+
+ADD = 'add'
+UPDATE = 'update'
+REMOVE = 'remove'
+
+
+class DiscoveryService(object):
+    def __init__(self, ttl=_TTL, probe_interval=_PROBE_INTERVAL, discoverer=None, cache=None, interfaces=None):
+        self._ttl = ttl
+        self._interfaces = interfaces
+        self._probe_interval = probe_interval
+        self._discoverer = discoverer
+        self._cache = cache if cache is not None else get_cache()
+
+        self._condition = threading.Condition()
+        self._zmotes_by_uuid = {}
+        self._seen_by_uuid = {}
+        self._callbacks = []
+
+        self._selector = None
+        self._wake_r = None
+        self._wake_w = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+        self._logger = getLogger(self.__class__.__name__)
+        self._logger.debug('__init__(); ttl=%s, probe_interval=%s', ttl, probe_interval)
+
+    def subscribe(self, callback):
+        self._logger.debug('subscribe(%s)', callback)
+
+        with self._condition:
+            self._callbacks.append(callback)
+
+        def unsubscribe():
+            with self._condition:
+                if callback in self._callbacks:
+                    self._callbacks.remove(callback)
+
+        return unsubscribe
+
+    def _notify(self, events):
+        with self._condition:
+            callbacks = list(self._callbacks)
+
+        for event, zmote in events:
+            for callback in callbacks:
+                try:
+                    callback(event, dict(zmote))
+                except Exception as e:
+                    self._logger.error('_notify(); callback=%s, exception=%r', callback, e)
+
+    def _handle(self, data, now):
+        try:
+            zmote = self._discoverer.parse(data)
+        except ValueError:
+            return []
+
+        zmote['IP'] = _ip_from_config_url(zmote['Config-URL'])
+        uuid = zmote['UUID']
+
+        with self._condition:
+            previous = self._zmotes_by_uuid.get(uuid)
+            self._zmotes_by_uuid[uuid] = zmote
+            self._seen_by_uuid[uuid] = now
+            self._condition.notify_all()
+
+        self._cache.update(uuid, zmote['IP'], zmote['Config-URL'])
+
+        if previous is None:
+            events = [(ADD, zmote)]
+        elif previous != zmote:
+            events = [(UPDATE, zmote)]
+        else:
+            events = []
+
+        return events
+
+    def _evict(self, now):
+        events = []
+
+        with self._condition:
+            for uuid, seen in list(self._seen_by_uuid.items()):
+                if now - seen > self._ttl:
+                    del self._seen_by_uuid[uuid]
+                    events.append((REMOVE, self._zmotes_by_uuid.pop(uuid)))
+
+        return events
+
+    def _drain(self, now):
+        events = []
+
+        # read everything that's queued up so one wakeup handles a burst of beacons
+        while True:
+            try:
+                data = self._discoverer.receive()
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as e:
+                self._logger.error('_drain(); exception=%r', e)
+                break
+
+            events.extend(self._handle(data, now))
+
+        return events
+
+    def _probe(self):
+        try:
+            self._discoverer.send()
+        except OSError as e:
+            self._logger.error('_probe(); exception=%r', e)
+
+    def _run(self):
+        next_probe = time.monotonic() if self._probe_interval is not None else None
+        next_eviction = time.monotonic() + self._ttl
+
+        while not self._stopped.is_set():
+            now = time.monotonic()
+
+            if next_probe is not None and now >= next_probe:
+                self._probe()
+                next_probe = now + self._probe_interval
+
+            timeout = next_eviction - now
+            if next_probe is not None:
+                timeout = min(timeout, next_probe - now)
+
+            events = []
+            for key, _ in self._selector.select(max(0, timeout)):
+                if key.fileobj is self._discoverer:
+                    events.extend(self._drain(time.monotonic()))
+
+            now = time.monotonic()
+            if now >= next_eviction:
+                events.extend(self._evict(now))
+
+                with self._condition:
+                    oldest = min(self._seen_by_uuid.values()) if self._seen_by_uuid else now
+
+                next_eviction = oldest + self._ttl
+
+            self._notify(events)
+
+    def start(self):
+        self._logger.debug('start()')
+
+        if self._discoverer is None:
+            self._discoverer = Discoverer(cache=self._cache, interfaces=self._interfaces)
+            self._discoverer.bind()
+
+        self._discoverer.setblocking(False)
+
+        self._wake_r, self._wake_w = socket.socketpair()
+
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._discoverer, selectors.EVENT_READ)
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name=self.__class__.__name__)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._logger.debug('stop()')
+
+        if self._thread is None:
+            return
+
+        self._stopped.set()
+        self._wake_w.send(b'\x00')
+        self._thread.join()
+        self._thread = None
+
+        self._selector.close()
+        self._wake_r.close()
+        self._wake_w.close()
+        self._discoverer.close()
+
+    def devices(self):
+        with self._condition:
+            return {k: dict(v) for k, v in self._zmotes_by_uuid.items()}
+
+    def get(self, uuid):
+        with self._condition:
+            zmote = self._zmotes_by_uuid.get(uuid)
+
+            return dict(zmote) if zmote is not None else None
+
+    def get_by_ip(self, ip):
+        with self._condition:
+            for zmote in self._zmotes_by_uuid.values():
+                if zmote['IP'] == ip:
+                    return dict(zmote)
+
+        return None
+
+    def last_seen(self, uuid):
+        with self._condition:
+            return self._seen_by_uuid.get(uuid)
+
+    def wait_for(self, uuid, timeout=None):
+        with self._condition:
+            self._condition.wait_for(lambda: uuid in self._zmotes_by_uuid, timeout)
+
+            zmote = self._zmotes_by_uuid.get(uuid)
+
+            return dict(zmote) if zmote is not None else None
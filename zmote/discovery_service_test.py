@@ -0,0 +1,121 @@
+import socket
+import threading
+import unittest
+
+from hamcrest import assert_that, equal_to
+from mock import MagicMock
+
+from zmote.cache import DeviceCache
+from zmote.discoverer import _parse_beacon
+from zmote.discoverer_test import _UUID, _TEST_RESPONSE, _TEST_RESPONSE_PARSED_WITH_IP
+from zmote.discovery_service import DiscoveryService, ADD, REMOVE
+
+
+class _FakeDiscoverer(object):
+    def __init__(self):
+        self.sock, self.peer = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.send = MagicMock()
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def setblocking(self, flag):
+        self.sock.setblocking(flag)
+
+    def parse(self, data):
+        return _parse_beacon(data)
+
+    def receive(self):
+        return self.sock.recv(1024)
+
+    def close(self):
+        self.sock.close()
+        self.peer.close()
+
+
+class DiscoveryServiceTest(unittest.TestCase):
+    def setUp(self):
+        self._discoverer = _FakeDiscoverer()
+        self._cache = DeviceCache()
+
+        self._subject = DiscoveryService(
+            ttl=60,
+            probe_interval=None,
+            discoverer=self._discoverer,
+            cache=self._cache,
+        )
+
+        self._events = []
+        self._subject.subscribe(lambda event, zmote: self._events.append((event, zmote['UUID'])))
+
+    def test_handle(self):
+        self._subject._notify(self._subject._handle(_TEST_RESPONSE, 1000))
+
+        assert_that(
+            self._subject.devices(),
+            equal_to({_UUID: _TEST_RESPONSE_PARSED_WITH_IP})
+        )
+
+        assert_that(
+            self._subject.get_by_ip('192.168.1.12')['UUID'],
+            equal_to(_UUID)
+        )
+
+        assert_that(
+            self._cache.get_by_uuid(_UUID)['IP'],
+            equal_to('192.168.1.12')
+        )
+
+        assert_that(self._events, equal_to([(ADD, _UUID)]))
+
+    def test_handle_repeat(self):
+        self._subject._handle(_TEST_RESPONSE, 1000)
+
+        assert_that(
+            self._subject._handle(_TEST_RESPONSE, 1010),
+            equal_to([])
+        )
+
+        assert_that(self._subject.last_seen(_UUID), equal_to(1010))
+
+    def test_handle_ignores_garbage(self):
+        assert_that(
+            self._subject._handle(b'AMXB<-UUID=other>', 1000),
+            equal_to([])
+        )
+
+    def test_evict(self):
+        self._subject._handle(_TEST_RESPONSE, 1000)
+
+        assert_that(self._subject._evict(1060), equal_to([]))
+
+        self._subject._notify(self._subject._evict(1061))
+
+        assert_that(self._subject.devices(), equal_to({}))
+        assert_that(self._events, equal_to([(REMOVE, _UUID)]))
+
+    def test_unsubscribe(self):
+        events = []
+        unsubscribe = self._subject.subscribe(lambda event, zmote: events.append(event))
+        unsubscribe()
+
+        self._subject._notify(self._subject._handle(_TEST_RESPONSE, 1000))
+
+        assert_that(events, equal_to([]))
+
+    def test_start_stop(self):
+        added = threading.Event()
+        self._subject.subscribe(lambda event, zmote: added.set())
+
+        self._subject.start()
+        try:
+            self._discoverer.peer.send(_TEST_RESPONSE)
+
+            assert_that(added.wait(5), equal_to(True))
+
+            assert_that(
+                self._subject.wait_for(_UUID, timeout=5),
+                equal_to(_TEST_RESPONSE_PARSED_WITH_IP)
+            )
+        finally:
+            self._subject.stop()
@@ -0,0 +1,235 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from logging import getLogger
+
+from zmote.connector import HTTPTransport, TCPTransport, _is_sendir
+from zmote.deadline import Deadline
+
+_WINDOW = 100
+_MIN_SAMPLES = 10
+_HEDGE_DELAY = 0.5
+_HEDGE_PERCENTILE = 95
+_FAILURE_THRESHOLD = 3
+_RESET_TIMEOUT = 30
+
+
+class _Path(object):
+    def __init__(self, transport_class, window):
+        self.transport_class = transport_class
+        self.transport = None
+        self.future = None
+
+        self.latencies = deque(maxlen=window)
+        self.failures = 0
+        self.opened_at = None
+
+    def percentile(self, percentile):
+        latencies = sorted(self.latencies)
+
+        return latencies[min(len(latencies) - 1, int(round(percentile / 100.0 * (len(latencies) - 1))))]
+
+    def available(self, now, reset_timeout):
+        # an open circuit lets one trial call through (half-open) once the reset timeout has passed
+        return self.opened_at is None or now - self.opened_at >= reset_timeout
+
+    def __repr__(self):
+        return '{0}({1})'.format(self.__class__.__name__, getattr(self.transport_class, '__name__', self.transport_class))
+
+
+class FailoverTransport(object):
+    def __init__(self, ip, transport_classes=(TCPTransport, HTTPTransport), hedge=True, window=_WINDOW,
+                 min_samples=_MIN_SAMPLES, hedge_delay=_HEDGE_DELAY, failure_threshold=_FAILURE_THRESHOLD,
+                 reset_timeout=_RESET_TIMEOUT):
+        self._ip = ip
+        self._hedge = hedge
+        self._min_samples = min_samples
+        self._hedge_delay = hedge_delay
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+
+        self._condition = threading.Condition(threading.RLock())
+        self._paths = [_Path(x, window) for x in transport_classes]
+        self._executor = None
+
+        self._logger = getLogger(self.__class__.__name__)
+        self._logger.debug('__init__(); ip=%r, transport_classes=%s, hedge=%s', ip, transport_classes, hedge)
+
+    def _sort_key(self, path):
+        # paths without a measurement yet sort first so each gets tried once
+        return path.percentile(50) if path.latencies else 0
+
+    def _threshold(self, path):
+        if len(path.latencies) < self._min_samples:
+            return self._hedge_delay
+
+        return path.percentile(_HEDGE_PERCENTILE)
+
+    def _succeeded(self, path, latency=None):
+        with self._condition:
+            if latency is not None:
+                path.latencies.append(latency)
+            path.failures = 0
+            path.opened_at = None
+
+    def _failed(self, path, exception):
+        with self._condition:
+            path.failures += 1
+            if path.failures >= self._failure_threshold or path.opened_at is not None:
+                self._logger.warning('_failed(); opening circuit for %s; exception=%r', path, exception)
+                path.opened_at = time.monotonic()
+
+            transport, path.transport = path.transport, None
+
+        # start afresh next time rather than reuse a transport in an unknown state
+        if transport is not None:
+            try:
+                transport.disconnect()
+            except Exception as e:
+                self._logger.debug('_failed(); path=%s, exception=%r', path, e)
+
+    def _connect(self, path, deadline=None):
+        if path.transport is None:
+            transport = path.transport_class(ip=self._ip)
+            transport.connect(deadline=deadline)
+            path.transport = transport
+
+        return path.transport
+
+    def _attempt(self, path, data, deadline):
+        before = time.monotonic()
+        try:
+            output = self._connect(path, deadline).call(data, deadline=deadline)
+        except Exception as e:
+            self._failed(path, e)
+            raise
+
+        # learning waits on a person pressing a remote; its latency says nothing about how fast the path sends
+        self._succeeded(path, time.monotonic() - before if _is_sendir(data) else None)
+
+        return output
+
+    def _start(self, tried, data, block, deadline):
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                candidates = [x for x in self._paths if x not in tried and x.available(now, self._reset_timeout)]
+                free = sorted([x for x in candidates if x.future is None], key=self._sort_key)
+
+                if free:
+                    break
+
+                # a hedge loser may still be running on a path; wait for it rather than share its transport
+                if not block or not candidates:
+                    return None, None
+
+                self._condition.wait()
+
+            path = free[0]
+            tried.append(path)
+            path.future = self._executor.submit(self._attempt, path, data, deadline)
+
+            def release(_):
+                with self._condition:
+                    path.future = None
+                    self._condition.notify_all()
+
+            path.future.add_done_callback(release)
+
+            return path, path.future
+
+    def connect(self, deadline=None):
+        self._logger.debug('connect()')
+
+        if deadline is not None:
+            deadline = Deadline.of(deadline)
+
+        self._executor = ThreadPoolExecutor(max_workers=len(self._paths))
+
+        errors = []
+        for path in self._paths:
+            try:
+                self._connect(path, deadline)
+            except Exception as e:
+                self._logger.warning('connect(); path=%s, exception=%r', path, e)
+                self._failed(path, e)
+                errors.append(e)
+
+        if len(errors) == len(self._paths):
+            raise errors[-1]
+
+    def call(self, data, deadline=None):
+        self._logger.debug('call(%r)', data)
+
+        # every attempt, hedged or failed over, shares the caller's budget
+        if deadline is not None:
+            deadline = Deadline.of(deadline)
+
+        # only a sendir may go out twice; a second get_IRL would leave the device learning on the losing path
+        hedge = self._hedge and _is_sendir(data)
+
+        tried = []
+        pending = set()
+        error = None
+        hedge_at = None
+
+        while True:
+            if not pending:
+                path, future = self._start(tried, data, True, deadline)
+                if future is None:
+                    if error is not None:
+                        raise error
+
+                    raise ConnectionError('no transport to {0} available; all circuits open'.format(repr(self._ip)))
+
+                pending.add(future)
+                hedge_at = time.monotonic() + self._threshold(path) if hedge else None
+
+            timeout = max(0, hedge_at - time.monotonic()) if hedge_at is not None else None
+            done, pending = wait(pending, timeout, FIRST_COMPLETED)
+
+            for future in done:
+                if future.exception() is None:
+                    output = future.result()
+
+                    self._logger.debug('call(%r); output=%r', data, output)
+
+                    return output
+
+                error = future.exception()
+
+            # the primary is slower than it usually is; race it on the next best path
+            if not done and hedge_at is not None:
+                hedge_at = None
+
+                path, future = self._start(tried, data, False, deadline)
+                if future is not None:
+                    self._logger.debug('call(%r); hedging on %s', data, path)
+
+                    pending.add(future)
+
+    def latencies(self):
+        with self._condition:
+            return {
+                getattr(x.transport_class, '__name__', repr(x.transport_class)): list(x.latencies)
+                for x in self._paths
+            }
+
+    def disconnect(self):
+        self._logger.debug('disconnect()')
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+        with self._condition:
+            transports = [x.transport for x in self._paths if x.transport is not None]
+            for path in self._paths:
+                path.transport = None
+
+        for transport in transports:
+            try:
+                transport.disconnect()
+            except Exception as e:
+                self._logger.debug('disconnect(); exception=%r', e)
@@ -0,0 +1,117 @@
+import time
+import unittest
+
+from hamcrest import assert_that, equal_to, less_than
+from mock import MagicMock
+
+from zmote.connector_test import _TEST_SENDIR_REQUEST
+from zmote.failover import FailoverTransport
+
+
+def _mock_transport_class(name, delays):
+    transports = []
+
+    def call(data, deadline=None):
+        delay = delays[0] if len(delays) == 1 else delays.pop(0)
+        if isinstance(delay, Exception):
+            raise delay
+
+        time.sleep(delay)
+
+        return name
+
+    def create(ip):
+        transport = MagicMock()
+        transport.call.side_effect = call
+        transports.append(transport)
+
+        return transport
+
+    transport_class = MagicMock(side_effect=create)
+    transport_class.__name__ = name
+    transport_class.transports = transports
+
+    return transport_class
+
+
+class FailoverTransportTest(unittest.TestCase):
+    def _subject(self, tcp_delays, http_delays, **kwargs):
+        self._tcp = _mock_transport_class('tcp', tcp_delays)
+        self._http = _mock_transport_class('http', http_delays)
+
+        subject = FailoverTransport(
+            ip='192.168.1.12',
+            transport_classes=[self._tcp, self._http],
+            **kwargs
+        )
+        subject.connect()
+        self.addCleanup(subject.disconnect)
+
+        return subject
+
+    def test_prefers_faster(self):
+        subject = self._subject([0.02], [0], hedge=False)
+
+        outputs = [subject.call(_TEST_SENDIR_REQUEST) for _ in range(0, 5)]
+
+        # the first call measures tcp, the second http, and http wins from then on
+        assert_that(
+            outputs,
+            equal_to(['tcp', 'http', 'http', 'http', 'http'])
+        )
+
+    def test_hedges_slow_primary(self):
+        subject = self._subject([0] * 5 + [1], [0.05], min_samples=5, hedge_delay=0.01)
+
+        # sample only tcp so it stays the preferred path
+        subject._paths[1].latencies.extend([0.05] * 5)
+        for _ in range(0, 5):
+            subject.call(_TEST_SENDIR_REQUEST)
+
+        before = time.monotonic()
+        output = subject.call(_TEST_SENDIR_REQUEST)
+
+        assert_that(output, equal_to('http'))
+        assert_that(time.monotonic() - before, less_than(0.5))
+
+    def test_learn_not_hedged(self):
+        subject = self._subject([0.2], [0], min_samples=1, hedge_delay=0.01)
+
+        subject._paths[0].latencies.append(0.01)
+        subject._paths[1].latencies.append(0.05)
+
+        assert_that(subject.call('get_IRL'), equal_to('tcp'))
+
+        # only one path saw the learn, and its wait didn't count towards the send latencies
+        assert_that(self._http.transports[0].call.called, equal_to(False))
+        assert_that(subject.latencies(), equal_to({'tcp': [0.01], 'http': [0.05]}))
+
+    def test_fails_over(self):
+        subject = self._subject([ConnectionResetError()], [0], hedge=False)
+
+        assert_that(
+            subject.call(_TEST_SENDIR_REQUEST),
+            equal_to('http')
+        )
+
+    def test_circuit_opens_and_recovers(self):
+        subject = self._subject([ConnectionResetError()] * 3 + [0], [0.01], hedge=False, reset_timeout=0.2)
+
+        for _ in range(0, 5):
+            subject.call(_TEST_SENDIR_REQUEST)
+
+        # connected once up front and again after the first two failures; the third opens the circuit
+        assert_that(self._tcp.call_count, equal_to(3))
+
+        time.sleep(0.2)
+
+        assert_that(
+            subject.call(_TEST_SENDIR_REQUEST),
+            equal_to('tcp')
+        )
+
+    def test_all_failed(self):
+        subject = self._subject([ConnectionResetError()], [TimeoutError()], hedge=False)
+
+        with self.assertRaises(TimeoutError):
+            subject.call(_TEST_SENDIR_REQUEST)
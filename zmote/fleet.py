@@ -0,0 +1,251 @@
+import re
+import time
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from logging import getLogger
+
+from zmote.connector import Connector, HTTPTransport
+from zmote.deadline import Deadline
+from zmote.resolver import get_resolver
+
+_UUID_PATTERN = re.compile(r'^[A-Za-z]{2}[0-9a-fA-F]{8}$')
+
+_MAX_WORKERS = 32
+_MAX_IN_FLIGHT = 64
+
+# index is the command's position in the input to send_many(); broadcasts leave it as None
+Result = namedtuple('Result', ['device', 'ip', 'output', 'latency', 'error', 'index'], defaults=[None])
+
+
+def _discover_uuids(uuids, deadline=None):
+    resolver = get_resolver()
+
+    zmotes_by_uuid = {}
+    for uuid in uuids:
+        try:
+            zmotes_by_uuid[uuid] = resolver.resolve(uuid, deadline)
+        except (LookupError, TimeoutError):
+            continue
+
+    return zmotes_by_uuid
+
+
+class Fleet(object):
+    def __init__(self, devices, transport_class=HTTPTransport, max_workers=_MAX_WORKERS):
+        self._transport_class = transport_class
+        self._max_workers = max_workers
+
+        if isinstance(devices, str):
+            devices = [devices]
+
+        # accept the dict returned by Discoverer.discover() as well as plain IPs, hostnames or UUIDs
+        if isinstance(devices, dict):
+            self._ips_by_device = {k: v['IP'] for k, v in devices.items()}
+        else:
+            self._ips_by_device = {x: None if _UUID_PATTERN.match(x) else x for x in devices}
+
+        self._logger = getLogger(self.__class__.__name__)
+        self._logger.debug(
+            '__init__(); devices=%r, transport_class=%s, max_workers=%s', devices, transport_class, max_workers
+        )
+
+    @property
+    def devices(self):
+        return list(self._ips_by_device)
+
+    def resolve(self, deadline=None):
+        self._logger.debug('resolve()')
+
+        uuids = [k for k, v in self._ips_by_device.items() if v is None]
+        if not uuids:
+            return
+
+        zmotes_by_uuid = _discover_uuids(uuids, deadline)
+
+        for uuid in uuids:
+            zmote = zmotes_by_uuid.get(uuid)
+            if zmote is not None:
+                self._ips_by_device[uuid] = zmote['IP']
+
+        self._logger.debug('resolve(); ips_by_device=%s', self._ips_by_device)
+
+    def _send_one(self, device, data, deadline=None):
+        ip = self._ips_by_device[device]
+
+        before = time.monotonic()
+        try:
+            if ip is None:
+                raise LookupError('could not discover IP for {0}'.format(repr(device)))
+
+            connector = Connector(
+                transport=self._transport_class(ip=ip),
+            )
+
+            connector.connect(deadline=deadline)
+            try:
+                output = connector.send(data, deadline=deadline)
+            finally:
+                connector.disconnect()
+        except Exception as e:
+            return Result(device, ip, None, time.monotonic() - before, e)
+
+        return Result(device, ip, output, time.monotonic() - before, None)
+
+    def send(self, data, deadline=None):
+        self._logger.debug('send(%r)', data)
+
+        # one budget for discovery and every device, rather than a timeout per step
+        if deadline is not None:
+            deadline = Deadline.of(deadline)
+
+        self.resolve(deadline)
+
+        devices = self.devices
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self._max_workers, len(devices)))) as executor:
+            results = list(executor.map(lambda x: self._send_one(x, data, deadline), devices))
+
+        results_by_device = {x.device: x for x in results}
+
+        self._logger.debug('send(%r); results_by_device=%s', data, results_by_device)
+
+        return results_by_device
+
+
+def broadcast(devices, data, transport_class=HTTPTransport, max_workers=_MAX_WORKERS, deadline=None):
+    return Fleet(
+        devices=devices,
+        transport_class=transport_class,
+        max_workers=max_workers,
+    ).send(data, deadline=deadline)
+
+
+class _Lane(object):
+    __slots__ = ('device', 'ip', 'connector', 'queue', 'busy')
+
+    def __init__(self, device):
+        self.device = device
+        self.ip = None if _UUID_PATTERN.match(device) else device
+        self.connector = None
+        self.queue = deque()
+        self.busy = False
+
+
+def _close_lane(lane, logger):
+    connector, lane.connector = lane.connector, None
+    if connector is None:
+        return
+
+    try:
+        connector.disconnect()
+    except Exception as e:
+        logger.debug('send_many(); device=%r, exception=%r', lane.device, e)
+
+
+def _send_in_lane(lane, transport_class, index, data, deadline):
+    before = time.monotonic()
+    try:
+        if lane.connector is None:
+            if lane.ip is None:
+                zmote = _discover_uuids([lane.device], deadline).get(lane.device)
+                if zmote is None:
+                    raise LookupError('could not discover IP for {0}'.format(repr(lane.device)))
+
+                lane.ip = zmote['IP']
+
+            connector = Connector(transport=transport_class(ip=lane.ip))
+            connector.connect(deadline=deadline)
+            lane.connector = connector
+
+        output = lane.connector.send(data, deadline=deadline)
+    except Exception as e:
+        # reconnect for the device's next command rather than reuse a connection in an unknown state
+        _close_lane(lane, getLogger(Fleet.__name__))
+
+        return Result(lane.device, lane.ip, None, time.monotonic() - before, e, index)
+
+    return Result(lane.device, lane.ip, output, time.monotonic() - before, None, index)
+
+
+def send_many(commands, transport_class=HTTPTransport, max_in_flight=_MAX_IN_FLIGHT, deadline=None):
+    logger = getLogger(Fleet.__name__)
+
+    if deadline is not None:
+        deadline = Deadline.of(deadline)
+
+    commands = iter(commands)
+    lanes_by_device = {}
+    idle_lanes_by_device = OrderedDict()
+    ready = deque()
+    devices_by_future = {}
+    buffered = 0
+    exhausted = False
+    index = 0
+
+    logger.debug('send_many(); transport_class=%s, max_in_flight=%s', transport_class, max_in_flight)
+
+    # each device is a lane that runs one command at a time in order; lanes run concurrently with each other
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        try:
+            while True:
+                # only read ahead as far as the window, so a generator of millions of commands stays flat in memory
+                while not exhausted and buffered < max_in_flight:
+                    try:
+                        device, data = next(commands)
+                    except StopIteration:
+                        exhausted = True
+                        break
+
+                    lane = lanes_by_device.get(device)
+                    if lane is None:
+                        lane = lanes_by_device[device] = _Lane(device)
+
+                    idle_lanes_by_device.pop(device, None)
+
+                    if not lane.busy and not lane.queue:
+                        ready.append(lane)
+
+                    lane.queue.append((index, data))
+                    index += 1
+                    buffered += 1
+
+                while ready:
+                    lane = ready.popleft()
+                    lane.busy = True
+
+                    command_index, data = lane.queue.popleft()
+                    future = executor.submit(_send_in_lane, lane, transport_class, command_index, data, deadline)
+                    devices_by_future[future] = lane
+
+                if not devices_by_future:
+                    break
+
+                done, _ = wait(devices_by_future, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    lane = devices_by_future.pop(future)
+                    lane.busy = False
+                    buffered -= 1
+
+                    if lane.queue:
+                        ready.append(lane)
+                    else:
+                        idle_lanes_by_device[lane.device] = lane
+
+                    # keep only the most recently used idle connections, so a stream across thousands of devices
+                    # doesn't hold a socket open for every device it has ever seen
+                    while len(idle_lanes_by_device) > max_in_flight:
+                        _, idle_lane = idle_lanes_by_device.popitem(last=False)
+                        del lanes_by_device[idle_lane.device]
+                        _close_lane(idle_lane, logger)
+
+                    yield future.result()
+        finally:
+            # let anything already dispatched finish before closing the connections under it
+            for future in list(devices_by_future):
+                future.cancel()
+
+            wait(devices_by_future)
+
+            for lane in lanes_by_device.values():
+                _close_lane(lane, logger)
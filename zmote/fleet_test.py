@@ -0,0 +1,248 @@
+import threading
+import time
+import unittest
+
+from hamcrest import assert_that, equal_to, instance_of, less_than
+from mock import patch, MagicMock
+
+from zmote.connector_test import _TEST_SENDIR_REQUEST, _TEST_SENDIR_RESPONSE
+from zmote.discoverer_test import _UUID, _TEST_RESPONSE_PARSED_WITH_IP
+from zmote.fleet import Fleet, broadcast, send_many
+
+
+class FleetTest(unittest.TestCase):
+    def setUp(self):
+        self._transport_class = MagicMock()
+        self._transport_class.return_value.call.return_value = _TEST_SENDIR_RESPONSE.decode()
+
+    def test_send_ips(self):
+        results = Fleet(
+            devices=['192.168.1.12', '192.168.1.13'],
+            transport_class=self._transport_class,
+        ).send(_TEST_SENDIR_REQUEST)
+
+        assert_that(
+            sorted(results),
+            equal_to(['192.168.1.12', '192.168.1.13'])
+        )
+
+        for device, result in results.items():
+            assert_that(result.ip, equal_to(device))
+            assert_that(result.output, equal_to(_TEST_SENDIR_RESPONSE.decode()))
+            assert_that(result.error, equal_to(None))
+
+        assert_that(
+            sorted([x.kwargs['ip'] for x in self._transport_class.call_args_list]),
+            equal_to(['192.168.1.12', '192.168.1.13'])
+        )
+
+    def test_send_discovered(self):
+        results = broadcast(
+            devices={_UUID: _TEST_RESPONSE_PARSED_WITH_IP},
+            data=_TEST_SENDIR_REQUEST,
+            transport_class=self._transport_class,
+        )
+
+        assert_that(
+            results[_UUID].ip,
+            equal_to('192.168.1.12')
+        )
+
+    @patch('zmote.fleet._discover_uuids')
+    def test_send_uuids(self, discover_uuids):
+        discover_uuids.return_value = {_UUID: _TEST_RESPONSE_PARSED_WITH_IP}
+
+        results = broadcast(
+            devices=[_UUID, 'CI00ffffff'],
+            data=_TEST_SENDIR_REQUEST,
+            transport_class=self._transport_class,
+        )
+
+        assert_that(
+            results[_UUID].output,
+            equal_to(_TEST_SENDIR_RESPONSE.decode())
+        )
+
+        assert_that(
+            results['CI00ffffff'].error,
+            instance_of(LookupError)
+        )
+
+    def test_send_error(self):
+        self._transport_class.return_value.call.side_effect = OSError('timed out')
+
+        result = broadcast(
+            devices='192.168.1.12',
+            data=_TEST_SENDIR_REQUEST,
+            transport_class=self._transport_class,
+        )['192.168.1.12']
+
+        assert_that(result.output, equal_to(None))
+        assert_that(result.error, instance_of(OSError))
+        assert_that(self._transport_class.return_value.disconnect.called, equal_to(True))
+
+    def test_send_concurrently(self):
+        barrier = threading.Barrier(4, timeout=5)
+
+        def blocking_call(data, deadline=None):
+            barrier.wait()
+            return _TEST_SENDIR_RESPONSE.decode()
+
+        self._transport_class.return_value.call.side_effect = blocking_call
+
+        results = broadcast(
+            devices=['192.168.1.{0}'.format(x) for x in range(10, 14)],
+            data=_TEST_SENDIR_REQUEST,
+            transport_class=self._transport_class,
+        )
+
+        for result in results.values():
+            assert_that(result.error, equal_to(None))
+            assert_that(result.latency, less_than(5))
+
+
+class SendManyTest(unittest.TestCase):
+    def setUp(self):
+        self._lock = threading.Lock()
+        self._calls_by_ip = {}
+        self._in_flight = 0
+        self._max_in_flight = 0
+        self._transports = []
+
+        self._transport_class = MagicMock(side_effect=self._transport)
+
+    def _transport(self, ip):
+        def call(data, deadline=None):
+            with self._lock:
+                self._calls_by_ip.setdefault(ip, []).append(data)
+                self._in_flight += 1
+                self._max_in_flight = max(self._max_in_flight, self._in_flight)
+
+            time.sleep(0.001)
+
+            with self._lock:
+                self._in_flight -= 1
+
+            return '{0} {1}'.format(ip, data)
+
+        transport = MagicMock()
+        transport.call.side_effect = call
+        self._transports.append(transport)
+
+        return transport
+
+    def test_order_per_device(self):
+        ips = ['192.168.1.{0}'.format(x) for x in range(10, 15)]
+        commands = [(ips[x % len(ips)], 'sendir,1:1,{0}'.format(x)) for x in range(0, 100)]
+
+        results = list(send_many(commands, transport_class=self._transport_class, max_in_flight=8))
+
+        assert_that(len(results), equal_to(100))
+        assert_that(sorted(x.index for x in results), equal_to(list(range(0, 100))))
+
+        for result in results:
+            assert_that(result.error, equal_to(None))
+            assert_that(result.output, equal_to('{0} {1}'.format(*commands[result.index])))
+
+        for ip in ips:
+            assert_that(self._calls_by_ip[ip], equal_to([x[1] for x in commands if x[0] == ip]))
+
+            indices = [x.index for x in results if x.device == ip]
+            assert_that(indices, equal_to(sorted(indices)))
+
+        # one connection per device, reused for all of its commands
+        assert_that(self._transport_class.call_count, equal_to(len(ips)))
+        assert_that(self._max_in_flight, less_than(len(ips) + 1))
+
+    def test_bounded_window(self):
+        pulled = []
+
+        def commands():
+            for x in range(0, 1000):
+                pulled.append(x)
+                yield '192.168.1.{0}'.format(x % 20), 'sendir,1:1,{0}'.format(x)
+
+        yielded = 0
+        for _ in send_many(commands(), transport_class=self._transport_class, max_in_flight=4):
+            yielded += 1
+            assert_that(len(pulled) - yielded, less_than(4))
+
+        assert_that(yielded, equal_to(1000))
+        assert_that(self._max_in_flight, less_than(5))
+
+    def test_many_devices(self):
+        commands = (('10.0.{0}.{1}'.format(x // 250, x % 250), 'sendir,1:1,{0}'.format(x)) for x in range(0, 1000))
+
+        disconnected = []
+
+        def create(ip):
+            transport = self._transport(ip)
+            transport.disconnect.side_effect = lambda: disconnected.append(ip)
+
+            return transport
+
+        self._transport_class.side_effect = create
+
+        for _ in send_many(commands, transport_class=self._transport_class, max_in_flight=4):
+            # idle connections are closed least recently used first rather than kept for every device seen
+            assert_that(len(self._transports) - len(disconnected), less_than(9))
+
+        assert_that(len(self._transports), equal_to(1000))
+
+        for transport in self._transports:
+            assert_that(transport.disconnect.call_count, equal_to(1))
+
+    def test_close_early(self):
+        results = send_many(
+            (('192.168.1.{0}'.format(x % 3), 'sendir,1:1,{0}'.format(x)) for x in range(0, 100)),
+            transport_class=self._transport_class,
+            max_in_flight=4,
+        )
+
+        next(results)
+        results.close()
+
+        # only what was already dispatched goes out, and every connection is closed behind it
+        assert_that(sum(len(x) for x in self._calls_by_ip.values()), less_than(5))
+
+        for transport in self._transports:
+            assert_that(transport.disconnect.call_count, equal_to(1))
+
+    def test_error(self):
+        failing = MagicMock()
+        failing.call.side_effect = [OSError('timed out'), 'ok']
+
+        self._transport_class.side_effect = lambda ip: failing if ip == '192.168.1.12' else self._transport(ip)
+
+        results = list(send_many(
+            [('192.168.1.12', 'sendir,1'), ('192.168.1.12', 'sendir,2'), ('192.168.1.13', 'sendir,3')],
+            transport_class=self._transport_class,
+        ))
+
+        results_by_index = {x.index: x for x in results}
+
+        assert_that(results_by_index[0].error, instance_of(OSError))
+        assert_that(results_by_index[1].output, equal_to('ok'))
+        assert_that(results_by_index[2].output, equal_to('192.168.1.13 sendir,3'))
+
+        # the device reconnects after a failure rather than reuse the broken connection
+        assert_that(failing.disconnect.call_count, equal_to(2))
+        assert_that(failing.connect.call_count, equal_to(2))
+
+    @patch('zmote.fleet._discover_uuids')
+    def test_uuids(self, discover_uuids):
+        discover_uuids.side_effect = lambda uuids, deadline=None: {
+            x: _TEST_RESPONSE_PARSED_WITH_IP for x in uuids if x == _UUID
+        }
+
+        results = sorted(send_many(
+            [(_UUID, 'sendir,1'), ('CI00ffffff', 'sendir,2'), (_UUID, 'sendir,3')],
+            transport_class=self._transport_class,
+        ), key=lambda x: x.index)
+
+        assert_that(results[0].ip, equal_to('192.168.1.12'))
+        assert_that(results[1].error, instance_of(LookupError))
+        assert_that(results[2].output, equal_to('192.168.1.12 sendir,3'))
+
+        # resolved once per device, not once per command
+        assert_that(discover_uuids.call_count, equal_to(2))
@@ -0,0 +1,382 @@
+import functools
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging import getLogger
+
+from requests import Session
+from requests.exceptions import Timeout as RequestsTimeout
+
+from zmote.connector import _LEARN_TIMEOUT, Connector, TCPTransport
+from zmote.deadline import Deadline
+from zmote.discovery_service import DiscoveryService
+from zmote.fleet import _UUID_PATTERN
+from zmote.health import _INTERVAL as _HEALTH_INTERVAL, HealthChecker
+from zmote.metrics import Metrics
+from zmote.pool import ConnectionPool, PooledTransport
+from zmote.scheduler import _MIN_GAP, NORMAL, Scheduler
+
+_HOST = '127.0.0.1'
+_PORT = 8998
+
+_RESOLVE_TIMEOUT = 5
+_CLIENT_TIMEOUT = 30
+
+_ERRORS_BY_STATUS = {
+    400: ValueError,
+    404: LookupError,
+    504: TimeoutError,
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        self.server.gateway._logger.debug('%s - %s', self.address_string(), format % args)
+
+    def _reply(self, status, body, content_type='application/json'):
+        data = (json.dumps(body) if content_type == 'application/json' else body).encode()
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self, *keys):
+        data = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        try:
+            body = json.loads(data.decode() or '{}')
+        except ValueError as e:
+            raise ValueError('cannot parse request body {0} ({1})'.format(repr(data), e))
+
+        if not isinstance(body, dict) or any(x not in body for x in keys):
+            raise ValueError('request body {0} must be an object with {1}'.format(repr(data), ', '.join(keys)))
+
+        return body
+
+    def _deadline(self, body):
+        # seconds the client has left; the scheduler drops the command rather than send it after the client gave up
+        deadline = body.get('deadline')
+        if deadline is None:
+            return None
+
+        try:
+            return float(deadline)
+        except (TypeError, ValueError):
+            raise ValueError('deadline {0} must be a number of seconds'.format(repr(deadline)))
+
+    def _handle(self, func):
+        try:
+            status, body = 200, func()
+        except LookupError as e:
+            status, body = 404, {'error': str(e)}
+        except ValueError as e:
+            status, body = 400, {'error': str(e)}
+        except TimeoutError as e:
+            status, body = 504, {'error': str(e)}
+        except Exception as e:
+            status, body = 502, {'error': repr(e)}
+
+        self._reply(status, body)
+
+    def do_GET(self):
+        gateway = self.server.gateway
+
+        if self.path == '/devices':
+            self._handle(gateway.devices)
+        elif self.path == '/health':
+            self._handle(gateway.health)
+        elif self.path == '/metrics':
+            self._reply(200, gateway.metrics.to_prometheus(), content_type='text/plain; version=0.0.4')
+        else:
+            self._reply(404, {'error': 'no such path {0}'.format(repr(self.path))})
+
+    def do_POST(self):
+        gateway = self.server.gateway
+
+        def send():
+            body = self._body('device', 'data')
+            return gateway.send(
+                body['device'], body['data'], body.get('priority', NORMAL), deadline=self._deadline(body),
+            )
+
+        def learn():
+            body = self._body('device')
+            return gateway.learn(body['device'], deadline=self._deadline(body))
+
+        if self.path == '/send':
+            self._handle(send)
+        elif self.path == '/learn':
+            self._handle(learn)
+        else:
+            self._reply(404, {'error': 'no such path {0}'.format(repr(self.path))})
+
+
+class Gateway(object):
+    def __init__(self, host=_HOST, port=_PORT, transport_class=TCPTransport, min_gap=_MIN_GAP,
+                 discovery_service=None, interfaces=None, resolve_timeout=_RESOLVE_TIMEOUT,
+                 health_interval=_HEALTH_INTERVAL):
+        self._transport_class = transport_class
+        self._resolve_timeout = resolve_timeout
+
+        self.metrics = Metrics()
+
+        self._pool = ConnectionPool(metrics=self.metrics)
+        self._scheduler = Scheduler(
+            transport_class=functools.partial(PooledTransport, transport_class=transport_class, pool=self._pool),
+            min_gap=min_gap,
+        )
+        self._health_checker = HealthChecker(pool=self._pool, interval=health_interval)
+        self._discovery_service = discovery_service if discovery_service is not None else DiscoveryService(
+            interfaces=interfaces,
+        )
+
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.gateway = self
+        self._thread = None
+
+        self._logger = getLogger(self.__class__.__name__)
+        self._logger.debug('__init__(); address=%s, transport_class=%s', self._server.server_address, transport_class)
+
+    @property
+    def address(self):
+        return self._server.server_address
+
+    def resolve(self, device):
+        if not _UUID_PATTERN.match(device):
+            return device
+
+        zmote = self._discovery_service.get(device)
+        if zmote is None:
+            zmote = self._discovery_service.wait_for(device, timeout=self._resolve_timeout)
+
+        if zmote is None:
+            raise LookupError('could not discover IP for {0}'.format(repr(device)))
+
+        return zmote['IP']
+
+    def devices(self):
+        return self._discovery_service.devices()
+
+    def health(self):
+        return self._health_checker.states()
+
+    def send(self, device, data, priority=NORMAL, timeout=None, deadline=None):
+        self._logger.debug('send(%r, %r); priority=%s', device, data, priority)
+
+        ip = self.resolve(device)
+        output = self._scheduler.send(ip, data, priority=int(priority), timeout=timeout, deadline=deadline)
+
+        return {'device': device, 'ip': ip, 'output': output}
+
+    def learn(self, device, timeout=None, deadline=None):
+        self._logger.debug('learn(%r)', device)
+
+        ip = self.resolve(device)
+
+        # learning waits on someone pressing a remote, so it gets its own budget and its own connection rather than
+        # hold the device's send queue and pooled connection for up to a minute
+        deadline = Deadline.of(deadline, timeout if timeout is not None else _LEARN_TIMEOUT)
+
+        connector = Connector(transport=self._transport_class(ip=ip, metrics=self.metrics))
+        try:
+            connector.connect(deadline=deadline)
+            output = connector.learn(deadline=deadline)
+        except RequestsTimeout as e:
+            raise TimeoutError('no code learned from {0} before the deadline ({1})'.format(repr(device), e))
+        finally:
+            connector.disconnect()
+
+        return {'device': device, 'ip': ip, 'output': output}
+
+    def start(self):
+        self._logger.debug('start()')
+
+        self._discovery_service.start()
+        self._health_checker.start()
+
+        self._thread = threading.Thread(target=self._server.serve_forever, name=self.__class__.__name__)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._logger.debug('stop()')
+
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+
+        self._server.server_close()
+        self._health_checker.stop()
+        self._scheduler.close()
+        self._pool.close()
+        self._discovery_service.stop()
+
+
+class GatewayClient(object):
+    def __init__(self, host=_HOST, port=_PORT, timeout=_CLIENT_TIMEOUT):
+        self._url = 'http://{0}:{1}'.format(host, port)
+        self._timeout = timeout
+
+        self._session = Session()
+
+        self._logger = getLogger(self.__class__.__name__)
+        self._logger.debug('__init__(); url=%r', self._url)
+
+    def _request(self, method, path, body=None, deadline=None):
+        timeout = self._timeout
+
+        if deadline is not None:
+            remaining = Deadline.of(deadline).timeout('{0} {1}'.format(method, path))
+            if remaining is not None:
+                body = dict(body, deadline=remaining)
+                timeout = min(timeout, remaining)
+
+        response = self._session.request(method, self._url + path, json=body, timeout=timeout)
+
+        if not response.ok:
+            error = _ERRORS_BY_STATUS.get(response.status_code, ConnectionError)
+            raise error('{0} {1} failed with {2}: {3}'.format(
+                method, path, response.status_code, response.json().get('error'),
+            ))
+
+        return response.json()
+
+    def devices(self):
+        return self._request('GET', '/devices')
+
+    def health(self):
+        return self._request('GET', '/health')
+
+    def send(self, device, data, priority=NORMAL, deadline=None):
+        self._logger.debug('send(%r, %r)', device, data)
+
+        return self._request(
+            'POST', '/send', {'device': device, 'data': str(data), 'priority': priority}, deadline=deadline,
+        )['output']
+
+    def learn(self, device, deadline=None):
+        self._logger.debug('learn(%r)', device)
+
+        return self._request('POST', '/learn', {'device': device}, deadline=deadline)['output']
+
+    def close(self):
+        self._session.close()
+
+
+class GatewayTransport(object):
+    def __init__(self, device, client=None, priority=NORMAL):
+        self._device = device
+        self._client = client if client is not None else GatewayClient()
+        self._priority = priority
+
+        self._logger = getLogger(self.__class__.__name__)
+        self._logger.debug('__init__(); device=%r, priority=%s', device, priority)
+
+    def connect(self, deadline=None):
+        self._logger.debug('connect()')
+
+        # the gateway holds the connection to the device
+
+    def call(self, data, deadline=None):
+        self._logger.debug('call(%r)', data)
+
+        output = self._client.send(self._device, data, priority=self._priority, deadline=deadline)
+
+        self._logger.debug('call(%r); output=%r', data, output)
+
+        return output
+
+    def disconnect(self):
+        self._logger.debug('disconnect()')
+
+
+if __name__ == '__main__':
+    import argparse
+    import signal
+
+    import logging
+
+    from zmote.connector import HTTPTransport
+    from zmote.discoverer import interface_addresses
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(
+        logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    )
+
+    logger = logging.getLogger(Gateway.__name__)
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(handler)
+
+    parser = argparse.ArgumentParser(
+        description='Serve a local HTTP API that holds warm connections and per-device queues for zmote.io devices',
+    )
+
+    parser.add_argument(
+        '-H',
+        '--host',
+        type=str,
+        default=_HOST,
+        help='address to listen on (default {0})'.format(_HOST),
+    )
+
+    parser.add_argument(
+        '-p',
+        '--port',
+        type=int,
+        default=_PORT,
+        help='port to listen on (default {0})'.format(_PORT),
+    )
+
+    parser.add_argument(
+        '-t',
+        '--transport',
+        choices=['http', 'tcp'],
+        default='tcp',
+        help='transport to hold to each device (default TCP)',
+    )
+
+    parser.add_argument(
+        '-g',
+        '--min-gap',
+        type=float,
+        default=_MIN_GAP,
+        help='minimum seconds between commands to one device (default {0})'.format(_MIN_GAP),
+    )
+
+    parser.add_argument(
+        '-i',
+        '--interface',
+        action='append',
+        default=None,
+        help='IPv4 address of an interface to discover on; repeat for several (default every interface found)',
+    )
+
+    args = parser.parse_args()
+
+    gateway = Gateway(
+        host=args.host,
+        port=args.port,
+        transport_class=HTTPTransport if args.transport == 'http' else TCPTransport,
+        min_gap=args.min_gap,
+        # joining on INADDR_ANY only listens on whichever interface the kernel picks
+        interfaces=args.interface if args.interface is not None else interface_addresses() or None,
+    )
+
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+
+    gateway.start()
+    try:
+        while not stopped.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        gateway.stop()
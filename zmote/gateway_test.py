@@ -0,0 +1,141 @@
+import threading
+import time
+import unittest
+
+from hamcrest import assert_that, equal_to, less_than
+from mock import MagicMock
+
+from zmote.connector import Connector, HTTPTransport
+from zmote.connector_test import _TEST_SENDIR_REQUEST
+from zmote.discovery_service import DiscoveryService
+from zmote.gateway import Gateway, GatewayClient, GatewayTransport
+from zmote.simulator import Simulator, _LEARNED_CODE
+
+
+class GatewayTest(unittest.TestCase):
+    def setUp(self):
+        self._simulator = Simulator()
+        self._simulator.start()
+        self.addCleanup(self._simulator.stop)
+
+        self._zmote = self._simulator.add()[0]
+
+        self._subject = Gateway(
+            port=0,
+            transport_class=HTTPTransport,
+            min_gap=0,
+            discovery_service=DiscoveryService(probe_interval=0.1, interfaces=[self._simulator.interface]),
+            resolve_timeout=5,
+        )
+        self._subject.start()
+        self.addCleanup(self._subject.stop)
+
+        self._client = GatewayClient(*self._subject.address)
+        self.addCleanup(self._client.close)
+
+    def test_send_by_uuid(self):
+        assert_that(
+            self._client.send(self._zmote.uuid, _TEST_SENDIR_REQUEST),
+            equal_to('completeir,1:1,0')
+        )
+
+        assert_that(
+            self._client.devices()[self._zmote.uuid]['IP'],
+            equal_to(self._zmote.ip)
+        )
+
+    def test_send_by_ip_reuses_connection(self):
+        for _ in range(0, 3):
+            self._client.send(self._zmote.ip, _TEST_SENDIR_REQUEST)
+
+        assert_that(
+            self._zmote.received,
+            equal_to([_TEST_SENDIR_REQUEST] * 3)
+        )
+
+        assert_that(
+            self._subject.metrics.snapshot()[self._zmote.ip]['sendir']['count'],
+            equal_to(3)
+        )
+
+    def test_health(self):
+        self._client.send(self._zmote.ip, _TEST_SENDIR_REQUEST)
+
+        self._subject._health_checker.check()
+
+        assert_that(
+            self._client.health()[self._zmote.ip]['State'],
+            equal_to('up')
+        )
+
+    def test_learn(self):
+        assert_that(
+            self._client.learn(self._zmote.ip),
+            equal_to(_LEARNED_CODE.split('sendir,')[-1])
+        )
+
+    def test_learn_beside_sends(self):
+        zmote = self._simulator.add(learn_delay=1)[0]
+
+        thread = threading.Thread(target=self._client.learn, args=(zmote.ip,))
+        thread.start()
+        self.addCleanup(thread.join)
+
+        while 'get_IRL' not in zmote.received:
+            time.sleep(0.01)
+
+        # the learn has a connection of its own, so sends to the same device don't queue up behind it
+        before = time.monotonic()
+        self._client.send(zmote.ip, _TEST_SENDIR_REQUEST)
+
+        assert_that(time.monotonic() - before, less_than(0.5))
+
+    def test_learn_timeout(self):
+        zmote = self._simulator.add(learn_delay=5)[0]
+
+        with self.assertRaises(TimeoutError):
+            self._subject.learn(zmote.ip, deadline=0.2)
+
+        # the device is taken back out of learn mode
+        assert_that(zmote.received[-1], equal_to('stop_IRL'))
+
+    def test_unknown_device(self):
+        self._subject._resolve_timeout = 0.1
+
+        with self.assertRaises(LookupError):
+            self._client.send('CI0fffffff', _TEST_SENDIR_REQUEST)
+
+    def test_bad_request(self):
+        with self.assertRaises(ValueError):
+            self._client._request('POST', '/send', {'device': self._zmote.ip})
+
+    def test_gateway_transport(self):
+        connector = Connector(GatewayTransport(self._zmote.uuid, client=self._client))
+        connector.connect()
+
+        assert_that(
+            connector.send(_TEST_SENDIR_REQUEST),
+            equal_to('completeir,1:1,0')
+        )
+
+        connector.disconnect()
+
+
+class GatewayClientTest(unittest.TestCase):
+    def test_send(self):
+        subject = GatewayClient(port=1234)
+        subject._session = MagicMock()
+        subject._session.request.return_value.ok = True
+        subject._session.request.return_value.json.return_value = {'output': 'completeir,1:1,0'}
+
+        assert_that(
+            subject.send('CI00a1b2c3', _TEST_SENDIR_REQUEST),
+            equal_to('completeir,1:1,0')
+        )
+
+        subject._session.request.assert_called_once_with(
+            'POST',
+            'http://127.0.0.1:1234/send',
+            json={'device': 'CI00a1b2c3', 'data': _TEST_SENDIR_REQUEST, 'priority': 10},
+            timeout=30,
+        )
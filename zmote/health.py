@@ -0,0 +1,171 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+
+from zmote.deadline import Deadline
+from zmote.pool import get_pool
+
+_INTERVAL = 30
+_TIMEOUT = 2
+_MAX_WORKERS = 8
+
+UP = 'up'
+DOWN = 'down'
+
+
+def _ping(transport, deadline):
+    # transports without a liveness call of their own are trusted until a real command fails
+    ping = getattr(transport, 'ping', None)
+    if ping is not None:
+        ping(deadline=deadline)
+
+
+class HealthChecker(object):
+    def __init__(self, pool=None, interval=_INTERVAL, timeout=_TIMEOUT, max_workers=_MAX_WORKERS):
+        self._pool = pool if pool is not None else get_pool()
+        self._interval = interval
+        self._timeout = timeout
+        self._max_workers = max_workers
+
+        self._lock = threading.Lock()
+        self._states_by_ip = {}
+        self._down_keys = set()
+        self._callbacks = []
+
+        self._thread = None
+        self._stopped = threading.Event()
+
+        self._logger = getLogger(self.__class__.__name__)
+        self._logger.debug('__init__(); interval=%s, timeout=%s', interval, timeout)
+
+    def subscribe(self, callback):
+        self._logger.debug('subscribe(%s)', callback)
+
+        with self._lock:
+            self._callbacks.append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._callbacks:
+                    self._callbacks.remove(callback)
+
+        return unsubscribe
+
+    def _record(self, key, state, latency, error):
+        transport_class, ip = key
+
+        with self._lock:
+            previous = self._states_by_ip.get(ip)
+            self._states_by_ip[ip] = {
+                'State': state,
+                'Transport': getattr(transport_class, '__name__', repr(transport_class)),
+                'Checked': time.time(),
+                'Latency': latency,
+                'Error': repr(error) if error is not None else None,
+            }
+
+            if state == DOWN:
+                self._down_keys.add(key)
+            else:
+                self._down_keys.discard(key)
+
+            callbacks = list(self._callbacks) if previous is None or previous['State'] != state else []
+
+        for callback in callbacks:
+            try:
+                callback(state, ip)
+            except Exception as e:
+                self._logger.error('_record(); callback=%s, exception=%r', callback, e)
+
+    def _check(self, key):
+        transport_class, ip = key
+
+        before = time.monotonic()
+
+        transport = self._pool.acquire_idle(ip, transport_class)
+        if transport is not None:
+            try:
+                _ping(transport, Deadline(self._timeout))
+            except Exception as e:
+                self._logger.warning('_check(); ip=%r, reconnecting after exception=%r', ip, e)
+
+                self._pool.release(transport, broken=True)
+            else:
+                self._pool.release(transport)
+                self._record(key, UP, time.monotonic() - before, None)
+
+                return
+
+        # reconnect now so the next command finds a warm connection rather than a dead one
+        try:
+            transport = self._pool.acquire(ip, transport_class, Deadline(self._timeout), block=False)
+        except Exception as e:
+            self._logger.warning('_check(); ip=%r, down after exception=%r', ip, e)
+
+            self._record(key, DOWN, time.monotonic() - before, e)
+
+            return
+
+        # a connection in use (a long learn, a busy send) says nothing either way; check it once it is idle again
+        if transport is None:
+            self._logger.debug('_check(); ip=%r, skipped as in use', ip)
+
+            return
+
+        self._pool.release(transport)
+        self._record(key, UP, time.monotonic() - before, None)
+
+    def check(self):
+        self._logger.debug('check()')
+
+        with self._lock:
+            keys = set(self._down_keys)
+
+        keys.update(self._pool.idle_keys())
+
+        if keys:
+            with ThreadPoolExecutor(max_workers=max(1, min(self._max_workers, len(keys)))) as executor:
+                list(executor.map(self._check, keys))
+
+        return self.states()
+
+    def states(self):
+        with self._lock:
+            return {k: dict(v) for k, v in self._states_by_ip.items()}
+
+    def is_up(self, ip):
+        with self._lock:
+            state = self._states_by_ip.get(ip)
+
+        return state['State'] == UP if state is not None else None
+
+    def forget(self, ip):
+        with self._lock:
+            self._states_by_ip.pop(ip, None)
+            self._down_keys = {x for x in self._down_keys if x[1] != ip}
+
+    def _run(self):
+        while not self._stopped.wait(self._interval):
+            try:
+                self.check()
+            except Exception as e:
+                self._logger.error('_run(); exception=%r', e)
+
+    def start(self):
+        self._logger.debug('start()')
+
+        self._stopped.clear()
+
+        self._thread = threading.Thread(target=self._run, name=self.__class__.__name__)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._logger.debug('stop()')
+
+        self._stopped.set()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,99 @@
+import functools
+import unittest
+
+from hamcrest import assert_that, equal_to, is_not, same_instance
+from mock import MagicMock
+
+from zmote.cache import DeviceCache
+from zmote.connector import HTTPTransport, TCPTransport
+from zmote.connector_test import _TEST_SENDIR_REQUEST
+from zmote.health import DOWN, UP, HealthChecker
+from zmote.pool import ConnectionPool, PooledTransport
+from zmote.simulator import Simulator
+
+
+class HealthCheckerTest(unittest.TestCase):
+    def setUp(self):
+        self._simulator = Simulator()
+        self._simulator.start()
+        self.addCleanup(self._simulator.stop)
+
+        self._zmote = self._simulator.add()[0]
+
+        self._pool = ConnectionPool()
+        self.addCleanup(self._pool.close)
+
+        self._subject = HealthChecker(pool=self._pool, timeout=1)
+
+    def test_reconnects_dropped(self):
+        transport_class = functools.partial(TCPTransport, port=self._zmote.tcp_port)
+
+        # a round trip first so the simulator has accepted the connection before it drops it
+        dropped = self._pool.acquire(self._zmote.host, transport_class)
+        dropped.call(_TEST_SENDIR_REQUEST)
+        self._pool.release(dropped)
+
+        self._simulator.drop(self._zmote)
+
+        assert_that(
+            self._subject.check()[self._zmote.host]['State'],
+            equal_to(UP)
+        )
+
+        transport = self._pool.acquire_idle(self._zmote.host, transport_class)
+        assert_that(transport, is_not(same_instance(dropped)))
+        self._pool.release(transport)
+
+        assert_that(
+            PooledTransport(self._zmote.host, transport_class=transport_class, pool=self._pool).call(
+                _TEST_SENDIR_REQUEST
+            ),
+            equal_to('completeir,1:1,0')
+        )
+
+    def test_http(self):
+        transport_class = functools.partial(HTTPTransport, cache=DeviceCache())
+
+        self._pool.release(self._pool.acquire(self._zmote.ip, transport_class))
+
+        assert_that(self._subject.check()[self._zmote.ip]['State'], equal_to(UP))
+        assert_that(self._subject.is_up(self._zmote.ip), equal_to(True))
+
+    def test_down_and_up(self):
+        transport = MagicMock()
+        transport.ping.side_effect = ConnectionResetError()
+        transport_class = MagicMock(side_effect=[transport, ConnectionRefusedError(), MagicMock()])
+
+        events = []
+        self._subject.subscribe(lambda state, ip: events.append((state, ip)))
+
+        self._pool.release(self._pool.acquire('192.168.1.12', transport_class))
+
+        # the idle connection fails its ping and cannot be replaced
+        assert_that(self._subject.check()['192.168.1.12']['State'], equal_to(DOWN))
+        transport.disconnect.assert_called_once_with()
+
+        # down devices keep being retried without an idle connection to ping
+        assert_that(self._subject.check()['192.168.1.12']['State'], equal_to(UP))
+
+        assert_that(
+            events,
+            equal_to([(DOWN, '192.168.1.12'), (UP, '192.168.1.12')])
+        )
+
+    def test_skips_in_use(self):
+        transport_class = MagicMock()
+
+        self._pool.release(self._pool.acquire('192.168.1.12', transport_class))
+        assert_that(self._subject.check()['192.168.1.12']['State'], equal_to(UP))
+
+        # a long learn or a busy send has the only connection checked out
+        transport = self._pool.acquire('192.168.1.12', transport_class)
+        transport.ping.reset_mock()
+        self._subject._down_keys.add((transport_class, '192.168.1.12'))
+
+        assert_that(self._subject.check()['192.168.1.12']['State'], equal_to(UP))
+        assert_that(transport.ping.called, equal_to(False))
+        assert_that(transport_class.call_count, equal_to(1))
+
+        self._pool.release(transport)
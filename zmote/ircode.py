@@ -0,0 +1,209 @@
+from array import array
+
+# a Pronto frequency word counts periods of this many microseconds
+_PRONTO_CLOCK = 0.241246
+
+_SENDIR_PREFIX = 'sendir,'
+
+
+class IRCode(object):
+    __slots__ = (
+        '_module', '_connector', '_id', '_frequency', '_repeat', '_offset', '_timings',
+        '_sendir', '_tcp_bytes', '_http_bytes', '_repeat_only',
+    )
+
+    def __init__(self, frequency, timings, repeat=1, offset=1, module=1, connector=1, id=0):
+        offset = int(offset)
+
+        if len(timings) % 2:
+            raise ValueError('timings must be on/off pairs; got {0} values'.format(len(timings)))
+
+        if offset < 1 or offset > max(1, len(timings)) or not offset % 2:
+            raise ValueError('offset must be an odd index into timings; got {0}'.format(offset))
+
+        self._module = int(module)
+        self._connector = int(connector)
+        self._id = int(id)
+        self._frequency = int(frequency)
+        self._repeat = int(repeat)
+        self._offset = offset
+        self._timings = array('H' if max(timings or [0]) < 65536 else 'I', timings)
+
+        self._sendir = None
+        self._tcp_bytes = None
+        self._http_bytes = None
+
+        # sendir writes both a once-only and a repeat-only Pronto code as offset 1; remember which one this came from
+        self._repeat_only = False
+
+    @classmethod
+    def parse(cls, data):
+        if isinstance(data, bytes):
+            data = data.decode()
+
+        data = data.strip().split(_SENDIR_PREFIX)[-1]
+
+        try:
+            fields = data.split(',')
+            module, connector = fields[0].split(':')
+
+            return cls(
+                module=module,
+                connector=connector,
+                id=fields[1],
+                frequency=fields[2],
+                repeat=fields[3],
+                offset=fields[4],
+                timings=[int(x) for x in fields[5:]],
+            )
+        except (IndexError, ValueError) as e:
+            raise ValueError('cannot parse data {0}; does not appear to be a sendir code ({1})'.format(
+                repr(data), e
+            ))
+
+    @classmethod
+    def from_pronto(cls, pronto, repeat=1, module=1, connector=1, id=0):
+        try:
+            words = [int(x, 16) for x in pronto.split()]
+            kind, frequency_word, once_pairs, repeat_pairs = words[0:4]
+        except ValueError as e:
+            raise ValueError('cannot parse pronto {0} ({1})'.format(repr(pronto), e))
+
+        if kind != 0:
+            raise ValueError('only raw (0000) pronto codes are supported; got {0:04X}'.format(kind))
+
+        timings = words[4:]
+        if len(timings) != 2 * (once_pairs + repeat_pairs):
+            raise ValueError('pronto {0} declares {1} pairs but has {2} values'.format(
+                repr(pronto), once_pairs + repeat_pairs, len(timings)
+            ))
+
+        code = cls(
+            module=module,
+            connector=connector,
+            id=id,
+            frequency=round(1000000 / (frequency_word * _PRONTO_CLOCK)),
+            repeat=repeat,
+            offset=2 * once_pairs + 1 if once_pairs and repeat_pairs else 1,
+            timings=timings,
+        )
+        code._repeat_only = not once_pairs and bool(repeat_pairs)
+
+        return code
+
+    def to_pronto(self):
+        if self._repeat_only:
+            once, repeat = [], self._timings
+        else:
+            once = self._timings[0:self._offset - 1] if self._offset > 1 else self._timings
+            repeat = self._timings[self._offset - 1:] if self._offset > 1 else []
+
+        words = [
+            0,
+            round(1000000 / (self._frequency * _PRONTO_CLOCK)),
+            len(once) // 2,
+            len(repeat) // 2,
+        ] + list(once) + list(repeat)
+
+        return ' '.join('{0:04X}'.format(x) for x in words)
+
+    def with_repeat(self, repeat):
+        code = IRCode(
+            module=self._module,
+            connector=self._connector,
+            id=self._id,
+            frequency=self._frequency,
+            repeat=repeat,
+            offset=self._offset,
+            timings=self._timings,
+        )
+        code._repeat_only = self._repeat_only
+
+        return code
+
+    @property
+    def module(self):
+        return self._module
+
+    @property
+    def connector(self):
+        return self._connector
+
+    @property
+    def id(self):
+        return self._id
+
+    @property
+    def frequency(self):
+        return self._frequency
+
+    @property
+    def repeat(self):
+        return self._repeat
+
+    @property
+    def offset(self):
+        return self._offset
+
+    @property
+    def timings(self):
+        return self._timings
+
+    @property
+    def key(self):
+        return '{0}:{1}'.format(self._module, self._connector), str(self._id)
+
+    @property
+    def sendir(self):
+        if self._sendir is None:
+            self._sendir = '{0}{1}:{2},{3},{4},{5},{6},{7}'.format(
+                _SENDIR_PREFIX, self._module, self._connector, self._id, self._frequency, self._repeat, self._offset,
+                ','.join(map(str, self._timings)),
+            )
+
+        return self._sendir
+
+    @property
+    def http_bytes(self):
+        if self._http_bytes is None:
+            self._http_bytes = self.sendir.encode()
+
+        return self._http_bytes
+
+    @property
+    def tcp_bytes(self):
+        if self._tcp_bytes is None:
+            self._tcp_bytes = self.http_bytes + b'\r'
+
+        return self._tcp_bytes
+
+    def same_signal(self, other):
+        return (
+            self._module == other._module and
+            self._connector == other._connector and
+            self._frequency == other._frequency and
+            self._offset == other._offset and
+            self._timings == other._timings
+        )
+
+    def __eq__(self, other):
+        if not isinstance(other, IRCode):
+            return NotImplemented
+
+        return self.same_signal(other) and self._id == other._id and self._repeat == other._repeat
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+
+        return not result
+
+    def __hash__(self):
+        return hash(self.sendir)
+
+    def __str__(self):
+        return self.sendir
+
+    def __repr__(self):
+        return '{0}({1})'.format(self.__class__.__name__, repr(self.sendir))
@@ -0,0 +1,104 @@
+import sys
+import unittest
+
+from hamcrest import assert_that, equal_to, less_than, same_instance
+
+from zmote.connector_test import _TEST_SENDIR_REQUEST
+from zmote.ircode import IRCode
+
+_TEST_PRONTO = '0000 006D 0006 0000 0020 0020 0040 0020 0020 0040 0020 0020 0040 0020 0020 0CC0'
+
+_TEST_PRONTO_SENDIR = 'sendir,1:1,0,38029,1,1,32,32,64,32,32,64,32,32,64,32,32,3264'
+
+
+class IRCodeTest(unittest.TestCase):
+    def test_parse(self):
+        code = IRCode.parse(_TEST_SENDIR_REQUEST)
+
+        assert_that(
+            (code.module, code.connector, code.id, code.frequency, code.repeat, code.offset),
+            equal_to((1, 1, 0, 36000, 1, 1))
+        )
+
+        assert_that(
+            list(code.timings),
+            equal_to([32, 32, 64, 32, 32, 64, 32, 3264])
+        )
+
+    def test_parse_without_prefix(self):
+        assert_that(
+            IRCode.parse(_TEST_SENDIR_REQUEST.split('sendir,')[-1]),
+            equal_to(IRCode.parse(_TEST_SENDIR_REQUEST))
+        )
+
+    def test_parse_invalid(self):
+        self.assertRaises(
+            ValueError,
+            IRCode.parse, 'sendir,1:1,0,36000'
+        )
+
+        self.assertRaises(
+            ValueError,
+            IRCode.parse, 'sendir,1:1,0,36000,1,1,32,32,64'
+        )
+
+    def test_sendir(self):
+        code = IRCode.parse(_TEST_SENDIR_REQUEST)
+
+        assert_that(code.sendir, equal_to(_TEST_SENDIR_REQUEST))
+        assert_that(code.http_bytes, equal_to(_TEST_SENDIR_REQUEST.encode()))
+        assert_that(code.tcp_bytes, equal_to(_TEST_SENDIR_REQUEST.encode() + b'\r'))
+        assert_that(code.tcp_bytes, same_instance(code.tcp_bytes))
+
+    def test_from_pronto(self):
+        assert_that(
+            IRCode.from_pronto(_TEST_PRONTO).sendir,
+            equal_to(_TEST_PRONTO_SENDIR)
+        )
+
+    def test_to_pronto(self):
+        assert_that(
+            IRCode.parse(_TEST_PRONTO_SENDIR).to_pronto(),
+            equal_to(_TEST_PRONTO)
+        )
+
+    def test_pronto_with_repeat_section(self):
+        pronto = '0000 006D 0001 0001 0155 00AA 0016 0F6B'
+
+        code = IRCode.from_pronto(pronto)
+
+        assert_that(code.offset, equal_to(3))
+        assert_that(code.to_pronto(), equal_to(pronto))
+
+    def test_pronto_repeat_only(self):
+        # common for RC5/RC6; the whole burst repeats while the button is held
+        pronto = '0000 006D 0000 0002 0020 0020 0040 0CC0'
+
+        code = IRCode.from_pronto(pronto)
+
+        assert_that(code.offset, equal_to(1))
+        assert_that(code.to_pronto(), equal_to(pronto))
+        assert_that(code.with_repeat(3).to_pronto(), equal_to(pronto))
+
+    def test_with_repeat(self):
+        code = IRCode.parse(_TEST_SENDIR_REQUEST).with_repeat(5)
+
+        assert_that(
+            code.sendir,
+            equal_to('sendir,1:1,0,36000,5,1,32,32,64,32,32,64,32,3264')
+        )
+
+        assert_that(
+            code.same_signal(IRCode.parse(_TEST_SENDIR_REQUEST)),
+            equal_to(True)
+        )
+
+    def test_compact(self):
+        code = IRCode.parse(_TEST_SENDIR_REQUEST)
+
+        self.assertRaises(AttributeError, setattr, code, 'other', 1)
+
+        assert_that(
+            sys.getsizeof(code) + sys.getsizeof(code.timings),
+            less_than(sys.getsizeof(_TEST_SENDIR_REQUEST) + sys.getsizeof(_TEST_SENDIR_REQUEST.split(',')))
+        )
@@ -0,0 +1,268 @@
+import errno
+import os
+import selectors
+import socket
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+from logging import getLogger
+
+from zmote.connector import _LEARN_TIMEOUT, _LEARNER_ENABLED, _RECV_SIZE, _TCP_PORT
+from zmote.ircode import IRCode
+
+_GET_IRL = b'get_IRL\r'
+_STOP_IRL = b'stop_IRL\r'
+
+
+class _Session(object):
+    __slots__ = ('ip', 'port', 'deadline', 'future', 'sock', 'connected', 'pending')
+
+    def __init__(self, ip, port, deadline):
+        self.ip = ip
+        self.port = port
+        self.deadline = deadline
+        self.future = Future()
+
+        self.sock = None
+        self.connected = False
+        self.pending = b''
+
+
+class Learner(object):
+    def __init__(self, port=_TCP_PORT, timeout=_LEARN_TIMEOUT):
+        self._port = port
+        self._timeout = timeout
+
+        self._lock = threading.Lock()
+        self._actions = []
+        self._sessions = set()
+
+        self._selector = None
+        self._wake_r = None
+        self._wake_w = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+        self._logger = getLogger(self.__class__.__name__)
+        self._logger.debug('__init__(); port=%s, timeout=%s', port, timeout)
+
+    def _post(self, action, session):
+        with self._lock:
+            self._actions.append((action, session))
+
+        try:
+            self._wake_w.send(b'\x00')
+        except OSError:
+            pass
+
+    def _open(self, session):
+        self._sessions.add(session)
+
+        session.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        session.sock.setblocking(False)
+
+        error = session.sock.connect_ex((session.ip, session.port))
+        if error not in (0, errno.EINPROGRESS):
+            self._finish(session, exception=OSError(error, os.strerror(error)))
+            return
+
+        self._selector.register(session.sock, selectors.EVENT_WRITE, session)
+
+    def _finish(self, session, result=None, exception=None, stop=False):
+        if session not in self._sessions:
+            return
+
+        self._sessions.discard(session)
+
+        if session.sock is not None:
+            try:
+                self._selector.unregister(session.sock)
+            except (KeyError, ValueError):
+                pass
+
+            # the device stays in learn mode until told otherwise
+            if stop and session.connected:
+                try:
+                    session.sock.send(_STOP_IRL)
+                except OSError as e:
+                    self._logger.debug('_finish(); ip=%r, exception=%r', session.ip, e)
+
+            session.sock.close()
+
+        self._logger.debug('_finish(); ip=%r, result=%r, exception=%r', session.ip, result, exception)
+
+        try:
+            if exception is not None:
+                session.future.set_exception(exception)
+            else:
+                session.future.set_result(result)
+        except InvalidStateError:
+            # cancelled by the caller in the meantime
+            pass
+
+    def _on_writable(self, session):
+        error = session.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if error:
+            self._finish(session, exception=OSError(error, os.strerror(error)))
+            return
+
+        session.connected = True
+
+        try:
+            session.sock.send(_GET_IRL)
+        except OSError as e:
+            self._finish(session, exception=e, stop=True)
+            return
+
+        self._selector.modify(session.sock, selectors.EVENT_READ, session)
+
+    def _on_readable(self, session):
+        try:
+            data = session.sock.recv(_RECV_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            self._finish(session, exception=e)
+            return
+
+        if not data:
+            self._finish(session, exception=ConnectionResetError('connection closed by {0}'.format(repr(session.ip))))
+            return
+
+        lines = (session.pending + data.replace(b'\n', b'\r')).split(b'\r')
+        session.pending = lines.pop()
+
+        for line in lines:
+            try:
+                line = line.decode().strip()
+            except UnicodeDecodeError as e:
+                self._finish(session, exception=e, stop=True)
+                return
+
+            if not line or line == _LEARNER_ENABLED:
+                continue
+
+            try:
+                code = IRCode.parse(line)
+            except ValueError as e:
+                self._finish(session, exception=e, stop=True)
+            else:
+                self._finish(session, result=code)
+
+            return
+
+    def _apply_actions(self):
+        with self._lock:
+            actions, self._actions = self._actions, []
+
+        for action, session in actions:
+            if action == 'open':
+                self._open(session)
+            elif action == 'cancel':
+                self._finish(session, exception=None, stop=True)
+
+    def _expire(self, now):
+        for session in [x for x in self._sessions if x.deadline is not None and x.deadline <= now]:
+            self._finish(
+                session,
+                exception=TimeoutError('no code learned from {0} before the deadline'.format(repr(session.ip))),
+                stop=True,
+            )
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self._poll()
+            except Exception as e:
+                # fail what is outstanding rather than leave it waiting on a thread that can no longer finish it
+                self._logger.error('_run(); exception=%r', e)
+
+                for session in list(self._sessions):
+                    self._finish(session, exception=e, stop=True)
+
+        for session in list(self._sessions):
+            session.future.cancel()
+            self._finish(session, stop=True)
+
+    def _poll(self):
+        self._apply_actions()
+
+        now = time.monotonic()
+        self._expire(now)
+
+        deadlines = [x.deadline for x in self._sessions if x.deadline is not None]
+        timeout = max(0, min(deadlines) - now) if deadlines else None
+
+        for key, mask in self._selector.select(timeout):
+            if key.fileobj is self._wake_r:
+                self._wake_r.recv(4096)
+            elif key.data not in self._sessions:
+                # finished earlier in this same pass
+                continue
+            elif mask & selectors.EVENT_WRITE:
+                self._on_writable(key.data)
+            else:
+                self._on_readable(key.data)
+
+    def start(self):
+        self._logger.debug('start()')
+
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name=self.__class__.__name__)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._logger.debug('stop()')
+
+        if self._thread is None:
+            return
+
+        self._stopped.set()
+        self._wake_w.send(b'\x00')
+        self._thread.join()
+        self._thread = None
+
+        # sessions asked for after the thread's last pass never got opened
+        with self._lock:
+            actions, self._actions = self._actions, []
+
+        for action, session in actions:
+            if action == 'open':
+                session.future.cancel()
+
+        self._selector.close()
+        self._wake_r.close()
+        self._wake_w.close()
+
+    def learn(self, ip, timeout=None, port=None):
+        self._logger.debug('learn(%r); timeout=%s', ip, timeout)
+
+        if self._thread is None:
+            raise ValueError('cannot learn from {0}; learner is not started'.format(repr(ip)))
+
+        timeout = timeout if timeout is not None else self._timeout
+
+        session = _Session(
+            ip,
+            port if port is not None else self._port,
+            time.monotonic() + timeout if timeout is not None else None,
+        )
+
+        def cancel(future):
+            if future.cancelled():
+                self._post('cancel', session)
+
+        session.future.add_done_callback(cancel)
+        self._post('open', session)
+
+        return session.future
+
+    def learn_many(self, ips, timeout=None):
+        return {x: self.learn(x, timeout=timeout) for x in ips}
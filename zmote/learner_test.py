@@ -0,0 +1,158 @@
+import asyncio
+import socket
+import threading
+import time
+import unittest
+
+from hamcrest import assert_that, equal_to
+
+from zmote.async_connector import AsyncConnector, AsyncTCPTransport
+from zmote.ircode import IRCode
+from zmote.learner import Learner
+from zmote.simulator import Simulator, _LEARNED_CODE
+
+
+def _wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+class LearnerTest(unittest.TestCase):
+    def setUp(self):
+        self._simulator = Simulator()
+        self._simulator.start()
+        self.addCleanup(self._simulator.stop)
+
+        self._subject = Learner()
+        self._subject.start()
+        self.addCleanup(self._subject.stop)
+
+    def _learn(self, zmote, timeout=None):
+        return self._subject.learn(zmote.host, timeout=timeout, port=zmote.tcp_port)
+
+    def test_learn_many(self):
+        zmotes = self._simulator.add(3, learn_delay=0.1)
+
+        futures = [self._learn(x) for x in zmotes]
+
+        assert_that(
+            [x.result(5) for x in futures],
+            equal_to([IRCode.parse(_LEARNED_CODE)] * 3)
+        )
+
+    def test_cancel(self):
+        zmote = self._simulator.add(learn_delay=60)[0]
+
+        future = self._learn(zmote)
+        _wait_for(lambda: zmote.received)
+
+        assert_that(future.cancel(), equal_to(True))
+
+        _wait_for(lambda: len(zmote.received) == 2)
+
+        assert_that(
+            zmote.received,
+            equal_to(['get_IRL', 'stop_IRL'])
+        )
+
+    def test_timeout(self):
+        zmote = self._simulator.add(learn_delay=60)[0]
+
+        future = self._learn(zmote, timeout=0.1)
+
+        with self.assertRaises(TimeoutError):
+            future.result(5)
+
+        _wait_for(lambda: len(zmote.received) == 2)
+
+        assert_that(
+            zmote.received,
+            equal_to(['get_IRL', 'stop_IRL'])
+        )
+
+    def test_connection_refused(self):
+        zmote = self._simulator.add()[0]
+        port = zmote.tcp_port
+        self._simulator.stop()
+
+        with self.assertRaises(OSError):
+            self._subject.learn(zmote.host, port=port).result(5)
+
+    def test_garbled_reply(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+        self.addCleanup(server.close)
+
+        def reply():
+            sock, _ = server.accept()
+            with sock:
+                sock.recv(4096)
+                sock.sendall(b'\xff\xfe\r')
+                sock.recv(4096)
+
+        thread = threading.Thread(target=reply)
+        thread.start()
+        self.addCleanup(thread.join)
+
+        zmote = self._simulator.add(learn_delay=0.2)[0]
+
+        garbled = self._subject.learn('127.0.0.1', port=server.getsockname()[1])
+        future = self._learn(zmote)
+
+        with self.assertRaises(UnicodeDecodeError):
+            garbled.result(5)
+
+        # the other session is unaffected
+        assert_that(future.result(5), equal_to(IRCode.parse(_LEARNED_CODE)))
+
+    def test_stop_fails_queued(self):
+        # the selector thread has made its last pass by the time this session is asked for
+        self._subject._stopped.set()
+        self._subject._wake_w.send(b'\x00')
+        self._subject._thread.join()
+
+        future = self._subject.learn('127.0.0.1')
+
+        self._subject.stop()
+
+        assert_that(future.cancelled(), equal_to(True))
+
+
+class AsyncLearnTest(unittest.TestCase):
+    def setUp(self):
+        self._simulator = Simulator()
+        self._simulator.start()
+        self.addCleanup(self._simulator.stop)
+
+    def test_cancel(self):
+        zmote = self._simulator.add(learn_delay=60)[0]
+
+        async def run():
+            connector = AsyncConnector(AsyncTCPTransport(ip=zmote.host, port=zmote.tcp_port))
+            await connector.connect()
+
+            task = asyncio.ensure_future(connector.learn())
+            await asyncio.sleep(0.1)
+            task.cancel()
+
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+            output = await connector.send('1:1,0,36000,1,1,32,32')
+            await connector.disconnect()
+
+            return output
+
+        assert_that(
+            asyncio.run(run()),
+            equal_to('completeir,1:1,0')
+        )
+
+        assert_that(
+            zmote.received,
+            equal_to(['get_IRL', 'stop_IRL', 'sendir,1:1,0,36000,1,1,32,32'])
+        )
@@ -0,0 +1,154 @@
+import json
+import sqlite3
+import threading
+from logging import getLogger
+
+from zmote.ircode import IRCode
+
+_EXPORT_BATCH_SIZE = 500
+
+_SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS codes ('
+    'brand TEXT NOT NULL, model TEXT NOT NULL, button TEXT NOT NULL, code TEXT NOT NULL, '
+    'PRIMARY KEY (brand, model, button)) WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS devices ('
+    'name TEXT PRIMARY KEY NOT NULL, brand TEXT NOT NULL, model TEXT NOT NULL) WITHOUT ROWID',
+]
+
+
+class CodeLibrary(object):
+    def __init__(self, path=':memory:'):
+        self._path = path
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+
+        with self._lock, self._connection:
+            for statement in _SCHEMA:
+                self._connection.execute(statement)
+
+        self._logger = getLogger(self.__class__.__name__)
+        self._logger.debug('__init__(); path=%r', path)
+
+    def add(self, brand, model, button, code):
+        self._logger.debug('add(%r, %r, %r, %r)', brand, model, button, code)
+
+        if not isinstance(code, IRCode):
+            code = IRCode.parse(code)
+
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO codes (brand, model, button, code) VALUES (?, ?, ?, ?)',
+                (brand, model, button, code.sendir),
+            )
+
+    def remove(self, brand, model, button):
+        with self._lock, self._connection:
+            self._connection.execute(
+                'DELETE FROM codes WHERE brand = ? AND model = ? AND button = ?',
+                (brand, model, button),
+            )
+
+    def get(self, brand, model, button):
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT code FROM codes WHERE brand = ? AND model = ? AND button = ?',
+                (brand, model, button),
+            ).fetchone()
+
+        if row is None:
+            raise KeyError('no code for {0}'.format(repr((brand, model, button))))
+
+        return IRCode.parse(row[0])
+
+    def buttons(self, brand, model):
+        with self._lock:
+            return [x[0] for x in self._connection.execute(
+                'SELECT button FROM codes WHERE brand = ? AND model = ? ORDER BY button',
+                (brand, model),
+            )]
+
+    def alias(self, name, brand, model):
+        self._logger.debug('alias(%r, %r, %r)', name, brand, model)
+
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO devices (name, brand, model) VALUES (?, ?, ?)',
+                (name, brand, model),
+            )
+
+    def get_named(self, name, button):
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT codes.code FROM devices JOIN codes '
+                'ON codes.brand = devices.brand AND codes.model = devices.model '
+                'WHERE devices.name = ? AND codes.button = ?',
+                (name, button),
+            ).fetchone()
+
+        if row is None:
+            raise KeyError('no code for {0}'.format(repr((name, button))))
+
+        return IRCode.parse(row[0])
+
+    def import_codes(self, rows):
+        self._logger.debug('import_codes()')
+
+        def normalise():
+            for row in rows:
+                code = row['code']
+                if not isinstance(code, IRCode):
+                    code = IRCode.parse(code)
+
+                yield row['brand'], row['model'], row['button'], code.sendir
+
+        # one transaction for the lot; far faster than a commit per code
+        with self._lock, self._connection:
+            before = self._connection.total_changes
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO codes (brand, model, button, code) VALUES (?, ?, ?, ?)',
+                normalise(),
+            )
+
+            return self._connection.total_changes - before
+
+    def export_codes(self):
+        with self._lock:
+            cursor = self._connection.execute(
+                'SELECT brand, model, button, code FROM codes ORDER BY brand, model, button'
+            )
+
+        # stream in batches rather than pulling the whole library into memory
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(_EXPORT_BATCH_SIZE)
+
+            if not rows:
+                break
+
+            for brand, model, button, code in rows:
+                yield {
+                    'brand': brand,
+                    'model': model,
+                    'button': button,
+                    'code': code,
+                }
+
+    def load(self, path):
+        with open(path, 'r') as f:
+            return self.import_codes(json.loads(x) for x in f if x.strip())
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            for row in self.export_codes():
+                f.write(json.dumps(row, sort_keys=True) + '\n')
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM codes').fetchone()[0]
+
+    def close(self):
+        self._logger.debug('close()')
+
+        with self._lock:
+            self._connection.close()
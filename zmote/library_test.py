@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from hamcrest import assert_that, equal_to
+from mock import call, MagicMock
+
+from zmote.connector import Connector
+from zmote.connector_test import _TEST_SENDIR_REQUEST
+from zmote.ircode import IRCode
+from zmote.library import CodeLibrary
+
+_TEST_POWER = 'sendir,1:1,0,38000,1,1,342,171,21,64,21,1555'
+
+
+class CodeLibraryTest(unittest.TestCase):
+    def setUp(self):
+        self._subject = CodeLibrary()
+
+        self._subject.add('samsung', 'UE55', 'power', _TEST_POWER)
+        self._subject.add('samsung', 'UE55', 'volume_up', IRCode.parse(_TEST_SENDIR_REQUEST))
+        self._subject.alias('samsung_tv', 'samsung', 'UE55')
+
+    def tearDown(self):
+        self._subject.close()
+
+    def test_get(self):
+        assert_that(
+            self._subject.get('samsung', 'UE55', 'power'),
+            equal_to(IRCode.parse(_TEST_POWER))
+        )
+
+    def test_get_missing(self):
+        self.assertRaises(
+            KeyError,
+            self._subject.get, 'samsung', 'UE55', 'mute'
+        )
+
+    def test_get_named(self):
+        assert_that(
+            self._subject.get_named('samsung_tv', 'volume_up').sendir,
+            equal_to(_TEST_SENDIR_REQUEST)
+        )
+
+        self.assertRaises(
+            KeyError,
+            self._subject.get_named, 'lg_tv', 'power'
+        )
+
+    def test_buttons(self):
+        assert_that(
+            self._subject.buttons('samsung', 'UE55'),
+            equal_to(['power', 'volume_up'])
+        )
+
+    def test_remove(self):
+        self._subject.remove('samsung', 'UE55', 'power')
+
+        assert_that(len(self._subject), equal_to(1))
+
+    def test_import_export(self):
+        other = CodeLibrary()
+        self.addCleanup(other.close)
+
+        assert_that(
+            other.import_codes(self._subject.export_codes()),
+            equal_to(2)
+        )
+
+        assert_that(
+            list(other.export_codes()),
+            equal_to(list(self._subject.export_codes()))
+        )
+
+    def test_dump_load(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        self._subject.dump(os.path.join(directory, 'codes.jsonl'))
+
+        other = CodeLibrary(os.path.join(directory, 'codes.db'))
+        other.load(os.path.join(directory, 'codes.jsonl'))
+        other.close()
+
+        reopened = CodeLibrary(os.path.join(directory, 'codes.db'))
+        self.addCleanup(reopened.close)
+
+        assert_that(
+            reopened.get('samsung', 'UE55', 'power').sendir,
+            equal_to(_TEST_POWER)
+        )
+
+    def test_connector_send_named(self):
+        transport = MagicMock()
+
+        Connector(transport=transport, library=self._subject).send_named('samsung_tv', 'power')
+
+        assert_that(
+            transport.call.mock_calls,
+            equal_to([
+                call(IRCode.parse(_TEST_POWER), deadline=None),
+            ])
+        )
+
+    def test_connector_send_named_without_library(self):
+        self.assertRaises(
+            ValueError,
+            Connector(transport=MagicMock()).send_named, 'samsung_tv', 'power'
+        )
@@ -0,0 +1,225 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+from logging import getLogger
+
+from zmote.ircode import IRCode
+from zmote.scheduler import NORMAL, get_scheduler
+
+Step = namedtuple('Step', ['device', 'data', 'delay', 'repeat'], defaults=[0, 1])
+
+
+def _as_step(step, device=None):
+    if isinstance(step, dict):
+        step = dict(step)
+        step.setdefault('device', device)
+        step = Step(**step)
+    elif not isinstance(step, Step):
+        step = Step(*step)
+
+    if step.device is None:
+        step = step._replace(device=device)
+
+    if step.device is None:
+        raise ValueError('cannot run step {0}; no device given'.format(step))
+
+    if step.delay < 0 or step.repeat < 1:
+        raise ValueError('cannot run step {0}; delay must not be negative and repeat must be at least 1'.format(step))
+
+    # the same normalisation as Connector.send(), so a step takes a code in any form a send would
+    if not isinstance(step.data, IRCode):
+        step = step._replace(data='sendir,{0}'.format(step.data.split('sendir,')[-1]))
+
+    return step
+
+
+class Macro(object):
+    def __init__(self, engine, name, steps):
+        self._engine = engine
+        self._future = Future()
+
+        self.name = name
+        self.steps = steps
+
+        self._index = 0
+        self._futures = []
+        self._pending = set()
+
+    def cancel(self):
+        return self._engine.cancel(self)
+
+    def cancelled(self):
+        return self._future.cancelled()
+
+    def done(self):
+        return self._future.done()
+
+    def result(self, timeout=None):
+        return self._future.result(timeout)
+
+    def __repr__(self):
+        return '{0}({1})'.format(self.__class__.__name__, repr(self.name))
+
+
+class MacroEngine(object):
+    def __init__(self, scheduler=None, priority=NORMAL):
+        self._scheduler = scheduler if scheduler is not None else get_scheduler()
+        self._priority = priority
+
+        # reentrant as a done callback runs straight away when a send has already finished
+        self._condition = threading.Condition(threading.RLock())
+        self._heap = []
+        self._sequence = itertools.count()
+        self._macros_by_name = {}
+        self._closed = False
+
+        self._logger = getLogger(self.__class__.__name__)
+        self._logger.debug('__init__(); priority=%s', priority)
+
+        self._thread = threading.Thread(target=self._run, name=self.__class__.__name__)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _finish(self, macro, error=None, cancel=False):
+        if macro.done():
+            return
+
+        if self._macros_by_name.get(macro.name) is macro:
+            del self._macros_by_name[macro.name]
+
+        # codes still queued behind other traffic are withdrawn; one already on the wire can't be
+        if error is not None or cancel:
+            for future in list(macro._pending):
+                future.cancel()
+
+        self._logger.debug('_finish(%s); error=%r, cancel=%s', macro, error, cancel)
+
+        if cancel:
+            macro._future.cancel()
+        elif error is not None:
+            macro._future.set_exception(error)
+        else:
+            macro._future.set_result([x.result() for x in macro._futures])
+
+    def _sent(self, macro, future):
+        with self._condition:
+            macro._pending.discard(future)
+
+            if future.cancelled():
+                return
+
+            if future.exception() is not None:
+                self._finish(macro, error=future.exception())
+            elif macro._index >= len(macro.steps) and not macro._pending:
+                self._finish(macro)
+
+    def _step(self, macro, due_at):
+        step = macro.steps[macro._index]
+        macro._index += 1
+
+        self._logger.debug('_step(%s); step=%s, late=%.3f', macro, step, time.monotonic() - due_at)
+
+        # repeats go in back to back; the scheduler coalesces them into one send with a higher repeat count
+        for _ in range(0, step.repeat):
+            future = self._scheduler.submit(step.device, step.data, self._priority)
+            macro._futures.append(future)
+            macro._pending.add(future)
+            future.add_done_callback(lambda x: self._sent(macro, x))
+
+            if macro.done():
+                return
+
+        if macro._index < len(macro.steps):
+            # due times build on the plan rather than on when the last step ran, so a late step doesn't push the rest
+            self._push(macro, due_at + macro.steps[macro._index].delay)
+        elif not macro._pending:
+            self._finish(macro)
+
+    def _push(self, macro, due_at):
+        heapq.heappush(self._heap, (due_at, next(self._sequence), macro))
+        self._condition.notify_all()
+
+    def _run(self):
+        with self._condition:
+            while not self._closed:
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+
+                due_at, _, macro = self._heap[0]
+
+                remaining = due_at - time.monotonic()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+
+                heapq.heappop(self._heap)
+
+                if macro.done():
+                    continue
+
+                try:
+                    self._step(macro, due_at)
+                except Exception as e:
+                    self._logger.warning('_run(); macro=%s, exception=%r', macro, e)
+
+                    self._finish(macro, error=e)
+
+    def start(self, name, steps, device=None):
+        self._logger.debug('start(%r); steps=%s', name, steps)
+
+        macro = Macro(self, name, [_as_step(x, device) for x in steps])
+
+        with self._condition:
+            if self._closed:
+                raise ValueError('cannot start macro {0}; engine is closed'.format(repr(name)))
+
+            # starting a macro under a running one's name replaces it
+            previous = self._macros_by_name.get(name)
+            if previous is not None:
+                self._finish(previous, cancel=True)
+
+            self._macros_by_name[name] = macro
+
+            if macro.steps:
+                self._push(macro, time.monotonic() + macro.steps[0].delay)
+            else:
+                self._finish(macro)
+
+        return macro
+
+    def run(self, name, steps, device=None, timeout=None):
+        return self.start(name, steps, device).result(timeout)
+
+    def cancel(self, macro):
+        with self._condition:
+            if not isinstance(macro, Macro):
+                macro = self._macros_by_name.get(macro)
+
+            if macro is None or macro.done():
+                return False
+
+            self._finish(macro, cancel=True)
+
+            return True
+
+    def running(self):
+        with self._condition:
+            return sorted(self._macros_by_name)
+
+    def close(self):
+        self._logger.debug('close()')
+
+        with self._condition:
+            self._closed = True
+
+            for macro in list(self._macros_by_name.values()):
+                self._finish(macro, cancel=True)
+
+            self._heap = []
+            self._condition.notify_all()
+
+        self._thread.join()
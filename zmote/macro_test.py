@@ -0,0 +1,120 @@
+import threading
+import time
+import unittest
+from concurrent.futures import CancelledError
+
+from hamcrest import assert_that, equal_to, greater_than_or_equal_to, less_than
+from mock import MagicMock
+
+from zmote.ircode import IRCode
+from zmote.macro import MacroEngine, Step
+from zmote.scheduler import Scheduler
+
+_POWER = 'sendir,1:1,3,36000,1,1,32,64,32,64'
+_HDMI2 = 'sendir,1:1,4,36000,1,1,64,64,32,32'
+_VOLUME_UP = 'sendir,1:1,1,36000,1,1,32,32,64,32'
+
+
+class MacroEngineTest(unittest.TestCase):
+    def setUp(self):
+        self._sent = []
+        self._lock = threading.Lock()
+        self._error = None
+
+        def call(data, deadline=None):
+            if self._error is not None:
+                raise self._error
+
+            with self._lock:
+                self._sent.append((time.monotonic(), str(data)))
+
+            return 'completeir,1:1,{0}'.format(IRCode.parse(str(data)).id)
+
+        self._transport_class = MagicMock(side_effect=lambda ip: MagicMock(call=MagicMock(side_effect=call)))
+
+        scheduler = Scheduler(transport_class=self._transport_class, min_gap=0)
+        self.addCleanup(scheduler.close)
+
+        self._subject = MacroEngine(scheduler=scheduler)
+        self.addCleanup(self._subject.close)
+
+    def test_run(self):
+        before = time.monotonic()
+
+        outputs = self._subject.run('scene', [
+            Step('192.168.1.12', _POWER),
+            Step('192.168.1.12', _HDMI2, delay=0.1),
+            {'data': '1:1,1,36000,1,1,32,32,64,32', 'delay': 0.05, 'repeat': 3},
+        ], device='192.168.1.12', timeout=5)
+
+        assert_that(outputs, equal_to(['completeir,1:1,3', 'completeir,1:1,4'] + ['completeir,1:1,1'] * 3))
+
+        times = [x for x, _ in self._sent]
+
+        # repeats of one code are coalesced into a single send
+        assert_that(
+            [x for _, x in self._sent],
+            equal_to([_POWER, _HDMI2, str(IRCode.parse(_VOLUME_UP).with_repeat(3))])
+        )
+
+        assert_that(times[1] - before, greater_than_or_equal_to(0.1))
+        assert_that(times[2] - before, greater_than_or_equal_to(0.15))
+
+    def test_many_at_once(self):
+        threads = threading.active_count()
+        before = time.monotonic()
+
+        macros = [
+            self._subject.start('scene{0}'.format(i), [
+                ('192.168.1.{0}'.format(i), _POWER),
+                ('192.168.1.{0}'.format(i), _HDMI2, 0.1),
+            ])
+            for i in range(0, 20)
+        ]
+
+        # only the per-device scheduler queues add threads; the macros all share the engine's
+        assert_that(threading.active_count() - threads, less_than(21))
+
+        for macro in macros:
+            macro.result(5)
+
+        assert_that(time.monotonic() - before, less_than(0.5))
+
+    def test_cancel(self):
+        macro = self._subject.start('scene', [
+            ('192.168.1.12', _POWER),
+            ('192.168.1.12', _HDMI2, 5),
+        ])
+
+        time.sleep(0.05)
+
+        assert_that(macro.cancel(), equal_to(True))
+
+        with self.assertRaises(CancelledError):
+            macro.result(5)
+
+        assert_that([x for _, x in self._sent], equal_to([_POWER]))
+        assert_that(self._subject.running(), equal_to([]))
+
+    def test_replace(self):
+        first = self._subject.start('scene', [('192.168.1.12', _POWER, 5)])
+        second = self._subject.start('scene', [('192.168.1.12', _HDMI2)])
+
+        assert_that(second.result(5), equal_to(['completeir,1:1,4']))
+        assert_that(first.cancelled(), equal_to(True))
+        assert_that([x for _, x in self._sent], equal_to([_HDMI2]))
+
+    def test_failure(self):
+        self._error = ConnectionResetError()
+
+        macro = self._subject.start('scene', [
+            ('192.168.1.12', _POWER),
+            ('192.168.1.12', _HDMI2, 5),
+        ])
+
+        with self.assertRaises(ConnectionResetError):
+            macro.result(5)
+
+    def test_bad_step(self):
+        with self.assertRaises(ValueError):
+            self._subject.start('scene', [Step(None, _POWER)])
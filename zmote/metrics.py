@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+
+from zmote.ircode import IRCode
+
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def command_name(data):
+    if isinstance(data, IRCode):
+        return 'sendir'
+
+    return data.split(',', 1)[0].strip()
+
+
+def _size(data):
+    if isinstance(data, IRCode):
+        return len(data.http_bytes)
+
+    return len(data)
+
+
+def instrument(metrics, device, data, call):
+    before = time.monotonic()
+    try:
+        output = call(data)
+    except Exception as e:
+        metrics.record(device, command_name(data), time.monotonic() - before, bytes_sent=_size(data), error=e)
+        raise
+
+    metrics.record(
+        device, command_name(data), time.monotonic() - before, bytes_sent=_size(data), bytes_received=len(output)
+    )
+
+    return output
+
+
+async def instrument_async(metrics, device, data, call):
+    before = time.monotonic()
+    try:
+        output = await call(data)
+    except Exception as e:
+        metrics.record(device, command_name(data), time.monotonic() - before, bytes_sent=_size(data), error=e)
+        raise
+
+    metrics.record(
+        device, command_name(data), time.monotonic() - before, bytes_sent=_size(data), bytes_received=len(output)
+    )
+
+    return output
+
+
+class _Series(object):
+    __slots__ = ('count', 'errors', 'latency_sum', 'bucket_counts', 'bytes_sent', 'bytes_received')
+
+    def __init__(self, bucket_count):
+        self.count = 0
+        self.errors = 0
+        self.latency_sum = 0.0
+        self.bucket_counts = [0] * bucket_count
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics(object):
+    def __init__(self, buckets=_BUCKETS):
+        self._buckets = tuple(sorted(buckets))
+
+        self._lock = threading.Lock()
+        self._series_by_key = {}
+
+    def record(self, device, command, latency, bytes_sent=0, bytes_received=0, error=None):
+        key = (device, command)
+
+        with self._lock:
+            series = self._series_by_key.get(key)
+            if series is None:
+                series = self._series_by_key[key] = _Series(len(self._buckets))
+
+            series.count += 1
+            series.latency_sum += latency
+            series.bytes_sent += bytes_sent
+            series.bytes_received += bytes_received
+            if error is not None:
+                series.errors += 1
+
+            for i, bound in enumerate(self._buckets):
+                if latency <= bound:
+                    series.bucket_counts[i] += 1
+                    break
+
+    def reset(self):
+        with self._lock:
+            self._series_by_key = {}
+
+    def snapshot(self):
+        snapshot = {}
+
+        with self._lock:
+            for (device, command), series in self._series_by_key.items():
+                cumulative = 0
+                buckets = {}
+                for bound, count in zip(self._buckets, series.bucket_counts):
+                    cumulative += count
+                    buckets[bound] = cumulative
+
+                snapshot.setdefault(device, {})[command] = {
+                    'count': series.count,
+                    'errors': series.errors,
+                    'latency_sum': series.latency_sum,
+                    'latency_buckets': buckets,
+                    'bytes_sent': series.bytes_sent,
+                    'bytes_received': series.bytes_received,
+                }
+
+        return snapshot
+
+    def to_prometheus(self):
+        latency = [
+            '# HELP zmote_command_latency_seconds Latency of calls to zmote devices.',
+            '# TYPE zmote_command_latency_seconds histogram',
+        ]
+        errors = [
+            '# HELP zmote_command_errors_total Calls to zmote devices that raised.',
+            '# TYPE zmote_command_errors_total counter',
+        ]
+        sent = [
+            '# HELP zmote_bytes_sent_total Payload bytes sent to zmote devices.',
+            '# TYPE zmote_bytes_sent_total counter',
+        ]
+        received = [
+            '# HELP zmote_bytes_received_total Response bytes received from zmote devices.',
+            '# TYPE zmote_bytes_received_total counter',
+        ]
+
+        for device, commands in sorted(self.snapshot().items()):
+            for command, series in sorted(commands.items()):
+                labels = 'device="{0}",command="{1}"'.format(_escape(device), _escape(command))
+
+                for bound, count in sorted(series['latency_buckets'].items()):
+                    latency.append('zmote_command_latency_seconds_bucket{{{0},le="{1}"}} {2}'.format(
+                        labels, bound, count
+                    ))
+
+                latency.append('zmote_command_latency_seconds_bucket{{{0},le="+Inf"}} {1}'.format(
+                    labels, series['count']
+                ))
+                latency.append('zmote_command_latency_seconds_sum{{{0}}} {1}'.format(labels, series['latency_sum']))
+                latency.append('zmote_command_latency_seconds_count{{{0}}} {1}'.format(labels, series['count']))
+
+                errors.append('zmote_command_errors_total{{{0}}} {1}'.format(labels, series['errors']))
+                sent.append('zmote_bytes_sent_total{{{0}}} {1}'.format(labels, series['bytes_sent']))
+                received.append('zmote_bytes_received_total{{{0}}} {1}'.format(labels, series['bytes_received']))
+
+        return '\n'.join(latency + errors + sent + received) + '\n'
+
+    def write_prometheus(self, path):
+        # node_exporter's textfile collector may read at any moment, so write then rename
+        tmp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            f.write(self.to_prometheus())
+
+        os.replace(tmp_path, path)
@@ -0,0 +1,145 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from hamcrest import assert_that, equal_to
+from mock import MagicMock, call
+
+from zmote.connector import HTTPTransport, TCPTransport
+from zmote.connector_test import _TEST_SENDIR_REQUEST, _TEST_SENDIR_RESPONSE, _recv_into
+from zmote.ircode import IRCode
+from zmote.metrics import Metrics, command_name
+from zmote.pool import ConnectionPool
+
+
+class MetricsTest(unittest.TestCase):
+    def setUp(self):
+        self._subject = Metrics(
+            buckets=(0.1, 1),
+        )
+
+    def test_command_name(self):
+        assert_that(command_name('sendir,1:1,0,36000,1,1,32,32'), equal_to('sendir'))
+        assert_that(command_name('get_IRL'), equal_to('get_IRL'))
+        assert_that(command_name(IRCode.parse(_TEST_SENDIR_REQUEST)), equal_to('sendir'))
+
+    def test_snapshot(self):
+        self._subject.record('192.168.1.12', 'sendir', 0.05, bytes_sent=10, bytes_received=20)
+        self._subject.record('192.168.1.12', 'sendir', 0.5, bytes_sent=10, bytes_received=20)
+        self._subject.record('192.168.1.12', 'sendir', 5, bytes_sent=10, error=TimeoutError())
+
+        assert_that(
+            self._subject.snapshot(),
+            equal_to({
+                '192.168.1.12': {
+                    'sendir': {
+                        'count': 3,
+                        'errors': 1,
+                        'latency_sum': 5.55,
+                        'latency_buckets': {0.1: 1, 1: 2},
+                        'bytes_sent': 30,
+                        'bytes_received': 40,
+                    }
+                }
+            })
+        )
+
+    def test_reset(self):
+        self._subject.record('192.168.1.12', 'sendir', 0.05)
+        self._subject.reset()
+
+        assert_that(
+            self._subject.snapshot(),
+            equal_to({})
+        )
+
+    def test_to_prometheus(self):
+        self._subject.record('192.168.1.12', 'sendir', 0.5, bytes_sent=10, bytes_received=20)
+
+        lines = self._subject.to_prometheus().splitlines()
+
+        assert_that(
+            [x for x in lines if not x.startswith('#')],
+            equal_to([
+                'zmote_command_latency_seconds_bucket{device="192.168.1.12",command="sendir",le="0.1"} 0',
+                'zmote_command_latency_seconds_bucket{device="192.168.1.12",command="sendir",le="1"} 1',
+                'zmote_command_latency_seconds_bucket{device="192.168.1.12",command="sendir",le="+Inf"} 1',
+                'zmote_command_latency_seconds_sum{device="192.168.1.12",command="sendir"} 0.5',
+                'zmote_command_latency_seconds_count{device="192.168.1.12",command="sendir"} 1',
+                'zmote_command_errors_total{device="192.168.1.12",command="sendir"} 0',
+                'zmote_bytes_sent_total{device="192.168.1.12",command="sendir"} 10',
+                'zmote_bytes_received_total{device="192.168.1.12",command="sendir"} 20',
+            ])
+        )
+
+    def test_write_prometheus(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, 'zmote.prom')
+
+        self._subject.record('192.168.1.12', 'sendir', 0.5)
+        self._subject.write_prometheus(path)
+
+        with open(path, 'r') as f:
+            assert_that(f.read(), equal_to(self._subject.to_prometheus()))
+
+        assert_that(os.listdir(tmp_dir), equal_to(['zmote.prom']))
+
+
+class InstrumentedTransportTest(unittest.TestCase):
+    def setUp(self):
+        self._metrics = MagicMock()
+
+    def test_http_call(self):
+        subject = HTTPTransport(
+            ip='192.168.1.12',
+            cache=MagicMock(),
+            metrics=self._metrics,
+        )
+        subject._session = MagicMock()
+        subject._session.post.return_value.ok = True
+        subject._session.post.return_value.text = _TEST_SENDIR_RESPONSE
+
+        subject.call(_TEST_SENDIR_REQUEST)
+
+        device, command, _ = self._metrics.record.call_args[0]
+        assert_that(
+            (device, command, self._metrics.record.call_args[1]),
+            equal_to(('192.168.1.12', 'sendir', {
+                'bytes_sent': len(_TEST_SENDIR_REQUEST),
+                'bytes_received': len(_TEST_SENDIR_RESPONSE),
+            }))
+        )
+
+    def test_tcp_call_error(self):
+        subject = TCPTransport(
+            ip='192.168.1.12',
+            metrics=self._metrics,
+        )
+        self.addCleanup(subject._sock.close)
+        subject._sock = MagicMock()
+        subject._sock.recv_into.side_effect = _recv_into(b'')
+
+        with self.assertRaises(ConnectionResetError):
+            subject.call('get_IRL')
+
+        device, command, _ = self._metrics.record.call_args[0]
+        error = self._metrics.record.call_args[1]['error']
+        assert_that(
+            (device, command, type(error)),
+            equal_to(('192.168.1.12', 'get_IRL', ConnectionResetError))
+        )
+
+    def test_pool_passes_metrics(self):
+        transport_class = MagicMock()
+
+        pool = ConnectionPool(
+            metrics=self._metrics,
+        )
+        pool.acquire('192.168.1.12', transport_class)
+
+        assert_that(
+            transport_class.call_args_list,
+            equal_to([call(ip='192.168.1.12', metrics=self._metrics)])
+        )
@@ -0,0 +1,256 @@
+import threading
+import time
+from logging import getLogger
+
+from requests.exceptions import ConnectionError as RequestsConnectionError, Timeout as RequestsTimeout
+
+from zmote.connector import TCPTransport
+from zmote.deadline import Deadline
+
+_MAX_PER_DEVICE = 1
+_IDLE_TIMEOUT = 60
+_WAIT_TIMEOUT = 5
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def _is_broken_connection(exception):
+    # timeouts are not retried as the device may already have blasted the code
+    if isinstance(exception, RequestsTimeout):
+        return False
+
+    return isinstance(exception, (ConnectionError, RequestsConnectionError))
+
+
+class ConnectionPool(object):
+    def __init__(
+        self, max_per_device=_MAX_PER_DEVICE, idle_timeout=_IDLE_TIMEOUT, wait_timeout=_WAIT_TIMEOUT, metrics=None
+    ):
+        self._max_per_device = max_per_device
+        self._idle_timeout = idle_timeout
+        self._wait_timeout = wait_timeout
+        self._metrics = metrics
+
+        self._condition = threading.Condition()
+        self._idle_by_key = {}
+        self._open_count_by_key = {}
+        self._key_by_transport_id = {}
+
+        self._logger = getLogger(self.__class__.__name__)
+        self._logger.debug(
+            '__init__(); max_per_device=%s, idle_timeout=%s, wait_timeout=%s', max_per_device, idle_timeout, wait_timeout
+        )
+
+    def _close(self, transport):
+        try:
+            transport.disconnect()
+        except Exception as e:
+            self._logger.warning('_close(); transport=%s, exception=%r', transport, e)
+
+    def _forget(self, key, transport):
+        self._key_by_transport_id.pop(id(transport), None)
+        self._open_count_by_key[key] -= 1
+        if not self._open_count_by_key[key]:
+            del self._open_count_by_key[key]
+
+        self._condition.notify_all()
+
+    def _pop_expired(self):
+        expired = []
+
+        now = time.monotonic()
+        for key, idle in list(self._idle_by_key.items()):
+            while idle and now - idle[0][1] > self._idle_timeout:
+                transport, _ = idle.pop(0)
+                self._forget(key, transport)
+                expired.append(transport)
+
+            if not idle:
+                del self._idle_by_key[key]
+
+        return expired
+
+    def evict_idle(self):
+        with self._condition:
+            expired = self._pop_expired()
+
+        for transport in expired:
+            self._logger.debug('evict_idle(); transport=%s', transport)
+
+            self._close(transport)
+
+    def _pop_idle(self, key):
+        idle = self._idle_by_key.get(key)
+        if not idle:
+            return None
+
+        transport, _ = idle.pop()
+        if not idle:
+            del self._idle_by_key[key]
+
+        return transport
+
+    def idle_keys(self):
+        with self._condition:
+            return list(self._idle_by_key)
+
+    def acquire_idle(self, ip, transport_class=TCPTransport):
+        # never waits or connects; for housekeeping that should only touch connections nobody is using
+        with self._condition:
+            return self._pop_idle((transport_class, ip))
+
+    def acquire(self, ip, transport_class=TCPTransport, deadline=None, block=True):
+        key = (transport_class, ip)
+
+        self._logger.debug('acquire(%r, %s)', ip, transport_class)
+
+        self.evict_idle()
+
+        give_up_at = time.monotonic() + self._wait_timeout
+        if deadline is not None and deadline.remaining() is not None:
+            give_up_at = min(give_up_at, time.monotonic() + deadline.remaining())
+
+        with self._condition:
+            while True:
+                transport = self._pop_idle(key)
+                if transport is not None:
+                    return transport
+
+                if self._open_count_by_key.get(key, 0) < self._max_per_device:
+                    self._open_count_by_key[key] = self._open_count_by_key.get(key, 0) + 1
+                    break
+
+                # every connection is checked out; without blocking that is an answer, not a failure
+                if not block:
+                    return None
+
+                remaining = give_up_at - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError('timed out waiting for a connection to {0}'.format(repr(ip)))
+
+                self._condition.wait(remaining)
+
+        # connect outside of the lock so a slow device doesn't hold up the others
+        try:
+            kwargs = {}
+            if transport_class is TCPTransport:
+                kwargs['keep_alive'] = True
+            if self._metrics is not None:
+                kwargs['metrics'] = self._metrics
+
+            transport = transport_class(ip=ip, **kwargs)
+
+            transport.connect(deadline=deadline)
+        except Exception:
+            with self._condition:
+                self._open_count_by_key[key] -= 1
+                if not self._open_count_by_key[key]:
+                    del self._open_count_by_key[key]
+
+                self._condition.notify_all()
+
+            raise
+
+        with self._condition:
+            self._key_by_transport_id[id(transport)] = key
+
+        self._logger.debug('acquire(%r, %s); transport=%s', ip, transport_class, transport)
+
+        return transport
+
+    def release(self, transport, broken=False):
+        self._logger.debug('release(%s); broken=%s', transport, broken)
+
+        with self._condition:
+            key = self._key_by_transport_id.get(id(transport))
+            if key is None:
+                raise ValueError('transport {0} does not belong to this pool'.format(transport))
+
+            if broken:
+                self._forget(key, transport)
+            else:
+                self._idle_by_key.setdefault(key, []).append((transport, time.monotonic()))
+                self._condition.notify_all()
+
+        if broken:
+            self._close(transport)
+
+    def close(self):
+        self._logger.debug('close()')
+
+        with self._condition:
+            idle = [x for y in self._idle_by_key.values() for x, _ in y]
+            for key, transports in self._idle_by_key.items():
+                for transport, _ in transports:
+                    self._forget(key, transport)
+
+            self._idle_by_key = {}
+
+        for transport in idle:
+            self._close(transport)
+
+
+def get_pool():
+    global _default_pool
+
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = ConnectionPool()
+
+        return _default_pool
+
+
+class PooledTransport(object):
+    def __init__(self, ip, transport_class=TCPTransport, pool=None):
+        self._ip = ip
+        self._transport_class = transport_class
+        self._pool = pool if pool is not None else get_pool()
+
+        self._logger = getLogger(self.__class__.__name__)
+        self._logger.debug('__init__(); ip=%r, transport_class=%s', ip, transport_class)
+
+    def connect(self, deadline=None):
+        self._logger.debug('connect()')
+
+        if deadline is not None:
+            deadline = Deadline.of(deadline)
+
+        # make sure there is a warm connection up front so connection errors surface here as they would unpooled
+        self._pool.release(self._pool.acquire(self._ip, self._transport_class, deadline))
+
+    def call(self, data, deadline=None):
+        self._logger.debug('call(%r)', data)
+
+        # waiting for a pooled connection comes out of the same budget as the call itself
+        if deadline is not None:
+            deadline = Deadline.of(deadline)
+
+        transport = self._pool.acquire(self._ip, self._transport_class, deadline)
+        try:
+            output = transport.call(data, deadline=deadline)
+        except Exception as e:
+            self._pool.release(transport, broken=True)
+
+            if not _is_broken_connection(e):
+                raise
+
+            self._logger.warning('call(%r); reconnecting after exception=%r', data, e)
+
+            transport = self._pool.acquire(self._ip, self._transport_class, deadline)
+            try:
+                output = transport.call(data, deadline=deadline)
+            except Exception:
+                self._pool.release(transport, broken=True)
+                raise
+
+        self._pool.release(transport)
+
+        self._logger.debug('call(%r); output=%r', data, output)
+
+        return output
+
+    def disconnect(self):
+        self._logger.debug('disconnect()')
+
+        # the connection stays warm in the pool for the next Connector
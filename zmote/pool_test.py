@@ -0,0 +1,180 @@
+import threading
+import unittest
+
+from hamcrest import assert_that, equal_to, is_not, same_instance
+from mock import patch, call, MagicMock
+
+from zmote.connector_test import _TEST_SENDIR_REQUEST, _TEST_SENDIR_RESPONSE
+from zmote.pool import ConnectionPool, PooledTransport
+
+
+def _mock_transport_class():
+    return MagicMock(side_effect=lambda ip: MagicMock())
+
+
+class ConnectionPoolTest(unittest.TestCase):
+    def setUp(self):
+        self._transport_class = _mock_transport_class()
+
+        self._subject = ConnectionPool(
+            max_per_device=2,
+            idle_timeout=60,
+            wait_timeout=0.1,
+        )
+
+    def test_acquire_reuses_released(self):
+        transport = self._subject.acquire('192.168.1.12', self._transport_class)
+        transport.connect.assert_called_once_with(deadline=None)
+
+        self._subject.release(transport)
+
+        assert_that(
+            self._subject.acquire('192.168.1.12', self._transport_class),
+            same_instance(transport)
+        )
+
+        assert_that(
+            self._transport_class.call_args_list,
+            equal_to([call(ip='192.168.1.12')])
+        )
+
+    def test_acquire_per_device(self):
+        transport = self._subject.acquire('192.168.1.12', self._transport_class)
+        self._subject.release(transport)
+
+        assert_that(
+            self._subject.acquire('192.168.1.13', self._transport_class),
+            is_not(same_instance(transport))
+        )
+
+    def test_acquire_max_per_device(self):
+        self._subject.acquire('192.168.1.12', self._transport_class)
+        self._subject.acquire('192.168.1.12', self._transport_class)
+
+        self.assertRaises(
+            TimeoutError,
+            self._subject.acquire, '192.168.1.12', self._transport_class
+        )
+
+    def test_acquire_waits_for_release(self):
+        first = self._subject.acquire('192.168.1.12', self._transport_class)
+        self._subject.acquire('192.168.1.12', self._transport_class)
+
+        self._subject._wait_timeout = 5
+        timer = threading.Timer(0.05, self._subject.release, args=(first,))
+        timer.start()
+
+        assert_that(
+            self._subject.acquire('192.168.1.12', self._transport_class),
+            same_instance(first)
+        )
+
+        timer.join()
+
+    def test_release_broken(self):
+        transport = self._subject.acquire('192.168.1.12', self._transport_class)
+
+        self._subject.release(transport, broken=True)
+
+        transport.disconnect.assert_called_once_with()
+
+        assert_that(
+            self._subject.acquire('192.168.1.12', self._transport_class),
+            is_not(same_instance(transport))
+        )
+
+    @patch('zmote.pool.time')
+    def test_evict_idle(self, time):
+        time.monotonic.return_value = 1000
+
+        transport = self._subject.acquire('192.168.1.12', self._transport_class)
+        self._subject.release(transport)
+
+        time.monotonic.return_value = 1061
+
+        self._subject.evict_idle()
+
+        transport.disconnect.assert_called_once_with()
+
+        assert_that(
+            self._subject._open_count_by_key,
+            equal_to({})
+        )
+
+    def test_connect_failure_frees_slot(self):
+        self._transport_class.side_effect = None
+        self._transport_class.return_value.connect.side_effect = ConnectionRefusedError()
+
+        for _ in range(0, 3):
+            self.assertRaises(
+                ConnectionRefusedError,
+                self._subject.acquire, '192.168.1.12', self._transport_class
+            )
+
+    def test_close(self):
+        transport = self._subject.acquire('192.168.1.12', self._transport_class)
+        self._subject.release(transport)
+
+        self._subject.close()
+
+        transport.disconnect.assert_called_once_with()
+
+
+class PooledTransportTest(unittest.TestCase):
+    def setUp(self):
+        self._transport_class = _mock_transport_class()
+        self._pool = ConnectionPool()
+
+        self._subject = PooledTransport(
+            ip='192.168.1.12',
+            transport_class=self._transport_class,
+            pool=self._pool,
+        )
+
+    def test_call_shares_connection(self):
+        other = PooledTransport(
+            ip='192.168.1.12',
+            transport_class=self._transport_class,
+            pool=self._pool,
+        )
+
+        self._subject.connect()
+        self._subject.call(_TEST_SENDIR_REQUEST)
+        self._subject.disconnect()
+        other.connect()
+        other.call(_TEST_SENDIR_REQUEST)
+        other.disconnect()
+
+        assert_that(
+            self._transport_class.call_args_list,
+            equal_to([call(ip='192.168.1.12')])
+        )
+
+    def test_call_reconnects_broken(self):
+        broken = MagicMock()
+        broken.call.side_effect = BrokenPipeError()
+        working = MagicMock()
+        working.call.return_value = _TEST_SENDIR_RESPONSE.decode()
+        self._transport_class.side_effect = [broken, working]
+
+        assert_that(
+            self._subject.call(_TEST_SENDIR_REQUEST),
+            equal_to(_TEST_SENDIR_RESPONSE.decode())
+        )
+
+        broken.disconnect.assert_called_once_with()
+
+    def test_call_does_not_retry_timeout(self):
+        transport = MagicMock()
+        transport.call.side_effect = TimeoutError()
+        self._transport_class.side_effect = [transport]
+
+        self.assertRaises(
+            TimeoutError,
+            self._subject.call, _TEST_SENDIR_REQUEST
+        )
+
+        assert_that(
+            transport.call.mock_calls,
+            equal_to([call(_TEST_SENDIR_REQUEST, deadline=None)])
+        )
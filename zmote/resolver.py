@@ -0,0 +1,195 @@
+import threading
+import time
+from logging import getLogger
+
+from requests import RequestException, get
+
+from zmote.cache import DeviceCache, get_cache, set_cache
+from zmote.deadline import Deadline
+from zmote.discoverer import Discoverer
+
+_CHECK_TIMEOUT = 1
+_REVALIDATE_AFTER = 60
+
+_default_resolver = None
+_default_resolver_lock = threading.Lock()
+
+
+class Resolver(object):
+    def __init__(self, cache=None, path=None, check_timeout=_CHECK_TIMEOUT, revalidate_after=_REVALIDATE_AFTER,
+                 interfaces=None):
+        if cache is None and path is not None:
+            cache = DeviceCache(path=path)
+
+            # share the snapshot with discovery and the transports, so every beacon and lookup keeps it fresh
+            set_cache(cache)
+
+        self._own_cache = cache
+        self._check_timeout = check_timeout
+        self._revalidate_after = revalidate_after
+        self._interfaces = interfaces
+
+        self._lock = threading.Lock()
+        self._revalidating = set()
+
+        self._logger = getLogger(self.__class__.__name__)
+        self._logger.debug(
+            '__init__(); check_timeout=%s, revalidate_after=%s, interfaces=%s', check_timeout, revalidate_after,
+            interfaces,
+        )
+
+    @property
+    def _cache(self):
+        # without a cache of its own, follow whichever shared cache is installed now rather than at construction
+        return self._own_cache if self._own_cache is not None else get_cache()
+
+    def check(self, uuid, ip, deadline=None):
+        timeout = self._check_timeout
+        if deadline is not None:
+            remaining = Deadline.of(deadline).timeout('GET /uuid')
+            if remaining is not None:
+                timeout = min(timeout, remaining)
+
+        # one unicast round trip to the last-known address instead of waiting on a beacon
+        try:
+            response = get('http://{0}/uuid'.format(ip), timeout=timeout)
+        except RequestException as e:
+            self._logger.debug('check(%r, %r); exception=%r', uuid, ip, e)
+
+            return False
+
+        found = response.text.split(',')[-1].strip()
+
+        self._logger.debug('check(%r, %r); found=%r', uuid, ip, found)
+
+        return response.ok and found == uuid
+
+    def _revalidate(self, zmote):
+        uuid = zmote['UUID']
+
+        try:
+            if self.check(uuid, zmote['IP']):
+                self._cache.update(uuid, zmote['IP'], zmote['Config-URL'])
+            else:
+                self._cache.invalidate(uuid=uuid)
+        except Exception as e:
+            self._logger.warning('_revalidate(); uuid=%r, exception=%r', uuid, e)
+        finally:
+            with self._lock:
+                self._revalidating.discard(uuid)
+
+    def _revalidate_later(self, zmote):
+        with self._lock:
+            if zmote['UUID'] in self._revalidating:
+                return
+
+            self._revalidating.add(zmote['UUID'])
+
+        thread = threading.Thread(
+            target=self._revalidate, args=(zmote,), name='{0}({1})'.format(self.__class__.__name__, zmote['UUID']),
+        )
+        thread.daemon = True
+        thread.start()
+
+    def _discover(self, uuid, deadline):
+        self._logger.debug('_discover(%r)', uuid)
+
+        d = Discoverer(cache=self._cache, interfaces=self._interfaces)
+        d.bind()
+        try:
+            for zmote in d.discover_iter(deadline=deadline, probe=True, uuid_to_look_for=uuid):
+                if zmote['UUID'] == uuid:
+                    return zmote
+        finally:
+            d.close()
+
+        raise LookupError('could not discover IP for {0}'.format(repr(uuid)))
+
+    def resolve(self, uuid, deadline=None):
+        self._logger.debug('resolve(%r)', uuid)
+
+        if deadline is not None:
+            deadline = Deadline.of(deadline)
+
+        # answer from the snapshot straight away and check it is still right in the background
+        zmote = self._cache.get_by_uuid(uuid)
+        if zmote is not None:
+            if time.time() - zmote['Seen'] > self._revalidate_after:
+                self._revalidate_later(zmote)
+
+            return zmote
+
+        # an expired entry is still the best guess; confirm it before falling back to discovery
+        zmote = self._cache.last_known(uuid)
+        if zmote is not None:
+            if self.check(uuid, zmote['IP'], deadline):
+                self._cache.update(uuid, zmote['IP'], zmote['Config-URL'])
+
+                return self._cache.last_known(uuid)
+
+            self._cache.invalidate(uuid=uuid)
+
+        return self._discover(uuid, deadline)
+
+
+def get_resolver():
+    global _default_resolver
+
+    with _default_resolver_lock:
+        if _default_resolver is None:
+            _default_resolver = Resolver()
+
+        return _default_resolver
+
+
+def resolve(uuid, deadline=None):
+    return get_resolver().resolve(uuid, deadline)
+
+
+if __name__ == '__main__':
+    import argparse
+    import pprint
+
+    import logging
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(
+        logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    )
+
+    logger = logging.getLogger(Resolver.__name__)
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(handler)
+
+    parser = argparse.ArgumentParser(
+        description='Resolve zmote.io device UUIDs to IPs from a persisted snapshot, discovering only on a miss',
+    )
+
+    parser.add_argument(
+        'uuid',
+        type=str,
+        nargs='+',
+        help='UUID of a device to resolve',
+    )
+
+    parser.add_argument(
+        '-s',
+        '--snapshot',
+        type=str,
+        required=True,
+        help='path of the snapshot file to read and keep up to date',
+    )
+
+    parser.add_argument(
+        '-d',
+        '--deadline',
+        type=float,
+        default=None,
+        help='seconds to wait for each device overall (default 30 when discovering)',
+    )
+
+    args = parser.parse_args()
+
+    resolver = Resolver(path=args.snapshot)
+
+    pprint.pprint({x: resolver.resolve(x, deadline=args.deadline) for x in args.uuid})
@@ -0,0 +1,111 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from hamcrest import assert_that, equal_to
+from mock import MagicMock, patch
+
+from zmote.cache import DeviceCache, get_cache
+from zmote.resolver import Resolver
+from zmote.simulator import Simulator
+
+
+class ResolverTest(unittest.TestCase):
+    def setUp(self):
+        self._simulator = Simulator()
+        self._simulator.start()
+        self.addCleanup(self._simulator.stop)
+
+        self._zmote = self._simulator.add()[0]
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self._path = os.path.join(directory, 'zmotes.json')
+
+        self._cache = DeviceCache(path=self._path)
+
+        self._subject = Resolver(cache=self._cache, interfaces=[self._simulator.interface])
+
+    def _expire(self, uuid):
+        self._cache._zmotes_by_uuid[uuid]['Seen'] = 0
+
+    def test_miss_discovers_and_persists(self):
+        assert_that(
+            self._subject.resolve(self._zmote.uuid, deadline=5)['IP'],
+            equal_to(self._zmote.ip)
+        )
+
+        assert_that(
+            DeviceCache(path=self._path).get_by_uuid(self._zmote.uuid)['IP'],
+            equal_to(self._zmote.ip)
+        )
+
+    def test_fresh_answers_from_snapshot(self):
+        self._cache.update(self._zmote.uuid, self._zmote.ip)
+        self._subject._discover = MagicMock(side_effect=AssertionError('should not discover'))
+
+        assert_that(
+            self._subject.resolve(self._zmote.uuid)['IP'],
+            equal_to(self._zmote.ip)
+        )
+
+    def test_expired_revalidates_by_unicast(self):
+        self._cache.update(self._zmote.uuid, self._zmote.ip)
+        self._expire(self._zmote.uuid)
+        self._subject._discover = MagicMock(side_effect=AssertionError('should not discover'))
+
+        # a restarted process still finds the expired entry in the snapshot
+        subject = Resolver(cache=DeviceCache(path=self._path))
+        subject._discover = self._subject._discover
+
+        assert_that(
+            subject.resolve(self._zmote.uuid)['IP'],
+            equal_to(self._zmote.ip)
+        )
+
+    def test_stale_falls_back_to_discovery(self):
+        self._cache.update(self._zmote.uuid, '127.0.0.1:9')
+        self._expire(self._zmote.uuid)
+
+        assert_that(
+            self._subject.resolve(self._zmote.uuid, deadline=5)['IP'],
+            equal_to(self._zmote.ip)
+        )
+
+    def test_background_revalidation_invalidates(self):
+        other = self._simulator.add()[0]
+
+        # the snapshot says the device is where another one now answers
+        self._cache.update(self._zmote.uuid, other.ip)
+        subject = Resolver(cache=self._cache, revalidate_after=0)
+
+        assert_that(
+            subject.resolve(self._zmote.uuid)['IP'],
+            equal_to(other.ip)
+        )
+
+        for _ in range(0, 50):
+            if self._cache.last_known(self._zmote.uuid) is None:
+                break
+
+            time.sleep(0.02)
+
+        assert_that(
+            self._cache.last_known(self._zmote.uuid),
+            equal_to(None)
+        )
+
+    @patch('zmote.cache._default_cache', None)
+    def test_path_shares_snapshot(self):
+        subject = Resolver(path=self._path)
+
+        # anything filling the shared cache, such as discovery or an HTTP transport, lands in the snapshot
+        get_cache().update('CI00ffffff', '192.168.1.99')
+
+        assert_that(DeviceCache(path=self._path).get_by_uuid('CI00ffffff')['IP'], equal_to('192.168.1.99'))
+
+        # and a resolver without a cache of its own, like get_resolver()'s, answers from it
+        assert_that(Resolver().resolve('CI00ffffff')['IP'], equal_to('192.168.1.99'))
+        assert_that(subject.resolve('CI00ffffff')['IP'], equal_to('192.168.1.99'))
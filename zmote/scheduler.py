@@ -0,0 +1,311 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from logging import getLogger
+
+from zmote.connector import _is_sendir
+from zmote.deadline import Deadline
+from zmote.ircode import IRCode
+from zmote.pool import PooledTransport
+
+HIGH = 0
+NORMAL = 10
+LOW = 20
+
+_MIN_GAP = 0.05
+_MAX_REPEAT = 50
+
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+
+def _as_code(data):
+    if isinstance(data, IRCode):
+        return data
+
+    if not _is_sendir(data):
+        return None
+
+    try:
+        return IRCode.parse(data)
+    except ValueError:
+        return None
+
+
+class _Entry(object):
+    __slots__ = ('priority', 'data', 'code', 'deadline', 'future')
+
+    def __init__(self, priority, data, deadline=None):
+        self.priority = priority
+        self.data = data
+        self.code = _as_code(data)
+        self.deadline = deadline
+        self.future = Future()
+
+
+class _DeviceQueue(object):
+    def __init__(self, ip, transport_class, min_gap, max_repeat):
+        self._ip = ip
+        self._transport_class = transport_class
+        self._min_gap = min_gap
+        self._max_repeat = max_repeat
+
+        self._condition = threading.Condition()
+        self._heap = []
+        self._sequence = itertools.count()
+        self._closed = False
+        self._next_at = 0
+
+        self._transport_lock = threading.Lock()
+        self._transport = None
+
+        self._logger = getLogger(self.__class__.__name__)
+
+        self._thread = threading.Thread(target=self._run, name='{0}({1})'.format(self.__class__.__name__, ip))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __len__(self):
+        with self._condition:
+            return len(self._heap)
+
+    def connect(self, deadline=None):
+        with self._transport_lock:
+            if self._transport is None:
+                transport = self._transport_class(ip=self._ip)
+                transport.connect(deadline=deadline)
+                self._transport = transport
+
+    def _disconnect(self):
+        with self._transport_lock:
+            transport, self._transport = self._transport, None
+
+        if transport is None:
+            return
+
+        try:
+            transport.disconnect()
+        except Exception as e:
+            self._logger.warning('_disconnect(); ip=%r, exception=%r', self._ip, e)
+
+    def submit(self, data, priority, deadline=None):
+        entry = _Entry(priority, data, deadline)
+
+        with self._condition:
+            if self._closed:
+                raise ValueError('cannot submit {0} to {1}; scheduler is closed'.format(repr(data), repr(self._ip)))
+
+            heapq.heappush(self._heap, (priority, next(self._sequence), entry))
+            self._condition.notify_all()
+
+        return entry.future
+
+    def _pop_batch(self):
+        entries = []
+        repeat = 0
+
+        while self._heap:
+            _, _, entry = self._heap[0]
+
+            if entry.future.cancelled():
+                heapq.heappop(self._heap)
+                continue
+
+            # only merge identical codes that are next in line at the same priority
+            if entries:
+                first = entries[0]
+                if (
+                    first.code is None or entry.code is None or
+                    entry.priority != first.priority or
+                    not first.code.same_signal(entry.code) or
+                    repeat + entry.code.repeat > self._max_repeat
+                ):
+                    break
+
+            heapq.heappop(self._heap)
+            if not entry.future.set_running_or_notify_cancel():
+                continue
+
+            # whoever queued this has given up on it; sending it late would only delay the rest of the queue
+            if entry.deadline is not None and entry.deadline.expired:
+                entry.future.set_exception(TimeoutError('deadline passed for {0} while queued for {1}'.format(
+                    repr(entry.data), repr(self._ip),
+                )))
+                continue
+
+            entries.append(entry)
+            repeat += entry.code.repeat if entry.code is not None else 0
+
+        return entries, repeat
+
+    def _call(self, entries, repeat):
+        if len(entries) == 1:
+            data = entries[0].data
+        else:
+            data = entries[0].code.with_repeat(repeat)
+
+        self._logger.debug('_call(%r); ip=%r, merged=%s', data, self._ip, len(entries))
+
+        # merged entries go out once, on the budget of the oldest
+        deadline = entries[0].deadline
+
+        try:
+            self.connect(deadline)
+            output = self._transport.call(data, deadline=deadline)
+        except Exception as e:
+            # start afresh on the next command rather than reuse a transport in an unknown state
+            self._disconnect()
+
+            for entry in entries:
+                entry.future.set_exception(e)
+
+            return
+
+        for entry in entries:
+            entry.future.set_result(output)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._heap and not self._closed:
+                    self._condition.wait()
+
+                if self._closed:
+                    break
+
+                # wait out the gap under the condition so anything more urgent can still jump the queue
+                remaining = self._next_at - time.monotonic()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+
+                entries, repeat = self._pop_batch()
+
+            if not entries:
+                continue
+
+            self._call(entries, repeat)
+
+            self._next_at = time.monotonic() + self._min_gap
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            heap, self._heap = self._heap, []
+            self._condition.notify_all()
+
+        self._thread.join()
+
+        for _, _, entry in heap:
+            entry.future.cancel()
+
+        self._disconnect()
+
+
+class Scheduler(object):
+    def __init__(self, transport_class=PooledTransport, min_gap=_MIN_GAP, max_repeat=_MAX_REPEAT):
+        self._transport_class = transport_class
+        self._min_gap = min_gap
+        self._max_repeat = max_repeat
+
+        self._lock = threading.Lock()
+        self._queues_by_ip = {}
+
+        self._logger = getLogger(self.__class__.__name__)
+        self._logger.debug(
+            '__init__(); transport_class=%s, min_gap=%s, max_repeat=%s', transport_class, min_gap, max_repeat
+        )
+
+    def _queue(self, ip):
+        with self._lock:
+            queue = self._queues_by_ip.get(ip)
+            if queue is None:
+                queue = self._queues_by_ip[ip] = _DeviceQueue(
+                    ip, self._transport_class, self._min_gap, self._max_repeat
+                )
+
+            return queue
+
+    def connect(self, ip, deadline=None):
+        self._logger.debug('connect(%r)', ip)
+
+        self._queue(ip).connect(deadline)
+
+    def submit(self, ip, data, priority=NORMAL, deadline=None):
+        self._logger.debug('submit(%r, %r); priority=%s', ip, data, priority)
+
+        if deadline is not None:
+            deadline = Deadline.of(deadline)
+
+        return self._queue(ip).submit(data, priority, deadline)
+
+    def send(self, ip, data, priority=NORMAL, timeout=None, deadline=None):
+        if deadline is not None:
+            deadline = Deadline.of(deadline)
+
+            remaining = deadline.remaining()
+            if remaining is not None:
+                timeout = remaining if timeout is None else min(timeout, remaining)
+
+        future = self.submit(ip, data, priority, deadline)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    def pending(self, ip):
+        with self._lock:
+            queue = self._queues_by_ip.get(ip)
+
+        return len(queue) if queue is not None else 0
+
+    def close(self):
+        self._logger.debug('close()')
+
+        with self._lock:
+            queues, self._queues_by_ip = list(self._queues_by_ip.values()), {}
+
+        for queue in queues:
+            queue.close()
+
+
+def get_scheduler():
+    global _default_scheduler
+
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = Scheduler()
+
+        return _default_scheduler
+
+
+class ScheduledTransport(object):
+    def __init__(self, ip, scheduler=None, priority=NORMAL):
+        self._ip = ip
+        self._scheduler = scheduler if scheduler is not None else get_scheduler()
+        self._priority = priority
+
+        self._logger = getLogger(self.__class__.__name__)
+        self._logger.debug('__init__(); ip=%r, priority=%s', ip, priority)
+
+    def connect(self, deadline=None):
+        self._logger.debug('connect()')
+
+        self._scheduler.connect(self._ip, deadline)
+
+    def call(self, data, deadline=None):
+        self._logger.debug('call(%r)', data)
+
+        output = self._scheduler.send(self._ip, data, self._priority, deadline=deadline)
+
+        self._logger.debug('call(%r); output=%r', data, output)
+
+        return output
+
+    def disconnect(self):
+        self._logger.debug('disconnect()')
+
+        # the device's queue and connection are shared with every other ScheduledTransport for it
@@ -0,0 +1,167 @@
+import threading
+import time
+import unittest
+
+from hamcrest import assert_that, equal_to, greater_than_or_equal_to
+from mock import MagicMock
+
+from zmote.connector import Connector
+from zmote.ircode import IRCode
+from zmote.scheduler import HIGH, LOW, NORMAL, ScheduledTransport, Scheduler
+
+_VOLUME_UP = 'sendir,1:1,1,36000,1,1,32,32,64,32'
+_VOLUME_DOWN = 'sendir,1:1,2,36000,1,1,64,32,32,64'
+_POWER = 'sendir,1:1,3,36000,1,1,32,64,32,64'
+
+
+class SchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self._calls = []
+        self._blocked = threading.Event()
+        self._unblock = threading.Event()
+
+        def call(data, deadline=None):
+            self._calls.append(data)
+            if len(self._calls) == 1:
+                self._blocked.set()
+                self._unblock.wait(5)
+
+            return 'completeir,1:1,{0}'.format(IRCode.parse(str(data)).id)
+
+        self._transport = MagicMock()
+        self._transport.call.side_effect = call
+        self._transport_class = MagicMock(return_value=self._transport)
+
+        self._subject = Scheduler(
+            transport_class=self._transport_class,
+            min_gap=0,
+            max_repeat=5,
+        )
+        self.addCleanup(self._subject.close)
+
+    def _submit_while_busy(self, *submissions):
+        first = self._subject.submit('192.168.1.12', _POWER)
+        self._blocked.wait(5)
+
+        futures = [self._subject.submit('192.168.1.12', data, priority) for data, priority in submissions]
+        self._unblock.set()
+
+        return [first.result(5)] + [x.result(5) for x in futures]
+
+    def test_send(self):
+        self._unblock.set()
+
+        assert_that(
+            self._subject.send('192.168.1.12', _VOLUME_UP, timeout=5),
+            equal_to('completeir,1:1,1')
+        )
+
+        self._transport_class.assert_called_once_with(ip='192.168.1.12')
+        self._transport.connect.assert_called_once_with(deadline=None)
+
+    def test_priority(self):
+        self._submit_while_busy((_VOLUME_UP, LOW), (_VOLUME_DOWN, NORMAL), (_POWER, HIGH))
+
+        assert_that(
+            self._calls,
+            equal_to([_POWER, _POWER, _VOLUME_DOWN, _VOLUME_UP])
+        )
+
+    def test_coalesce(self):
+        outputs = self._submit_while_busy(*[(_VOLUME_UP, NORMAL)] * 7 + [(_VOLUME_DOWN, NORMAL)])
+
+        assert_that(
+            [str(x) for x in self._calls],
+            equal_to([
+                _POWER,
+                str(IRCode.parse(_VOLUME_UP).with_repeat(5)),
+                str(IRCode.parse(_VOLUME_UP).with_repeat(2)),
+                _VOLUME_DOWN,
+            ])
+        )
+
+        assert_that(
+            outputs,
+            equal_to(['completeir,1:1,3'] + ['completeir,1:1,1'] * 7 + ['completeir,1:1,2'])
+        )
+
+    def test_cancel(self):
+        first = self._subject.submit('192.168.1.12', _POWER)
+        self._blocked.wait(5)
+
+        cancelled = self._subject.submit('192.168.1.12', _VOLUME_UP)
+        cancelled.cancel()
+        self._unblock.set()
+
+        first.result(5)
+        self._subject.send('192.168.1.12', _VOLUME_DOWN, timeout=5)
+
+        assert_that(
+            self._calls,
+            equal_to([_POWER, _VOLUME_DOWN])
+        )
+
+    def test_expired_not_sent(self):
+        first = self._subject.submit('192.168.1.12', _POWER)
+        self._blocked.wait(5)
+
+        expired = self._subject.submit('192.168.1.12', _VOLUME_UP, deadline=0.01)
+        time.sleep(0.05)
+        self._unblock.set()
+
+        first.result(5)
+        with self.assertRaises(TimeoutError):
+            expired.result(5)
+
+        assert_that(
+            self._calls,
+            equal_to([_POWER])
+        )
+
+    def test_error_reconnects(self):
+        self._unblock.set()
+        self._subject.send('192.168.1.12', _POWER, timeout=5)
+
+        self._transport.call.side_effect = ConnectionResetError()
+
+        with self.assertRaises(ConnectionResetError):
+            self._subject.send('192.168.1.12', _POWER, timeout=5)
+
+        self._transport.disconnect.assert_called_once_with()
+
+        assert_that(
+            self._transport_class.call_count,
+            equal_to(1)
+        )
+
+    def test_min_gap(self):
+        self._unblock.set()
+
+        subject = Scheduler(
+            transport_class=self._transport_class,
+            min_gap=0.05,
+        )
+        self.addCleanup(subject.close)
+
+        before = time.monotonic()
+        subject.send('192.168.1.12', _VOLUME_UP, timeout=5)
+        subject.send('192.168.1.12', _VOLUME_DOWN, timeout=5)
+
+        assert_that(
+            time.monotonic() - before,
+            greater_than_or_equal_to(0.05)
+        )
+
+    def test_scheduled_transport(self):
+        self._unblock.set()
+
+        connector = Connector(ScheduledTransport(ip='192.168.1.12', scheduler=self._subject, priority=HIGH))
+        connector.connect()
+
+        assert_that(
+            connector.send(_VOLUME_UP),
+            equal_to('completeir,1:1,1')
+        )
+
+        connector.disconnect()
+        self._transport.disconnect.assert_not_called()
@@ -0,0 +1,352 @@
+import asyncio
+import random
+import socket
+import struct
+import threading
+from logging import getLogger
+
+from zmote.connector import _LEARNER_DISABLED, _LEARNER_ENABLED, _response_key
+from zmote.discoverer import _GROUP, _RECEIVE_PORT, _SEND_PORT
+
+_HOST = '127.0.0.1'
+_INTERFACE = '127.0.0.1'
+
+_LEARNED_CODE = 'sendir,1:1,0,36000,1,1,32,32,64,32,32,64,32,3264'
+_VERSION = '2.1.4'
+_UNKNOWN_COMMAND = 'ERR_01'
+
+_BEACON = 'AMXB<-UUID={0}><-Type=ZMT2><-Make=zmote.io><-Model=ZV-2><-Revision={1}><-Config-URL=http://{2}>'
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found'}
+
+
+def _respond(line):
+    command = line.split(',', 1)[0]
+
+    if command == 'sendir':
+        key = _response_key(line)
+        if key is None:
+            return _UNKNOWN_COMMAND
+
+        return 'completeir,{0},{1}'.format(*key)
+    elif command == 'getversion':
+        return _VERSION
+    elif command == 'stop_IRL':
+        return _LEARNER_DISABLED
+
+    return _UNKNOWN_COMMAND
+
+
+class SimulatedZmote(object):
+    def __init__(self, uuid, host=_HOST, latency=0, jitter=0, learned_code=_LEARNED_CODE, learn_delay=0):
+        self._host = host
+        self._latency = latency
+        self._jitter = jitter
+        self._learn_delay = learn_delay
+
+        self.uuid = uuid
+        self.learned_code = learned_code
+        self.received = []
+
+        self._http_server = None
+        self._tcp_server = None
+        self._writers_by_handler = {}
+
+        self._logger = getLogger(self.__class__.__name__)
+        self._logger.debug('__init__(); uuid=%r, latency=%s, jitter=%s', uuid, latency, jitter)
+
+    @property
+    def host(self):
+        return self._host
+
+    @property
+    def http_port(self):
+        return self._http_server.sockets[0].getsockname()[1]
+
+    @property
+    def tcp_port(self):
+        return self._tcp_server.sockets[0].getsockname()[1]
+
+    @property
+    def ip(self):
+        # the HTTP transports take host:port wherever they take an IP
+        return '{0}:{1}'.format(self._host, self.http_port)
+
+    @property
+    def beacon(self):
+        return _BEACON.format(self.uuid, _VERSION, self.ip).encode('ascii')
+
+    def delay(self):
+        return max(0, self._latency + random.uniform(-self._jitter, self._jitter))
+
+    async def start(self):
+        self._http_server = await asyncio.start_server(self._serve_http, self._host, 0)
+        self._tcp_server = await asyncio.start_server(self._serve_tcp, self._host, 0)
+
+        self._logger.debug('start(); ip=%r, tcp_port=%s', self.ip, self.tcp_port)
+
+    async def stop(self):
+        for server in [self._http_server, self._tcp_server]:
+            if server is not None:
+                server.close()
+                await server.wait_closed()
+
+        # closing a server leaves its accepted connections open; closing those wakes their handlers with EOF
+        handlers = list(self._writers_by_handler.items())
+        for _, writer in handlers:
+            writer.close()
+
+        await asyncio.gather(*[x for x, _ in handlers], return_exceptions=True)
+
+    async def drop(self):
+        # what a blaster does to idle sessions after a while; the servers keep accepting new ones
+        for writer in list(self._writers_by_handler.values()):
+            writer.close()
+
+    async def _learn(self):
+        await asyncio.sleep(self._learn_delay)
+
+        return self.learned_code
+
+    async def _serve_tcp(self, reader, writer):
+        learning = None
+
+        def write_learned(task):
+            if not task.cancelled():
+                writer.write('{0}\r'.format(task.result()).encode())
+
+        handler = asyncio.current_task()
+        self._writers_by_handler[handler] = writer
+        try:
+            while True:
+                try:
+                    line = (await reader.readuntil(b'\r')).strip(b'\r\n').decode()
+                except asyncio.IncompleteReadError:
+                    break
+
+                if not line:
+                    continue
+
+                self.received.append(line)
+
+                await asyncio.sleep(self.delay())
+
+                if line == 'get_IRL':
+                    writer.write('{0}\r'.format(_LEARNER_ENABLED).encode())
+
+                    # the code arrives whenever a remote is pointed at the device, so keep reading meanwhile
+                    if learning is None or learning.done():
+                        learning = asyncio.ensure_future(self._learn())
+                        learning.add_done_callback(write_learned)
+                else:
+                    if line == 'stop_IRL' and learning is not None:
+                        learning.cancel()
+
+                    writer.write('{0}\r'.format(_respond(line)).encode())
+
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            if learning is not None:
+                learning.cancel()
+
+            self._writers_by_handler.pop(handler, None)
+            writer.close()
+
+    async def _http_response(self, method, path, body):
+        if method == 'GET' and path == '/uuid':
+            return 200, 'uuid,{0}'.format(self.uuid)
+
+        if method != 'POST' or not path.startswith('/v2/'):
+            return 404, ''
+
+        if path[len('/v2/'):] != self.uuid:
+            return 404, ''
+
+        line = body.strip()
+        self.received.append(line)
+
+        await asyncio.sleep(self.delay())
+
+        if line == 'get_IRL':
+            return 200, '{0}\r{1}'.format(_LEARNER_ENABLED, await self._learn())
+
+        return 200, _respond(line)
+
+    async def _serve_http(self, reader, writer):
+        handler = asyncio.current_task()
+        self._writers_by_handler[handler] = writer
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                try:
+                    method, path, _ = request_line.decode('iso-8859-1').split(' ', 2)
+                except ValueError:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+
+                    key, _, value = line.decode('iso-8859-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                status, text = await self._http_response(method, path, body.decode())
+                data = text.encode()
+
+                writer.write('HTTP/1.1 {0} {1}\r\nContent-Type: text/plain\r\nContent-Length: {2}\r\n\r\n'.format(
+                    status, _REASONS[status], len(data),
+                ).encode() + data)
+                await writer.drain()
+
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers_by_handler.pop(handler, None)
+            writer.close()
+
+
+class _ProbeProtocol(asyncio.DatagramProtocol):
+    def __init__(self, simulator):
+        self._simulator = simulator
+
+    def datagram_received(self, data, addr):
+        if data.strip() == b'SENDAMXB':
+            self._simulator.answer_probe()
+
+
+class Simulator(object):
+    def __init__(self, interface=_INTERFACE):
+        self._interface = interface
+
+        self._loop = None
+        self._thread = None
+        self._zmotes = []
+
+        self._beacon_sock = None
+        self._probe_transport = None
+
+        self._logger = getLogger(self.__class__.__name__)
+        self._logger.debug('__init__(); interface=%r', interface)
+
+    def _run(self, started):
+        asyncio.set_event_loop(self._loop)
+        self._loop.call_soon(started.set)
+        self._loop.run_forever()
+
+    def _submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def _probe_sock(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(
+            socket.IPPROTO_IP,
+            socket.IP_ADD_MEMBERSHIP,
+            struct.pack('4s4s', socket.inet_aton(_GROUP), socket.inet_aton(self._interface)),
+        )
+        sock.bind((_GROUP, _SEND_PORT))
+        sock.setblocking(False)
+
+        return sock
+
+    async def _listen(self):
+        self._probe_transport, _ = await self._loop.create_datagram_endpoint(
+            lambda: _ProbeProtocol(self),
+            sock=self._probe_sock(),
+        )
+
+    def start(self):
+        self._logger.debug('start()')
+
+        self._beacon_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self._beacon_sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(self._interface))
+        self._beacon_sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+        self._beacon_sock.setblocking(False)
+
+        self._loop = asyncio.new_event_loop()
+
+        started = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(started,), name=self.__class__.__name__)
+        self._thread.daemon = True
+        self._thread.start()
+        started.wait()
+
+        self._submit(self._listen())
+
+    def stop(self):
+        self._logger.debug('stop()')
+
+        if self._thread is None:
+            return
+
+        async def stop():
+            self._probe_transport.close()
+
+            for zmote in self._zmotes:
+                await zmote.stop()
+
+        self._submit(stop())
+
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._thread = None
+
+        self._loop.close()
+        self._beacon_sock.close()
+        self._zmotes = []
+
+    def add(self, count=1, **kwargs):
+        self._logger.debug('add(%s)', count)
+
+        zmotes = [
+            SimulatedZmote(uuid='CI{0:08x}'.format(len(self._zmotes) + i), **kwargs)
+            for i in range(0, count)
+        ]
+
+        async def start():
+            for zmote in zmotes:
+                await zmote.start()
+
+        self._submit(start())
+        self._zmotes.extend(zmotes)
+
+        return zmotes
+
+    def drop(self, zmote):
+        self._logger.debug('drop(%r)', zmote.uuid)
+
+        self._submit(zmote.drop())
+
+    @property
+    def interface(self):
+        return self._interface
+
+    @property
+    def zmotes(self):
+        return list(self._zmotes)
+
+    def _send_beacon(self, zmote):
+        try:
+            self._beacon_sock.sendto(zmote.beacon, (_GROUP, _RECEIVE_PORT))
+        except OSError as e:
+            self._logger.warning('_send_beacon(); uuid=%r, exception=%r', zmote.uuid, e)
+
+    def answer_probe(self):
+        # each device answers after its own latency, as a real segment would trickle them in
+        for zmote in self._zmotes:
+            self._loop.call_later(zmote.delay(), self._send_beacon, zmote)
+
+    def beacon(self):
+        for zmote in self._zmotes:
+            self._loop.call_soon_threadsafe(self._send_beacon, zmote)
@@ -0,0 +1,98 @@
+import time
+import unittest
+
+from hamcrest import assert_that, equal_to, less_than
+
+from zmote.cache import DeviceCache
+from zmote.connector import Connector, HTTPTransport, TCPTransport
+from zmote.connector_test import _TEST_SENDIR_REQUEST
+from zmote.discoverer import active_discover_zmotes, sweep_discover_zmotes, sweep_iter
+from zmote.simulator import Simulator, _LEARNED_CODE
+
+
+class SimulatorTest(unittest.TestCase):
+    def setUp(self):
+        self._subject = Simulator()
+        self._subject.start()
+        self.addCleanup(self._subject.stop)
+
+        self._zmote = self._subject.add()[0]
+
+    def test_http(self):
+        connector = Connector(HTTPTransport(ip=self._zmote.ip, cache=DeviceCache()))
+        connector.connect()
+
+        assert_that(
+            connector.send(_TEST_SENDIR_REQUEST),
+            equal_to('completeir,1:1,0')
+        )
+
+        assert_that(
+            connector.learn(),
+            equal_to(_LEARNED_CODE.split('sendir,')[-1])
+        )
+
+        assert_that(
+            self._zmote.received,
+            equal_to([_TEST_SENDIR_REQUEST, 'get_IRL'])
+        )
+
+    def test_tcp(self):
+        transport = TCPTransport(ip=self._zmote.host, port=self._zmote.tcp_port)
+        transport.connect()
+        self.addCleanup(transport.disconnect)
+
+        assert_that(
+            transport.call_many(['sendir,1:1,1,36000,1,1,32,32', 'sendir,1:1,2,36000,1,1,32,32', 'getversion']),
+            equal_to(['completeir,1:1,1', 'completeir,1:1,2', '2.1.4'])
+        )
+
+        assert_that(
+            Connector(transport).learn(),
+            equal_to(_LEARNED_CODE.split('sendir,')[-1])
+        )
+
+    def test_tcp_stop_learning(self):
+        zmote = self._subject.add(learn_delay=60)[0]
+
+        transport = TCPTransport(ip=zmote.host, port=zmote.tcp_port)
+        transport.connect()
+        self.addCleanup(transport.disconnect)
+
+        assert_that(
+            transport.call_many(['get_IRL', 'stop_IRL']),
+            equal_to(['IR Learner Enabled', 'IR Learner Disabled'])
+        )
+
+    def test_discovery(self):
+        zmotes = self._subject.add(2)
+
+        discovered = active_discover_zmotes(
+            unique_zmote_count=3, deadline=5, interfaces=[self._subject.interface],
+        )
+
+        assert_that(
+            sorted((k, v['IP']) for k, v in discovered.items()),
+            equal_to(sorted((x.uuid, x.ip) for x in [self._zmote] + zmotes))
+        )
+
+    def test_sweep(self):
+        before = time.monotonic()
+
+        # every simulated device shares one host, so sweep the subnet on this device's ports
+        discovered = sweep_discover_zmotes(
+            '127.0.0.0/24', http_port=self._zmote.http_port, tcp_port=self._zmote.tcp_port, deadline=5,
+        )
+
+        assert_that(time.monotonic() - before, less_than(3))
+
+        assert_that(
+            {k: v['IP'] for k, v in discovered.items()},
+            equal_to({self._zmote.uuid: self._zmote.ip})
+        )
+
+    def test_sweep_http_only(self):
+        assert_that(
+            [x['UUID'] for x in sweep_iter('127.0.0.1/32', http_port=self._zmote.http_port, tcp_port=None)],
+            equal_to([self._zmote.uuid])
+        )